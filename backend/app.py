@@ -1,76 +1,58 @@
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-from flask_sqlalchemy import SQLAlchemy
+from flask import Flask, Blueprint, g, request, jsonify
+from flask_cors import CORS, cross_origin
+from sqlalchemy import case, update
+from sqlalchemy.orm import selectinload
+import click
+import os
 import uuid
 import json
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from werkzeug.security import generate_password_hash, check_password_hash
+from models import (db, database_url, engine_options, User, Project, Collaborator, Responsibility,
+                    Milestone, MilestoneMember, Task)
+from password_hashing import hasher, HashingBusy
+from profile_cache import profiles, load_profiles
+from auth_tokens import tokens, login_required, TokenError
+from chat_hub import hub
+from email_outbox import outbox
+from metrics import metrics
+from request_profiler import profiler
+from routes.admin import admin_bp
+from routes.chat import chat_bp
+from routes.email import email_bp
+from routes.uploads import uploads_bp
 
-app = Flask(__name__)
+# Project, milestone and profile routes; the rest live in routes/
+api_bp = Blueprint('api', __name__)
 
-# Import and register blueprints
-from routes.email import email_bp
-app.register_blueprint(email_bp, url_prefix='/api/email')
+# Project serialization
+def project_query():
+    """Project query that batch-loads collaborators and responsibilities (3 SELECTs total)"""
+    return Project.query.options(
+        selectinload(Project.collaborators).selectinload(Collaborator.responsibilities)
+    )
 
-# CORS setup
-from flask_cors import CORS, cross_origin
-CORS(app, resources={r"/api/*": {"origins": "*"}})
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///stormhacks.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Email configuration (using Gmail SMTP)
-app.config['MAIL_SERVER'] = 'smtp.gmail.com'
-app.config['MAIL_PORT'] = 587
-app.config['MAIL_USE_TLS'] = True
-app.config['MAIL_USERNAME'] = 'your-email@gmail.com'  # Replace with your email
-app.config['MAIL_PASSWORD'] = 'your-app-password'     # Replace with app password
-
-db = SQLAlchemy(app)
-
-# Database Models
-class User(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    password = db.Column(db.String(200), nullable=False)
-    name = db.Column(db.String(200), nullable=True)
-    profile_photo = db.Column(db.String(500), nullable=True)
-
-class Project(db.Model):
-    id = db.Column(db.String(50), primary_key=True)
-    name = db.Column(db.String(200), nullable=False)
-    creator = db.Column(db.String(120), nullable=False)
-    code = db.Column(db.String(10), unique=True, nullable=False)
-
-class Collaborator(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    project_id = db.Column(db.String(50), db.ForeignKey('project.id'), nullable=False)
-    email = db.Column(db.String(120), nullable=False)
-
-class Responsibility(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    collaborator_id = db.Column(db.Integer, db.ForeignKey('collaborator.id'), nullable=False)
-    description = db.Column(db.String(500), nullable=False)
-
-class Milestone(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    project_id = db.Column(db.String(50), db.ForeignKey('project.id'), nullable=False)
-    title = db.Column(db.String(200), nullable=False)
-    start_date = db.Column(db.String(20), nullable=False)
-    end_date = db.Column(db.String(20), nullable=False)
-    assigned_members = db.Column(db.Text, nullable=False)
-    progress = db.Column(db.Float, default=0.0)
-
-class Task(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    milestone_id = db.Column(db.Integer, db.ForeignKey('milestone.id'), nullable=False)
-    title = db.Column(db.String(200), nullable=False)
-    due_date = db.Column(db.String(20), nullable=False)
-    assignee = db.Column(db.String(120), nullable=False)
-    responsibility = db.Column(db.String(200), nullable=False)
-    status = db.Column(db.String(20), default='To Do')
-@app.route('/api/create-project', methods=['POST'])
+def serialize_project(project):
+    """Convert a project loaded via project_query() into its API dict"""
+    # Add creator as a collaborator
+    collab_list = [{
+        'email': project.creator,
+        'responsibilities': ['Project Owner']
+    }]
+    
+    for collab in project.collaborators:
+        collab_list.append({
+            'email': collab.email,
+            'responsibilities': [r.description for r in collab.responsibilities]
+        })
+    
+    return {
+        'id': project.id,
+        'name': project.name,
+        'creator': project.creator,
+        'code': project.code,
+        'collaborators': collab_list
+    }
+
+@api_bp.route('/api/create-project', methods=['POST'])
 @cross_origin()
 def create_project():
     data = request.json
@@ -86,24 +68,17 @@ def create_project():
     )
     db.session.add(new_project)
     
-    # Create collaborators and responsibilities
+    # Create collaborators and responsibilities; the unit of work inserts each
+    # table in one batched statement instead of a flush per collaborator
     for collab_data in data.get('collaborators', []):
         if collab_data['email']:
-            collaborator = Collaborator(
-                project_id=project_id,
-                email=collab_data['email']
-            )
-            db.session.add(collaborator)
-            db.session.flush()  # Get collaborator ID
-            
-            # Add responsibilities
-            for resp in collab_data['responsibilities']:
-                if resp.strip():
-                    responsibility = Responsibility(
-                        collaborator_id=collaborator.id,
-                        description=resp.strip()
-                    )
-                    db.session.add(responsibility)
+            new_project.collaborators.append(Collaborator(
+                email=collab_data['email'],
+                responsibilities=[
+                    Responsibility(description=resp.strip())
+                    for resp in collab_data['responsibilities'] if resp.strip()
+                ]
+            ))
     
     db.session.commit()
     
@@ -117,7 +92,30 @@ def create_project():
     
     return jsonify({'success': True, 'project': project_dict})
 
-@app.route('/api/signup', methods=['POST'])
+@api_bp.route('/api/projects/import', methods=['POST'])
+@cross_origin()
+def import_projects():
+    """Create projects in bulk from an uploaded CSV or JSON Lines roster"""
+    from project_import import import_projects as run_import, RosterError
+    
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({'success': False, 'message': 'No roster file uploaded'})
+    fmt = request.form.get('format') or os.path.splitext(upload.filename or '')[1].lstrip('.').lower()
+    
+    try:
+        report = run_import(upload.stream, fmt)
+        return jsonify({'success': True, **report})
+    except RosterError as e:
+        return jsonify({'success': False, 'message': str(e)})
+    except Exception as e:
+        print(f'Project import error: {e}')
+        return jsonify({'success': False, 'message': 'Import failed'})
+
+def hashing_busy():
+    return jsonify({'success': False, 'message': 'Too many sign-ins right now, please try again'}), 503, {'Retry-After': '1'}
+
+@api_bp.route('/api/signup', methods=['POST'])
 @cross_origin()
 def signup():
     print('Signup endpoint called')
@@ -132,18 +130,22 @@ def signup():
         
         new_user = User(
             email=email, 
-            password=generate_password_hash(password, method='pbkdf2:sha256'),
+            password=hasher.hash(password),
             name=name
         )
         db.session.add(new_user)
         db.session.commit()
+        # Chat may have cached this email as not a user yet
+        profiles.invalidate(email)
         
         return jsonify({'success': True, 'message': 'User created successfully'})
+    except HashingBusy:
+        return hashing_busy()
     except Exception as e:
         print(f'Signup error: {e}')
         return jsonify({'success': False, 'message': 'Server error'})
 
-@app.route('/api/login', methods=['POST'])
+@api_bp.route('/api/login', methods=['POST'])
 @cross_origin()
 def login():
     try:
@@ -153,88 +155,100 @@ def login():
         
         user = User.query.filter_by(email=email).first()
         
-        if user and check_password_hash(user.password, password):
-            return jsonify({'success': True, 'message': 'Login successful'})
+        if user and hasher.verify(user.password, password):
+            # Hashes made with an older method or cost are upgraded while the password is at hand
+            if hasher.needs_rehash(user.password):
+                try:
+                    user.password = hasher.hash(password)
+                    db.session.commit()
+                except HashingBusy:
+                    # The password is right; the upgrade waits for a quieter login
+                    pass
+            # The only password check of the session; later requests carry the access token
+            return jsonify({'success': True, 'message': 'Login successful', **tokens.issue(user)})
         
         return jsonify({'success': False, 'message': 'Invalid credentials'})
+    except HashingBusy:
+        return hashing_busy()
     except Exception as e:
         print(f'Login error: {e}')
         return jsonify({'success': False, 'message': 'Server error'})
 
-@app.route('/api/join-project', methods=['POST'])
+@api_bp.route('/api/token/refresh', methods=['POST'])
+@cross_origin()
+def refresh_token():
+    # Swap a refresh token for a new pair; each refresh token works once
+    try:
+        claims = tokens.verify((request.get_json(silent=True) or {}).get('refresh_token') or '', kind='refresh')
+    except TokenError as e:
+        return jsonify({'success': False, 'message': str(e)}), 401
+    
+    user = db.session.get(User, claims['sub'])
+    if not user or user.token_version != claims['ver']:
+        return jsonify({'success': False, 'message': 'Session ended'}), 401
+    tokens.revoke(claims)
+    return jsonify({'success': True, **tokens.issue(user)})
+
+@api_bp.route('/api/logout', methods=['POST'])
+@cross_origin()
+@login_required
+def logout():
+    tokens.revoke(g.current_user.claims)
+    try:
+        tokens.revoke(tokens.verify((request.get_json(silent=True) or {}).get('refresh_token') or '', kind='refresh'))
+    except TokenError:
+        pass
+    return jsonify({'success': True})
+
+@api_bp.route('/api/join-project', methods=['POST'])
 @cross_origin()
 def join_project():
     data = request.json
     code = data.get('code')
     user_email = data.get('user_email', '')
     
-    project = Project.query.filter_by(code=code).first()
+    project = project_query().filter_by(code=code).first()
     
-    if project:
-        # Add user as collaborator if not already one and not the creator
-        if user_email and user_email != project.creator:
-            existing = Collaborator.query.filter_by(project_id=project.id, email=user_email).first()
-            if not existing:
-                new_collab = Collaborator(project_id=project.id, email=user_email)
-                db.session.add(new_collab)
-                db.session.flush()
-                resp = Responsibility(collaborator_id=new_collab.id, description='Team Member')
-                db.session.add(resp)
-                db.session.commit()
+    if not project:
+        return jsonify({'success': False, 'message': 'Invalid code'})
     
-    if project:
-        # Get collaborators and their responsibilities
-        collaborators = Collaborator.query.filter_by(project_id=project.id).all()
-        collab_list = []
-        
-        # Add creator as a collaborator
-        collab_list.append({
-            'email': project.creator,
-            'responsibilities': ['Project Owner']
-        })
-        
-        for collab in collaborators:
-            responsibilities = Responsibility.query.filter_by(collaborator_id=collab.id).all()
-            collab_list.append({
-                'email': collab.email,
-                'responsibilities': [r.description for r in responsibilities]
-            })
-        
-        project_dict = {
-            'id': project.id,
-            'name': project.name,
-            'creator': project.creator,
-            'code': project.code,
-            'collaborators': collab_list
-        }
-        
-        return jsonify({'success': True, 'project': project_dict})
+    # Add user as collaborator if not already one and not the creator
+    if user_email and user_email != project.creator:
+        existing = any(c.email == user_email for c in project.collaborators)
+        if not existing:
+            project.collaborators.append(Collaborator(
+                email=user_email,
+                responsibilities=[Responsibility(description='Team Member')]
+            ))
+            project_id = project.id
+            db.session.commit()
+            # Commit expires the loaded relationships, reload them in one batch
+            project = project_query().filter_by(id=project_id).first()
     
-    return jsonify({'success': False, 'message': 'Invalid code'})
+    return jsonify({'success': True, 'project': serialize_project(project)})
 
-@app.route('/', methods=['GET'])
+@api_bp.route('/', methods=['GET'])
 def home():
     return jsonify({'message': 'StormHacks Backend API is running'})
 
-@app.route('/test', methods=['GET'])
+@api_bp.route('/test', methods=['GET'])
 def test():
     return jsonify({'message': 'Backend is running'})
 
-@app.route('/test-email/<email>', methods=['GET'])
+@api_bp.route('/test-email/<email>', methods=['GET'])
 @cross_origin()
 def test_email(email):
     try:
         from routes.email import send_email
         print(f'Testing email to: {email}')
         print(f'Using credentials: synchronusdevteam@gmail.com')
-        success = send_email(email, 'Test Email', 'This is a test email from Synchronus!')
-        print(f'Email result: {success}')
-        return jsonify({'success': success, 'message': f'Test email sent to {email}'})
+        job_id = send_email(email, 'Test Email', 'This is a test email from Synchronus!')
+        return jsonify({'success': True, 'job_id': job_id, 'message': f'Test email queued for {email}'})
     except Exception as e:
         print(f'Test email exception: {e}')
         return jsonify({'success': False, 'error': str(e)})
 
-@app.route('/api/check-user/<email>', methods=['GET'])
+@api_bp.route('/api/check-user/<email>', methods=['GET'])
 @cross_origin()
 def check_user(email):
     user = User.query.filter_by(email=email).first()
@@ -250,128 +264,36 @@ def check_user(email):
     else:
         return jsonify({'found': False, 'message': 'User not found'})
 
-@app.route('/api/all-users', methods=['GET'])
+@api_bp.route('/api/all-users', methods=['GET'])
 @cross_origin()
 def all_users():
     users = User.query.all()
     user_list = [{'id': u.id, 'email': u.email, 'password': u.password} for u in users]
     return jsonify({'users': user_list, 'count': len(user_list)})
 
-@app.route('/api/user-projects/<email>', methods=['GET'])
+@api_bp.route('/api/user-projects/<email>', methods=['GET'])
 @cross_origin()
 def get_user_projects(email):
-    # Get projects where user is creator
-    created_projects = Project.query.filter_by(creator=email).all()
-    
-    # Get projects where user is collaborator
-    collaborator_projects = db.session.query(Project).join(Collaborator).filter(Collaborator.email == email).all()
-    
-    # Combine and deduplicate
-    all_projects = list({p.id: p for p in created_projects + collaborator_projects}.values())
-    
-    project_list = []
-    for project in all_projects:
-        # Get collaborators for this project
-        collaborators = Collaborator.query.filter_by(project_id=project.id).all()
-        collab_list = []
-        
-        # Add creator as a collaborator
-        collab_list.append({
-            'email': project.creator,
-            'responsibilities': ['Project Owner']
-        })
-        
-        for collab in collaborators:
-            responsibilities = Responsibility.query.filter_by(collaborator_id=collab.id).all()
-            collab_list.append({
-                'email': collab.email,
-                'responsibilities': [r.description for r in responsibilities]
-            })
-        
-        project_list.append({
-            'id': project.id,
-            'name': project.name,
-            'creator': project.creator,
-            'code': project.code,
-            'collaborators': collab_list
-        })
+    # Projects where user is creator or collaborator; each side of the UNION is an
+    # index lookup, where OR-ing them with EXISTS scanned the whole project table
+    project_ids = db.select(Project.id).where(Project.creator == email).union(
+        db.select(Collaborator.project_id).where(Collaborator.email == email)
+    )
+    projects = project_query().filter(Project.id.in_(project_ids)).all()
     
-    return jsonify({'projects': project_list})
+    return jsonify({'projects': [serialize_project(p) for p in projects]})
 
-@app.route('/api/project/<project_id>', methods=['GET'])
+@api_bp.route('/api/project/<project_id>', methods=['GET'])
 @cross_origin()
 def get_project(project_id):
-    project = Project.query.filter_by(id=project_id).first()
+    project = project_query().filter_by(id=project_id).first()
     
     if not project:
         return jsonify({'success': False, 'message': 'Project not found'})
     
-    # Get collaborators for this project
-    collaborators = Collaborator.query.filter_by(project_id=project.id).all()
-    collab_list = []
-    
-    # Add creator as a collaborator
-    collab_list.append({
-        'email': project.creator,
-        'responsibilities': ['Project Owner']
-    })
-    
-    for collab in collaborators:
-        responsibilities = Responsibility.query.filter_by(collaborator_id=collab.id).all()
-        collab_list.append({
-            'email': collab.email,
-            'responsibilities': [r.description for r in responsibilities]
-        })
-    
-    project_dict = {
-        'id': project.id,
-        'name': project.name,
-        'creator': project.creator,
-        'code': project.code,
-        'collaborators': collab_list
-    }
-    
-    return jsonify({'success': True, 'project': project_dict})
-
-def send_invitation_email(to_email, project_name, role, project_code, creator_email):
-    try:
-        # Create message
-        msg = MIMEMultipart()
-        msg['From'] = app.config['MAIL_USERNAME']
-        msg['To'] = to_email
-        msg['Subject'] = f'Project Invitation: {project_name}'
-        
-        # Email body
-        body = f"""
-        Hello!
-        
-        You have been invited to join the project "{project_name}" as {role}.
-        
-        Project Code: {project_code}
-        Invited by: {creator_email}
-        
-        To join the project, use the code above in the StormHacks application.
-        
-        Best regards,
-        StormHacks Team
-        """
-        
-        msg.attach(MIMEText(body, 'plain'))
-        
-        # Send email
-        server = smtplib.SMTP(app.config['MAIL_SERVER'], app.config['MAIL_PORT'])
-        server.starttls()
-        server.login(app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'])
-        text = msg.as_string()
-        server.sendmail(app.config['MAIL_USERNAME'], to_email, text)
-        server.quit()
-        
-        return True
-    except Exception as e:
-        print(f'Email error: {e}')
-        return False
+    return jsonify({'success': True, 'project': serialize_project(project)})
 
-@app.route('/api/send-invitations', methods=['POST'])
+@api_bp.route('/api/send-invitations', methods=['POST'])
 @cross_origin()
 def send_invitations():
     try:
@@ -381,87 +303,179 @@ def send_invitations():
         creator_email = data.get('creator_email')
         collaborators = data.get('collaborators', [])
         
-        sent_count = 0
-        failed_emails = []
+        # Delivery happens on the outbox workers; poll /api/email/status/<job_id> for progress
+        from routes.email import send_email, invitation_email
         
+        job_ids = {}
         for collab in collaborators:
             email = collab.get('email')
             responsibilities = collab.get('responsibilities', [])
             
             if email and responsibilities:
-                # Use the new email system
-                from routes.email import send_email
-                
-                responsibilities_text = '\n'.join([f'• {resp}' for resp in responsibilities])
-                subject = f'Project Invitation: {project_name}'
-                body = f"""
-Hello!
-
-You have been invited to join the project "{project_name}".
-
-Your responsibilities:
-{responsibilities_text}
-
-Project Code: {project_code}
-Invited by: {creator_email}
-
-To join the project, use the code above in the Synchronus application.
-
-Best regards,
-Synchronus Team
-                """
-                
-                success = send_email(email, subject, body)
-                print(f'Email attempt to {email}: {"Success" if success else "Failed"}')
-                
-                if success:
-                    sent_count += 1
-                else:
-                    failed_emails.append(email)
+                subject, body = invitation_email(project_name, responsibilities, project_code, creator_email)
+                job_ids[email] = send_email(email, subject, body)
         
         return jsonify({
             'success': True,
-            'sent_count': sent_count,
-            'failed_emails': failed_emails,
-            'message': f'Sent {sent_count} invitations successfully'
+            'queued_count': len(job_ids),
+            'job_ids': job_ids,
+            'message': f'Queued {len(job_ids)} invitations'
         })
         
     except Exception as e:
         print(f'Send invitations error: {e}')
         return jsonify({'success': False, 'message': 'Failed to send invitations'})
 
-@app.route('/api/project/<project_id>/milestones', methods=['GET'])
+# Milestone progress counters
+STATUS_WEIGHTS = {'done': 100, 'in_progress': 50, 'todo': 0}
+
+def status_bucket(status):
+    """Counter a task status is tallied under ('Not Started', 'To Do' and anything unknown are todo)"""
+    if status == 'Done':
+        return 'done'
+    if status == 'In Progress':
+        return 'in_progress'
+    return 'todo'
+
+def apply_task_deltas(milestone_id, deltas):
+    """Shift a milestone's counters by deltas ({bucket: +/-n}) and recompute progress in one UPDATE"""
+    todo = Milestone.todo_count + deltas.get('todo', 0)
+    in_progress = Milestone.in_progress_count + deltas.get('in_progress', 0)
+    done = Milestone.done_count + deltas.get('done', 0)
+    total = todo + in_progress + done
+    db.session.execute(
+        update(Milestone)
+        .where(Milestone.id == milestone_id)
+        .values(
+            todo_count=todo,
+            in_progress_count=in_progress,
+            done_count=done,
+            progress=case(
+                (total > 0, (done * STATUS_WEIGHTS['done'] + in_progress * STATUS_WEIGHTS['in_progress']) * 1.0 / total),
+                else_=0.0
+            )
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+def set_task_status(task_id, status):
+    """Change one task's status and return (milestone_id, old bucket, new bucket), or None if missing.
+
+    The UPDATE only matches while the task still has the status we read, so
+    two concurrent changes to the same task cannot both move the counters.
+    """
+    while True:
+        current = db.session.execute(
+            db.select(Task.milestone_id, Task.status).where(Task.id == task_id)
+        ).first()
+        if current is None:
+            return None
+        result = db.session.execute(
+            update(Task)
+            .where(Task.id == task_id, Task.status == current.status)
+            .values(status=status)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            return current.milestone_id, status_bucket(current.status), status_bucket(status)
+
+def recount_milestones(fix=False):
+    """Compare every milestone's counters with its tasks; with fix=True rewrite the ones that drifted.
+
+    Returns a list of (milestone_id, stored counts, actual counts) for the mismatches.
+    """
+    actual = {}
+    for milestone_id, status, count in db.session.execute(
+        db.select(Task.milestone_id, Task.status, db.func.count()).group_by(Task.milestone_id, Task.status)
+    ):
+        counts = actual.setdefault(milestone_id, {'todo': 0, 'in_progress': 0, 'done': 0})
+        counts[status_bucket(status)] += count
+    
+    mismatches = []
+    for milestone in Milestone.query.all():
+        stored = {'todo': milestone.todo_count, 'in_progress': milestone.in_progress_count, 'done': milestone.done_count}
+        counts = actual.get(milestone.id, {'todo': 0, 'in_progress': 0, 'done': 0})
+        if stored == counts:
+            continue
+        mismatches.append((milestone.id, stored, counts))
+        if fix:
+            total = sum(counts.values())
+            milestone.todo_count = counts['todo']
+            milestone.in_progress_count = counts['in_progress']
+            milestone.done_count = counts['done']
+            milestone.progress = sum(STATUS_WEIGHTS[bucket] * n for bucket, n in counts.items()) / total if total else 0
+    if fix:
+        db.session.commit()
+    return mismatches
+
+def migrate_database():
+    """Create missing tables and apply pending schema migrations; call inside an app context"""
+    import migrations
+    applied = migrations.migrate(db)
+    if 1 in applied['models']:
+        # Counter columns were just added to existing milestones; fill them in
+        recount_milestones(fix=True)
+    migrate_milestone_members()
+
+def parse_legacy_members(value):
+    """Members from the old assigned_members text, stored as a JSON list or comma-separated"""
+    if not value:
+        return []
+    try:
+        members = json.loads(value) if value.startswith('[') else value.split(',')
+    except ValueError:
+        members = value.split(',')
+    return [str(member).strip() for member in members if str(member).strip()]
+
+def migrate_milestone_members():
+    """Move assigned_members text of milestones without member rows into milestone_member"""
+    milestones = Milestone.query.filter(~Milestone.members.any(), Milestone.assigned_members != '').all()
+    for milestone in milestones:
+        milestone.members = [
+            MilestoneMember(member=member, position=i)
+            for i, member in enumerate(parse_legacy_members(milestone.assigned_members))
+        ]
+    db.session.commit()
+
+def serialize_milestone(milestone):
+    return {
+        'id': milestone.id,
+        'title': milestone.title,
+        'startDate': milestone.start_date,
+        'endDate': milestone.end_date,
+        'assignedMembers': [member.member for member in milestone.members],
+        'progress': milestone.progress,
+        'taskCounts': {
+            'todo': milestone.todo_count,
+            'inProgress': milestone.in_progress_count,
+            'done': milestone.done_count
+        },
+        'tasks': [{
+            'id': task.id,
+            'title': task.title,
+            'dueDate': task.due_date,
+            'assignee': task.assignee,
+            'responsibility': task.responsibility,
+            'status': task.status
+        } for task in milestone.tasks]
+    }
+
+@api_bp.route('/api/project/<project_id>/milestones', methods=['GET'])
 @cross_origin()
 def get_milestones(project_id):
-    milestones = Milestone.query.filter_by(project_id=project_id).all()
-    result = []
-    for milestone in milestones:
-        tasks = Task.query.filter_by(milestone_id=milestone.id).all()
-        assigned_members = []
-        if milestone.assigned_members:
-            try:
-                assigned_members = json.loads(milestone.assigned_members) if milestone.assigned_members.startswith('[') else milestone.assigned_members.split(',')
-            except:
-                assigned_members = milestone.assigned_members.split(',') if milestone.assigned_members else []
-        result.append({
-            'id': milestone.id,
-            'title': milestone.title,
-            'startDate': milestone.start_date,
-            'endDate': milestone.end_date,
-            'assignedMembers': assigned_members,
-            'progress': milestone.progress,
-            'tasks': [{
-                'id': task.id,
-                'title': task.title,
-                'dueDate': task.due_date,
-                'assignee': task.assignee,
-                'responsibility': task.responsibility,
-                'status': task.status
-            } for task in tasks]
-        })
-    return jsonify({'milestones': result})
+    # Milestones, then their tasks and members in one batched SELECT each
+    milestones = Milestone.query.options(
+        selectinload(Milestone.tasks),
+        selectinload(Milestone.members)
+    ).filter_by(project_id=project_id).order_by(Milestone.id).all()
+    
+    response = jsonify({'milestones': [serialize_milestone(milestone) for milestone in milestones]})
+    # Let the timeline revalidate with If-None-Match and get a 304 when nothing changed
+    response.add_etag()
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
-@app.route('/api/project/<project_id>/milestones', methods=['POST'])
+@api_bp.route('/api/project/<project_id>/milestones', methods=['POST'])
 @cross_origin()
 def add_milestone(project_id):
     data = request.json
@@ -476,7 +490,11 @@ def add_milestone(project_id):
         title=data['title'],
         start_date=data['startDate'],
         end_date=data['endDate'],
-        assigned_members=assigned_members_str
+        assigned_members=assigned_members_str,
+        members=[
+            MilestoneMember(member=member, position=i)
+            for i, member in enumerate(parse_legacy_members(assigned_members_str))
+        ]
     )
     db.session.add(milestone)
     db.session.flush()
@@ -493,10 +511,12 @@ def add_milestone(project_id):
         )
         db.session.add(task)
     
+    # New tasks start out as 'Not Started'
+    milestone.todo_count = len(data.get('tasks', []))
     db.session.commit()
     return jsonify({'success': True, 'milestone_id': milestone.id})
 
-@app.route('/api/milestone/<milestone_id>/tasks', methods=['POST'])
+@api_bp.route('/api/milestone/<milestone_id>/tasks', methods=['POST'])
 @cross_origin()
 def add_task(milestone_id):
     data = request.json
@@ -509,36 +529,65 @@ def add_task(milestone_id):
         status=data.get('status', 'To Do')
     )
     db.session.add(task)
+    apply_task_deltas(milestone_id, {status_bucket(task.status): 1})
     db.session.commit()
     return jsonify({'success': True, 'task_id': task.id})
 
-@app.route('/api/task/<task_id>/status', methods=['PUT'])
+@api_bp.route('/api/task/<task_id>/status', methods=['PUT'])
 @cross_origin()
 def update_task_status(task_id):
     data = request.json
-    task = Task.query.get(task_id)
-    if task:
-        task.status = data['status']
+    changed = set_task_status(task_id, data['status'])
+    if changed is None:
+        return jsonify({'success': False, 'message': 'Task not found'})
+    
+    milestone_id, old, new = changed
+    if old != new:
+        apply_task_deltas(milestone_id, {old: -1, new: 1})
+    db.session.commit()
+    return jsonify({'success': True})
+
+@api_bp.route('/api/tasks/status', methods=['PUT'])
+@cross_origin()
+def update_task_statuses():
+    """Change many task statuses in one request: {"updates": [{"id": 1, "status": "Done"}, ...]}"""
+    data = request.json
+    updates = data.get('updates', [])
+    
+    try:
+        deltas = {}
+        missing = []
+        for item in updates:
+            changed = set_task_status(item['id'], item['status'])
+            if changed is None:
+                missing.append(item['id'])
+                continue
+            milestone_id, old, new = changed
+            if old != new:
+                milestone_deltas = deltas.setdefault(milestone_id, {})
+                milestone_deltas[old] = milestone_deltas.get(old, 0) - 1
+                milestone_deltas[new] = milestone_deltas.get(new, 0) + 1
+        
+        # One counter UPDATE per touched milestone, all in the same commit
+        for milestone_id, milestone_deltas in deltas.items():
+            apply_task_deltas(milestone_id, milestone_deltas)
         db.session.commit()
         
-        # Update milestone progress
-        milestone = Milestone.query.get(task.milestone_id)
-        if milestone:
-            tasks = Task.query.filter_by(milestone_id=milestone.id).all()
-            if tasks:
-                task_progress = sum(
-                    100 if t.status == 'Done' else 50 if t.status == 'In Progress' else 0 
-                    for t in tasks
-                )
-                milestone.progress = task_progress / len(tasks)
-            else:
-                milestone.progress = 0
-            db.session.commit()
-        
-        return jsonify({'success': True})
-    return jsonify({'success': False, 'message': 'Task not found'})
+        progress = dict(db.session.execute(
+            db.select(Milestone.id, Milestone.progress).where(Milestone.id.in_(list(deltas)))
+        ).all()) if deltas else {}
+        return jsonify({
+            'success': True,
+            'updated': len(updates) - len(missing),
+            'missing': missing,
+            'progress': progress
+        })
+    except Exception as e:
+        db.session.rollback()
+        print(f'Bulk task status error: {e}')
+        return jsonify({'success': False, 'message': 'Failed to update tasks'})
 
-@app.route('/api/milestone/<milestone_id>', methods=['DELETE'])
+@api_bp.route('/api/milestone/<milestone_id>', methods=['DELETE'])
 @cross_origin()
 def delete_milestone(milestone_id):
     milestone = Milestone.query.get(milestone_id)
@@ -552,23 +601,28 @@ def delete_milestone(milestone_id):
     return jsonify({'success': False, 'message': 'Milestone not found'})
 
 # Profile management endpoints
-@app.route('/api/user-profile/<email>', methods=['GET'])
+@api_bp.route('/api/user-profile/<email>', methods=['GET'])
 @cross_origin()
 def get_user_profile(email):
-    user = User.query.filter_by(email=email).first()
-    if user:
-        return jsonify({
-            'success': True,
-            'profile': {
-                'name': user.name or email.split('@')[0],
-                'email': user.email,
-                'profilePhoto': user.profile_photo
-            }
-        })
+    profile = load_profiles([email]).get(email)
+    if profile:
+        return jsonify({'success': True, 'profile': profile})
     return jsonify({'success': False, 'message': 'User not found'})
 
-@app.route('/api/upload-profile-photo', methods=['POST'])
+MAX_PROFILE_BATCH = 200
+
+@api_bp.route('/api/user-profiles', methods=['GET'])
+@cross_origin()
+def get_user_profiles():
+    # ?email=a&email=b...; emails that are not users are left out of the result
+    emails = request.args.getlist('email')
+    if len(emails) > MAX_PROFILE_BATCH:
+        return jsonify({'success': False, 'message': f'At most {MAX_PROFILE_BATCH} emails per request'}), 400
+    return jsonify({'success': True, 'profiles': load_profiles(emails)})
+
+@api_bp.route('/api/upload-profile-photo', methods=['POST'])
 @cross_origin()
+@login_required
 def upload_profile_photo():
     try:
         print('Upload request received')
@@ -580,7 +634,7 @@ def upload_profile_photo():
             return jsonify({'success': False, 'message': 'No photo uploaded'})
         
         file = request.files['photo']
-        email = request.form.get('email')
+        email = g.current_user.email
         
         print(f'File: {file.filename}, Email: {email}')
         
@@ -600,12 +654,15 @@ def upload_profile_photo():
         file.save(file_path)
         
         # Update user profile
-        user = User.query.filter_by(email=email).first()
-        if user:
-            user.profile_photo = f'/uploads/profiles/{filename}'
-            db.session.commit()
-            print(f'Updated user profile photo: {user.profile_photo}')
-            return jsonify({'success': True, 'photoUrl': user.profile_photo})
+        photo_url = f'/uploads/profiles/{filename}'
+        updated = db.session.execute(
+            update(User).where(User.id == g.current_user.id).values(profile_photo=photo_url)
+        ).rowcount
+        db.session.commit()
+        profiles.invalidate(email)
+        if updated:
+            print(f'Updated user profile photo: {photo_url}')
+            return jsonify({'success': True, 'photoUrl': photo_url})
         
         print('User not found')
         return jsonify({'success': False, 'message': 'User not found'})
@@ -613,16 +670,16 @@ def upload_profile_photo():
         print(f'Upload error: {str(e)}')
         return jsonify({'success': False, 'message': str(e)})
 
-@app.route('/api/update-profile', methods=['POST'])
+@api_bp.route('/api/update-profile', methods=['POST'])
 @cross_origin()
+@login_required
 def update_profile():
     try:
         data = request.json
-        email = data.get('email')
         name = data.get('name')
         new_password = data.get('newPassword')
         
-        user = User.query.filter_by(email=email).first()
+        user = db.session.get(User, g.current_user.id)
         if not user:
             return jsonify({'success': False, 'message': 'User not found'})
         
@@ -630,34 +687,79 @@ def update_profile():
         if name:
             user.name = name
         
-        # Update password if provided
+        # Update password if provided; that ends every other session
         if new_password:
-            user.password = generate_password_hash(new_password, method='pbkdf2:sha256')
+            user.password = hasher.hash(new_password)
+            user.token_version += 1
         
         db.session.commit()
-        return jsonify({'success': True, 'message': 'Profile updated successfully'})
+        profiles.invalidate(user.email)
+        result = {'success': True, 'message': 'Profile updated successfully'}
+        if new_password:
+            result.update(tokens.issue(user))
+        return jsonify(result)
+    except HashingBusy:
+        return hashing_busy()
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
-@app.route('/uploads/profiles/<filename>', methods=['GET'])
+@api_bp.route('/uploads/profiles/<filename>', methods=['GET'])
 @cross_origin()
 def serve_profile_photo(filename):
     from flask import send_from_directory
     import os
     return send_from_directory(os.path.join(os.getcwd(), 'uploads/profiles'), filename)
 
-# Register blueprints
-from routes.uploads import uploads_bp
-from routes.chat import chat_bp, init_chat_db
-app.register_blueprint(uploads_bp)
-app.register_blueprint(chat_bp, url_prefix='/api/chat')
-
-# Initialize chat database
-init_chat_db()
+@click.command('init-db')
+def init_db_command():
+    """Create missing tables and apply pending migrations."""
+    migrate_database()
+    click.echo('Database is up to date')
+
+def create_app(config=None):
+    """Build the Flask app. Settings come from the environment (see models.py),
+    then from the optional config dict. Building an app does not touch the
+    database; run `flask --app wsgi init-db` once per deploy to set up the schema.
+
+    The email outbox, the chat hub and the token signer are per-process
+    singletons bound to the app built here, so a process has one app: this
+    module builds it on import and other code imports it from here. A second
+    call raises RuntimeError rather than moving them onto the new app."""
+    if outbox.app is not None:
+        raise RuntimeError('This process already has its app; import it from app instead of building another')
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url()
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Signs access tokens; see auth_tokens.py for the fallback when unset
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')
+    app.config.update(config or {})
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+
+    # First, so the timings include the other request hooks
+    metrics.init_app(app)
+    CORS(app, resources={r"/api/*": {"origins": "*"}})
+    db.init_app(app)
+
+    app.register_blueprint(api_bp)
+    app.register_blueprint(email_bp, url_prefix='/api/email')
+    app.register_blueprint(uploads_bp)
+    app.register_blueprint(chat_bp, url_prefix='/api/chat')
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
+
+    # Outbox workers and the chat poller run their own app context
+    outbox.init_app(app)
+    hub.init_app(app)
+    tokens.init_app(app)
+    profiler.init_app(app)
+    app.cli.add_command(init_db_command)
+    return app
+
+app = create_app()
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
-        print('Database tables created')
+        migrate_database()
+    # Pick up any invitations left in the outbox by the previous run
+    outbox.start()
     print('Starting Flask server on port 5000...')
-    app.run(debug=True, port=5000, host='127.0.0.1')
\ No newline at end of file
+    app.run(debug=True, port=5000, host='127.0.0.1')
@@ -0,0 +1,166 @@
+"""
+Signed access and refresh tokens.
+Login checks the password hash once and issues a short-lived access token
+and a longer-lived refresh token. A token is base64url(JSON claims) + '.' +
+base64url(HMAC-SHA256 of the claims part), so checking one is an HMAC and a
+dict lookup: no password hash and no database query per request.
+
+load_current_user runs before every request and sets g.current_user to the
+caller's Identity from the Authorization: Bearer header, or None when the
+header is missing or the token is not valid; login_required answers None
+with a 401. admin_required also answers 403 unless the caller's email is
+listed in ADMIN_EMAILS (comma separated; nobody by default).
+
+Revoked token ids (logout, refresh tokens that were used) are kept in memory
+until the token would have expired anyway. Each app process has its own
+set, so with several workers a logged-out access token can keep working on
+another worker until it expires; ACCESS_TOKEN_SECONDS keeps that short.
+Refresh tokens also carry the user's token_version, which a password change
+bumps and /api/token/refresh checks, so a new password ends every session.
+
+The signing key is the app's SECRET_KEY. Without one, a random key is
+created in SECRET_KEY_FILE on first use and every worker started from the
+same directory shares it.
+"""
+
+import base64
+import functools
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from collections import namedtuple
+
+from flask import g, jsonify, request
+
+ACCESS_TOKEN_SECONDS = int(os.environ.get('ACCESS_TOKEN_SECONDS', 15 * 60))
+REFRESH_TOKEN_SECONDS = int(os.environ.get('REFRESH_TOKEN_SECONDS', 14 * 24 * 3600))
+SECRET_KEY_FILE = os.environ.get('SECRET_KEY_FILE', 'secret_key')
+ADMIN_EMAILS = {email.strip().lower() for email in os.environ.get('ADMIN_EMAILS', '').split(',') if email.strip()}
+
+# claims is the verified token, for endpoints that act on the token itself
+Identity = namedtuple('Identity', 'id email claims')
+
+class TokenError(Exception):
+    """A token that is malformed, tampered with, expired, revoked or of the wrong kind"""
+
+def b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+def b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+def read_or_create_key(path):
+    """The key stored at path, creating it first if there is none yet"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    # Write aside and link into place, so a worker racing us never reads a half-written key
+    temp = f'{path}.{os.getpid()}.tmp'
+    fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(secrets.token_bytes(32))
+    try:
+        os.link(temp, path)
+    except FileExistsError:
+        pass
+    finally:
+        os.unlink(temp)
+    with open(path, 'rb') as f:
+        return f.read()
+
+class Tokens:
+    def __init__(self):
+        self.app = None
+        self._key = None
+        self._revoked = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Resolve the caller before each of this app's requests"""
+        self.app = app
+        self._key = None
+        app.before_request(load_current_user)
+
+    def key(self):
+        if self._key is None:
+            secret = self.app.config.get('SECRET_KEY') or read_or_create_key(SECRET_KEY_FILE)
+            self._key = secret.encode() if isinstance(secret, str) else secret
+        return self._key
+
+    def sign(self, claims):
+        body = b64encode(json.dumps(dict(claims, jti=secrets.token_urlsafe(12)), separators=(',', ':')).encode())
+        return f'{body}.{b64encode(self._mac(body))}'
+
+    def _mac(self, body):
+        return hmac.new(self.key(), body.encode('ascii'), hashlib.sha256).digest()
+
+    def issue(self, user):
+        """A fresh access and refresh token pair for user, as login returns it"""
+        now = int(time.time())
+        return {
+            'access_token': self.sign({'typ': 'access', 'sub': user.id, 'email': user.email,
+                                       'exp': now + ACCESS_TOKEN_SECONDS}),
+            'refresh_token': self.sign({'typ': 'refresh', 'sub': user.id, 'ver': user.token_version,
+                                        'exp': now + REFRESH_TOKEN_SECONDS}),
+            'expires_in': ACCESS_TOKEN_SECONDS,
+        }
+
+    def verify(self, token, kind='access'):
+        """Claims of a valid, unexpired, unrevoked token of the given kind; raises TokenError"""
+        body, _, signature = token.partition('.')
+        try:
+            if not hmac.compare_digest(b64decode(signature), self._mac(body)):
+                raise TokenError('Bad signature')
+            claims = json.loads(b64decode(body))
+        except (ValueError, UnicodeError) as e:
+            raise TokenError('Malformed token') from e
+        if claims.get('typ') != kind:
+            raise TokenError(f'Expected a {kind} token')
+        if claims['exp'] <= time.time():
+            raise TokenError('Token expired')
+        if claims['jti'] in self._revoked:
+            raise TokenError('Token revoked')
+        return claims
+
+    def revoke(self, claims):
+        """Reject this token from now until it expires"""
+        now = time.time()
+        with self._lock:
+            self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+            self._revoked[claims['jti']] = claims['exp']
+
+tokens = Tokens()
+
+def load_current_user():
+    g.current_user = None
+    header = request.headers.get('Authorization', '')
+    if not header.startswith('Bearer '):
+        return
+    try:
+        claims = tokens.verify(header[len('Bearer '):])
+    except TokenError:
+        return
+    g.current_user = Identity(claims['sub'], claims['email'], claims)
+
+def login_required(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if g.get('current_user') is None:
+            return jsonify({'success': False, 'message': 'Authentication required'}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+def admin_required(view):
+    @functools.wraps(view)
+    @login_required
+    def wrapper(*args, **kwargs):
+        if g.current_user.email.lower() not in ADMIN_EMAILS:
+            return jsonify({'success': False, 'message': 'Admin access required'}), 403
+        return view(*args, **kwargs)
+    return wrapper
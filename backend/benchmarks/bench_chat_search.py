@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Chat search benchmark.
+Fills a scratch SQLite database with one project's chat history, word
+frequencies following a Zipf curve like real chat, through the same
+triggers that keep messages_fts in step in the app. Then it times
+GET /api/chat/search for:
+
+  rare      - a word in a handful of messages
+  common    - one of the most frequent words
+  two words - two frequent words together
+  prefix    - the first letters of a word, with a trailing *
+  topic     - a frequent word within one topic
+  page 2    - the next page of the common search, from its cursor
+
+against a LIKE '%word%' scan of the project, what searching without the
+index costs. Times are the median of --repeat runs.
+
+    python benchmarks/bench_chat_search.py --messages 1000000 --topics 10
+"""
+
+import argparse
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PROJECT = 'bench'
+RARE_WORD = 'zeppelin'
+RARE_COUNT = 12
+
+def vocabulary(size):
+    # Pronounceable made-up words, so the stemmer leaves them alone
+    rng = random.Random(1)
+    consonants, vowels = 'bcdfgklmnprstvz', 'aeiou'
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(consonants) + rng.choice(vowels) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+def messages(count, topics, words):
+    rng = random.Random(2)
+    cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(words) + 1)))
+    rare = set(rng.sample(range(count), RARE_COUNT))
+    for i in range(count):
+        content = rng.choices(words, cum_weights=cum_weights, k=rng.randint(4, 20))
+        if i in rare:
+            content.insert(rng.randrange(len(content)), RARE_WORD)
+        yield (1, 'bench', ' '.join(content), f'topic-{i % topics}', PROJECT)
+
+def median_ms(run, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--topics', type=int, default=10)
+    parser.add_argument('--vocabulary', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-search-')
+    os.makedirs(os.path.join(workdir, 'instance'))
+    os.chdir(workdir)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+
+    from sqlalchemy import text
+    from app import app, db
+
+    words = vocabulary(args.vocabulary)
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        conn = db.engine.raw_connection()
+        try:
+            rows = messages(args.messages, args.topics, words)
+            while True:
+                batch = [row for _, row in zip(range(args.batch_size), rows)]
+                if not batch:
+                    break
+                conn.executemany('INSERT INTO messages (user_id, username, content, chat_id, project_id) '
+                                 'VALUES (?, ?, ?, ?, ?)', batch)
+                conn.commit()
+        finally:
+            conn.close()
+        print(f'Inserted {args.messages} messages in {time.perf_counter() - start:.1f}s '
+              f"({os.path.getsize('bench.db') / 2**20:.0f} MiB with the search index)")
+
+        client = app.test_client()
+        def search(q, **params):
+            def run():
+                response = client.get('/api/chat/search', query_string=dict(params, project_id=PROJECT, q=q))
+                assert response.status_code == 200, response.get_json()
+                return response.get_json()
+            return run
+
+        first_page = search(words[0])()
+        cases = [
+            ('rare', search(RARE_WORD)),
+            ('common', search(words[0])),
+            ('two words', search(f'{words[0]} {words[1]}')),
+            ('prefix', search(words[5][:3] + '*')),
+            ('topic', search(words[0], chat_id='topic-3')),
+            ('page 2', search(words[0], cursor=first_page['next_cursor'])),
+        ]
+        print(f"{'query':10s} {'median':>10s} {'results':>8s}")
+        for name, run in cases:
+            elapsed, page = median_ms(run, args.repeat)
+            print(f"{name:10s} {elapsed:8.1f}ms {len(page['results']):8d}")
+
+        def scan():
+            return db.session.execute(text(
+                'SELECT id FROM messages WHERE project_id = :project_id AND content LIKE :pattern ORDER BY id LIMIT 20'
+            ), {'project_id': PROJECT, 'pattern': f'%{RARE_WORD}%'}).all()
+        elapsed, rows = median_ms(scan, max(1, args.repeat // 2))
+        print(f"{'LIKE scan':10s} {elapsed:8.1f}ms {len(rows):8d}  (rare word, unranked, no snippets)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Login storm benchmark: does a burst of logins slow down everything else?
+Starts gunicorn (wsgi:app, gunicorn.conf.py) on a scratch SQLite database
+and measures the latency of a non-auth endpoint, GET /api/project/<id>,
+from one probe client:
+
+  idle    - nothing else going on
+  inline  - while --storm clients log in back to back, with
+            PASSWORD_HASH_WORKERS=0 so PBKDF2 runs in the request threads
+  pool    - the same storm with hashing on the password_hashing pool
+
+The report shows probe p50/p99 latency, logins per second and how many
+logins were turned away with 503 because the hash queue was full.
+
+    python benchmarks/bench_login_storm.py --storm 16 --seconds 10
+"""
+
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_wsgi_workers import BACKEND, free_port, request, wait_until_up
+
+PASSWORD = 'storm password'
+
+def probe(port, path, stop, latencies):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    while not stop.is_set():
+        start = time.perf_counter()
+        conn.request('GET', path)
+        conn.getresponse().read()
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.01)
+    conn.close()
+
+def storm(port, email, stop, counts):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    body = json.dumps({'email': email, 'password': PASSWORD})
+    while not stop.is_set():
+        conn.request('POST', '/api/login', body=body, headers={'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        response.read()
+        counts[response.status] = counts.get(response.status, 0) + 1
+        if response.status == 503:
+            stop.wait(float(response.getheader('Retry-After', 1)))
+    conn.close()
+
+def run(mode, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'storm.db')}", PYTHONPATH=BACKEND)
+        if mode == 'inline':
+            env['PASSWORD_HASH_WORKERS'] = '0'
+        subprocess.run([sys.executable, '-m', 'flask', '--app', 'wsgi', 'init-db'],
+                       cwd=tmp, env=env, check=True, stdout=subprocess.DEVNULL)
+        port = free_port()
+        server = subprocess.Popen([
+            sys.executable, '-m', 'gunicorn', '-c', os.path.join(BACKEND, 'gunicorn.conf.py'),
+            '--workers', '1', '--threads', str(args.threads), '--bind', f'127.0.0.1:{port}',
+            '--log-level', 'warning', 'wsgi:app'
+        ], cwd=tmp, env=env, stdout=subprocess.DEVNULL)
+        try:
+            wait_until_up(port, server)
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            project = request(conn, 'POST', '/api/create-project', {
+                'name': 'Storm', 'creator': 'lead@test.com',
+                'collaborators': [{'email': 'member@test.com', 'responsibilities': ['Backend']}]
+            })['project']['id']
+            for i in range(args.storm):
+                request(conn, 'POST', '/api/signup', {'email': f'storm{i}@test.com', 'password': PASSWORD})
+            conn.close()
+
+            stop = threading.Event()
+            latencies, counts = [], {}
+            threads = [threading.Thread(target=probe, args=(port, f'/api/project/{project}', stop, latencies))]
+            if mode != 'idle':
+                threads += [threading.Thread(target=storm, args=(port, f'storm{i}@test.com', stop, counts))
+                            for i in range(args.storm)]
+            for thread in threads:
+                thread.start()
+            time.sleep(args.seconds)
+            stop.set()
+            for thread in threads:
+                thread.join()
+        finally:
+            server.terminate()
+            server.wait()
+
+    latencies.sort()
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+    return percentile(0.5), percentile(0.99), counts.get(200, 0) / args.seconds, counts.get(503, 0)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--storm', type=int, default=16, help='clients logging in back to back')
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads')
+    parser.add_argument('--seconds', type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(f'{args.storm} login clients, 1 worker x {args.threads} threads, {args.seconds}s per run, '
+          f'{os.cpu_count()} CPUs')
+    print(f"{'mode':<8}{'probe p50 ms':>14}{'probe p99 ms':>14}{'logins/s':>10}{'503s':>7}")
+    for mode in ('idle', 'inline', 'pool'):
+        p50, p99, logins, busy = run(mode, args)
+        print(f'{mode:<8}{p50:>14.1f}{p99:>14.1f}{logins:>10.1f}{busy:>7}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Bulk project import benchmark.
+Creates the same cohort of projects twice against a scratch SQLite database:
+
+  per-request - one POST /api/create-project per project, as the frontend does
+  import      - project_import.import_projects() over a JSON Lines roster,
+                committing one batch of multi-row INSERTs at a time
+
+The report shows wall time, projects per second and SQL statements issued.
+
+    python benchmarks/bench_project_import.py --projects 500 --collaborators 8
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def roster(projects, collaborators):
+    for i in range(projects):
+        yield {
+            'name': f'Cohort project {i}',
+            'creator': f'lead{i}@test.com',
+            'collaborators': [
+                {'email': f'member{i}-{j}@test.com', 'responsibilities': ['Backend', 'Testing']}
+                for j in range(collaborators)
+            ]
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--projects', type=int, default=500)
+    parser.add_argument('--collaborators', type=int, default=8)
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-import-')
+    os.makedirs(os.path.join(workdir, 'instance'))
+    os.chdir(workdir)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+
+    from sqlalchemy import event
+    from app import app, db
+    from project_import import import_projects
+
+    statements = []
+    with app.app_context():
+        db.create_all()
+        event.listen(db.engine, 'before_cursor_execute', lambda *a: statements.append(1))
+        client = app.test_client()
+
+        results = []
+        start = time.perf_counter()
+        for project in roster(args.projects, args.collaborators):
+            client.post('/api/create-project', json=project)
+        results.append(('per-request', time.perf_counter() - start, len(statements)))
+
+        statements.clear()
+        data = '\n'.join(json.dumps(p) for p in roster(args.projects, args.collaborators)).encode()
+        start = time.perf_counter()
+        report = import_projects(io.BytesIO(data), 'jsonl', batch_size=args.batch_size)
+        results.append(('import', time.perf_counter() - start, len(statements)))
+        assert report['created'] == args.projects, report['errors']
+
+    print(f'{args.projects} projects x {args.collaborators} collaborators x 2 responsibilities')
+    for name, elapsed, count in results:
+        print(f'{name:12s} {elapsed:7.2f}s  {args.projects / elapsed:8.0f} projects/s  {count:6d} statements')
+
+if __name__ == '__main__':
+    main()
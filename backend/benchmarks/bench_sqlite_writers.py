@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Concurrent-writer benchmark for the chat/uploads SQLite access patterns.
+Runs the same workload twice against a scratch database:
+
+  raw    - a new sqlite3.connect per request, default rollback journal
+           (what routes/chat.py and routes/uploads.py used to do)
+  engine - connections checked out of a SQLAlchemy engine built with
+           models.engine_options(): pooled, WAL, synchronous=NORMAL and
+           a busy timeout, as the app's shared engine runs
+
+Writer threads insert a message and read back the latest page, some of them
+holding the write transaction open for a while like create_snapshot does.
+Reader threads poll the latest page like the chatroom does, and some walk a
+longer result set slowly, holding their read lock like a history listing. The report shows
+throughput and how many requests failed with "database is locked".
+
+    python benchmarks/bench_sqlite_writers.py --writers 16 --readers 16 --seconds 5
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+
+from models import engine_options
+
+SCHEMA = '''CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    content TEXT,
+    chat_id TEXT NOT NULL,
+    project_id TEXT NOT NULL
+)'''
+PAGE_QUERY = 'SELECT id, username, content FROM messages WHERE project_id = ? AND chat_id = ? ORDER BY id DESC LIMIT 50'
+
+def raw_request(path, timeout, work):
+    conn = sqlite3.connect(path, timeout=timeout)
+    try:
+        work(conn)
+        conn.commit()
+    finally:
+        conn.close()
+
+def engine_request(engine, timeout, work):
+    # The raw DBAPI connection, so both modes run the same sqlite3 calls
+    conn = engine.raw_connection()
+    try:
+        work(conn)
+        conn.commit()
+    finally:
+        conn.close()
+
+def write_work(hold):
+    def work(conn):
+        conn.execute("INSERT INTO messages (username, content, chat_id, project_id) VALUES ('bench', 'hello', 'general', 'p1')")
+        if hold:
+            time.sleep(hold)
+        conn.execute(PAGE_QUERY, ('p1', 'general')).fetchall()
+    return work
+
+def read_work(conn):
+    conn.execute(PAGE_QUERY, ('p1', 'general')).fetchall()
+
+def scan_work(hold):
+    def work(conn):
+        # Walks a result set row by row, keeping its read lock the whole time
+        for i, _ in enumerate(conn.execute('SELECT id FROM messages ORDER BY id LIMIT 200')):
+            if i % 20 == 0:
+                time.sleep(hold / 10)
+    return work
+
+def run(mode, path, writers, readers, seconds, hold, timeout):
+    if mode == 'raw':
+        request, target = raw_request, path
+    else:
+        url = f'sqlite:///{path}'
+        # One pooled connection per thread, like a threaded worker at full load
+        target = create_engine(url, pool_size=writers + readers, **engine_options(url))
+        request = engine_request
+    counts = {'ok': 0, 'locked': 0, 'other': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def loop(work):
+        while time.perf_counter() < deadline:
+            try:
+                request(target, timeout, work)
+                outcome = 'ok'
+            except sqlite3.OperationalError as e:
+                outcome = 'locked' if 'locked' in str(e) else 'other'
+            with lock:
+                counts[outcome] += 1
+
+    threads = [threading.Thread(target=loop, args=(write_work(hold if i % 4 == 0 else 0),)) for i in range(writers)]
+    threads += [threading.Thread(target=loop, args=(scan_work(hold) if i % 4 == 0 else read_work,)) for i in range(readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if mode != 'raw':
+        target.dispose()
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', type=int, default=16)
+    parser.add_argument('--readers', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--hold', type=float, default=0.05, help='seconds a slow writer keeps its transaction open')
+    parser.add_argument('--timeout', type=float, default=5.0, help='sqlite3.connect timeout for raw mode (library default 5s)')
+    args = parser.parse_args()
+
+    print(f'{args.writers} writers, {args.readers} readers, {args.seconds}s per mode')
+    print(f"{'mode':<8}{'requests/s':>12}{'ok':>10}{'locked':>10}{'other':>8}")
+    for mode in ('raw', 'engine'):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.db')
+            conn = sqlite3.connect(path)
+            conn.execute(SCHEMA)
+            conn.execute('CREATE INDEX idx_messages_project_chat_id ON messages (project_id, chat_id, id)')
+            conn.commit()
+            conn.close()
+            counts = run(mode, path, args.writers, args.readers, args.seconds, args.hold, args.timeout)
+        rate = counts['ok'] / args.seconds
+        print(f"{mode:<8}{rate:>12.0f}{counts['ok']:>10}{counts['locked']:>10}{counts['other']:>8}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for worker processes, from `python -X importtime`.
+Imports wsgi (or --module) in fresh interpreters and reports the median total
+import time, the part spent in the backend's own modules, and the slowest of
+those. It fails if either median is over its budget, or if a module that is
+meant to load on first use (SMTP, Pillow, migrations, ...) was imported at
+startup.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 10 --budget-ms 1500 --own-budget-ms 250
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Budgets for a warm bytecode cache; the total is dominated by Flask and SQLAlchemy
+TOTAL_BUDGET_MS = 1500
+OWN_BUDGET_MS = 250
+# Loaded on first use, never by importing the app
+LAZY_MODULES = ('smtplib', 'email.mime', 'PIL', 'migrations', 'project_import')
+
+LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+def own_modules():
+    names = {name[:-3] for name in os.listdir(BACKEND) if name.endswith('.py')}
+    return names | {'routes'}
+
+def import_profile(module, workdir):
+    env = dict(os.environ, PYTHONPATH=BACKEND,
+               DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'startup.db')}")
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=workdir, env=env, capture_output=True, text=True, check=True)
+    rows = []
+    for match in LINE.finditer(result.stderr):
+        rows.append((match.group(4), int(match.group(1)), int(match.group(2))))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='wsgi')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=TOTAL_BUDGET_MS)
+    parser.add_argument('--own-budget-ms', type=float, default=OWN_BUDGET_MS)
+    parser.add_argument('--top', type=int, default=8, help='slowest backend modules to list')
+    args = parser.parse_args()
+
+    own = own_modules()
+    totals, own_totals, self_times = [], [], {}
+    with tempfile.TemporaryDirectory() as workdir:
+        # The first run compiles bytecode; it is not counted
+        import_profile(args.module, workdir)
+        for _ in range(args.runs):
+            rows = import_profile(args.module, workdir)
+            loaded = {name for name, _, _ in rows}
+            totals.append(next(total for name, _, total in rows if name == args.module) / 1000)
+            own_rows = [(name, self_us) for name, self_us, _ in rows if name.split('.')[0] in own]
+            own_totals.append(sum(self_us for _, self_us in own_rows) / 1000)
+            for name, self_us in own_rows:
+                self_times.setdefault(name, []).append(self_us / 1000)
+
+    total, own_total = statistics.median(totals), statistics.median(own_totals)
+    eager = [lazy for lazy in LAZY_MODULES if any(name == lazy or name.startswith(lazy + '.') for name in loaded)]
+
+    print(f'import {args.module}: median of {args.runs} runs')
+    print(f'  total        {total:8.1f} ms   (budget {args.budget_ms:.0f} ms)')
+    print(f'  own modules  {own_total:8.1f} ms   (budget {args.own_budget_ms:.0f} ms)')
+    print('  slowest own modules (self time):')
+    for name, times in sorted(self_times.items(), key=lambda item: -statistics.median(item[1]))[:args.top]:
+        print(f'    {name:<24}{statistics.median(times):8.1f} ms')
+
+    failures = []
+    if total > args.budget_ms:
+        failures.append(f'total import time {total:.0f} ms is over the {args.budget_ms:.0f} ms budget')
+    if own_total > args.own_budget_ms:
+        failures.append(f'own modules take {own_total:.0f} ms, over the {args.own_budget_ms:.0f} ms budget')
+    if eager:
+        failures.append('imported at startup but meant to load lazily: ' + ', '.join(eager))
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
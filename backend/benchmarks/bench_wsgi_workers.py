@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Load test for the gunicorn deployment (wsgi:app with gunicorn.conf.py).
+For each worker count it prepares a scratch SQLite database with
+`flask --app wsgi init-db`, seeds projects through the API, starts gunicorn
+and drives it from several client processes over keep-alive connections.
+The report shows requests per second and latency percentiles per worker
+count; throughput should grow with workers until the CPU cores run out.
+
+    python benchmarks/bench_wsgi_workers.py --workers 1 2 4 --threads 4 --clients 16 --seconds 10
+    python benchmarks/bench_wsgi_workers.py --path /api/project/{project_id}/milestones
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MEMBER = 'member@test.com'
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def request(conn, method, path, body=None):
+    headers = {'Content-Type': 'application/json'} if body is not None else {}
+    conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+    response = conn.getresponse()
+    data = response.read()
+    if response.status != 200:
+        raise RuntimeError(f'{method} {path}: HTTP {response.status}')
+    return json.loads(data)
+
+def wait_until_up(port, server, deadline=30):
+    end = time.monotonic() + deadline
+    while time.monotonic() < end:
+        if server.poll() is not None:
+            raise RuntimeError('gunicorn exited during startup')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            request(conn, 'GET', f'/api/user-projects/{MEMBER}')
+            conn.close()
+            return
+        except (OSError, http.client.HTTPException):
+            time.sleep(0.1)
+    raise RuntimeError('gunicorn did not come up')
+
+def seed(port, projects):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    ids = []
+    for i in range(projects):
+        created = request(conn, 'POST', '/api/create-project', {
+            'name': f'Load {i}',
+            'creator': f'lead{i}@test.com',
+            'collaborators': [{'email': MEMBER, 'responsibilities': ['Backend', 'Testing']}] +
+                             [{'email': f'user{i}-{j}@test.com', 'responsibilities': ['Design']} for j in range(5)]
+        })
+        ids.append(created['project']['id'])
+    conn.close()
+    return ids
+
+def client(port, path, seconds, results):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    latencies = []
+    errors = 0
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        start = time.perf_counter()
+        try:
+            conn.request('GET', path)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+    results.put((latencies, errors))
+
+def run(workers, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'load.db')}", PYTHONPATH=BACKEND)
+        subprocess.run([sys.executable, '-m', 'flask', '--app', 'wsgi', 'init-db'],
+                       cwd=tmp, env=env, check=True, stdout=subprocess.DEVNULL)
+        port = free_port()
+        server = subprocess.Popen([
+            sys.executable, '-m', 'gunicorn', '-c', os.path.join(BACKEND, 'gunicorn.conf.py'),
+            '--workers', str(workers), '--threads', str(args.threads), '--bind', f'127.0.0.1:{port}',
+            '--log-level', 'warning', 'wsgi:app'
+        ], cwd=tmp, env=env, stdout=subprocess.DEVNULL)
+        try:
+            wait_until_up(port, server)
+            project_ids = seed(port, args.projects)
+            path = args.path.format(email=MEMBER, project_id=project_ids[0])
+
+            results = multiprocessing.Queue()
+            clients = [multiprocessing.Process(target=client, args=(port, path, args.seconds, results))
+                       for _ in range(args.clients)]
+            for process in clients:
+                process.start()
+            outcomes = [results.get() for _ in clients]
+            for process in clients:
+                process.join()
+        finally:
+            server.terminate()
+            server.wait()
+
+    latencies = sorted(latency for batch, _ in outcomes for latency in batch)
+    errors = sum(count for _, count in outcomes)
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0
+    return len(latencies) / args.seconds, percentile(0.5), percentile(0.99), errors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=16, help='concurrent client processes')
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--projects', type=int, default=20, help='projects the member belongs to')
+    parser.add_argument('--path', default='/api/user-projects/{email}',
+                        help='GET path to load; {email} and {project_id} are filled in')
+    args = parser.parse_args()
+
+    print(f'GET {args.path}, {args.clients} clients, {args.threads} threads per worker, '
+          f'{args.seconds}s per run, {os.cpu_count()} CPUs')
+    print(f"{'workers':<9}{'requests/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for workers in args.workers:
+        rate, p50, p99, errors = run(workers, args)
+        print(f'{workers:<9}{rate:>12.0f}{p50:>10.1f}{p99:>10.1f}{errors:>8}')
+
+if __name__ == '__main__':
+    main()
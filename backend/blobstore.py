@@ -0,0 +1,172 @@
+"""
+Content-addressed blob store for project uploads.
+Every stored file lives once under uploads/.blobs/<sha256[:2]>/<sha256> and is
+hard-linked into the project tree, so identical uploads share one copy on disk.
+The blobs table counts references; a blob is removed when the
+last uploaded_files row or snapshot pointing at it lets go.
+
+Files follow the database transaction: a released blob is only unlinked
+once the commit that dropped its last reference has gone through, and on
+rollback the blobs and project files this transaction added are removed
+again unless something else refers to them.
+"""
+
+import hashlib
+import os
+import shutil
+import uuid
+
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.orm import Session
+
+from models import db, insert_for, Blob
+
+BLOB_FOLDER = os.path.join('uploads', '.blobs')
+TMP_FOLDER = os.path.join(BLOB_FOLDER, 'tmp')
+CHUNK_SIZE = 1024 * 1024
+
+def blob_path(digest):
+    return os.path.join(BLOB_FOLDER, digest[:2], digest)
+
+def hash_file(path):
+    """SHA-256 and size of a file, read in chunks"""
+    sha = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha.update(chunk)
+            size += len(chunk)
+    return sha.hexdigest(), size
+
+def spool_stream(stream):
+    """Hash a stream while writing it into the store, returning (digest, size).
+
+    Content that is already stored is discarded after hashing, so a duplicate
+    upload only costs the refcount update. No reference is added; callers
+    follow up with add_ref() in their transaction.
+    """
+    os.makedirs(TMP_FOLDER, exist_ok=True)
+    tmp_path = os.path.join(TMP_FOLDER, uuid.uuid4().hex)
+    sha = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, 'wb') as out:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                sha.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        digest = sha.hexdigest()
+        _commit_temp(tmp_path, digest)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return digest, size
+
+def store_file(path, digest=None, move=False):
+    """Add a file that is already on disk to the store, returning (digest, size).
+
+    With move=True the file itself becomes the blob (no copy) when the
+    content is new; otherwise it is hard-linked or copied in.
+    """
+    if digest is None:
+        digest, size = hash_file(path)
+    else:
+        size = os.path.getsize(path)
+    target = blob_path(digest)
+    if not os.path.exists(target):
+        os.makedirs(TMP_FOLDER, exist_ok=True)
+        tmp_path = os.path.join(TMP_FOLDER, uuid.uuid4().hex)
+        try:
+            if move:
+                os.replace(path, tmp_path)
+            else:
+                link_or_copy(path, tmp_path)
+            _commit_temp(tmp_path, digest)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    elif move:
+        os.remove(path)
+    add_ref(digest, size)
+    return digest, size
+
+def add_ref(digest, size, count=1):
+    _pending(db.session, 'blobs_added').add(digest)
+    stmt = insert_for(Blob).values(hash=digest, size=size, refcount=count)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[Blob.hash], set_={'refcount': Blob.refcount + stmt.excluded.refcount}
+    ))
+
+def release(digest, count=1):
+    """Drop references to a blob; its file goes after commit once nothing points at it"""
+    if not digest:
+        return
+    db.session.execute(update(Blob).where(Blob.hash == digest).values(refcount=Blob.refcount - count))
+    refcount = db.session.scalar(select(Blob.refcount).where(Blob.hash == digest))
+    if refcount is not None and refcount <= 0:
+        db.session.execute(delete(Blob).where(Blob.hash == digest))
+        _pending(db.session, 'blobs_released').add(digest)
+
+def link_into(digest, dest_path):
+    """Materialize a blob at dest_path, sharing the inode when the filesystem allows.
+    Returns the number of bytes copied, 0 when it was linked."""
+    os.makedirs(os.path.dirname(dest_path) or '.', exist_ok=True)
+    return link_or_copy(blob_path(digest), dest_path)
+
+def remove_on_rollback(path):
+    """Delete a file written for the current transaction if that transaction rolls back"""
+    _pending(db.session, 'files_added').add(path)
+
+def _commit_temp(tmp_path, digest):
+    target = blob_path(digest)
+    if os.path.exists(target):
+        return
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(tmp_path, target)
+
+def link_or_copy(src, dest):
+    """Hard-link src to dest, falling back to a streamed copy across filesystems.
+    Returns the number of bytes copied, 0 when it was linked."""
+    try:
+        os.link(src, dest)
+        return 0
+    except OSError:
+        shutil.copyfile(src, dest)
+        return os.path.getsize(dest)
+
+def _pending(session, kind):
+    return session.info.setdefault(kind, set())
+
+def _remove_unreferenced(session, digests):
+    """Unlink the blobs among digests that have no blobs row"""
+    try:
+        with session.get_bind().connect() as conn:
+            kept = set(conn.scalars(select(Blob.hash).where(Blob.hash.in_(digests))))
+    except Exception as e:
+        print(f'Could not check blob references, keeping {len(digests)} blobs: {e}')
+        return
+    for digest in digests - kept:
+        try:
+            os.remove(blob_path(digest))
+        except FileNotFoundError:
+            pass
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    session.info.pop('blobs_added', None)
+    session.info.pop('files_added', None)
+    released = session.info.pop('blobs_released', None)
+    if released:
+        _remove_unreferenced(session, released)
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop('blobs_released', None)
+    for path in session.info.pop('files_added', ()):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    added = session.info.pop('blobs_added', None)
+    if added:
+        _remove_unreferenced(session, added)
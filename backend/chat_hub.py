@@ -0,0 +1,129 @@
+"""
+In-process fan-out hub for chat messages.
+Routes publish newly inserted messages here and every open /api/chat/stream
+subscriber for the same (project_id, chat_id) receives them immediately.
+The hub only spans one process. For messages posted in other processes one
+poller thread per process reads the database while anyone is subscribed and
+publishes what it finds, so idle streams cost no queries of their own.
+Subscribers resume from the database via Last-Event-ID, so a dropped or
+overflowed subscriber never loses messages either.
+"""
+
+import os
+import queue
+import threading
+from collections import defaultdict
+
+SUBSCRIBER_QUEUE_SIZE = 500
+POLL_SECONDS = float(os.environ.get('CHAT_POLL_SECONDS', 2))
+POLL_BATCH_SIZE = 500
+
+class Subscription:
+    def __init__(self, key):
+        self.key = key
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def get(self, timeout):
+        """Next message, None if the hub dropped us; raises queue.Empty on timeout"""
+        return self.queue.get(timeout=timeout)
+
+class ChatHub:
+    def __init__(self, app=None):
+        self.app = app
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+        self._poller = None
+        self._stopping = threading.Event()
+
+    def init_app(self, app):
+        """The poller runs outside any request, so it uses this app's context for the database"""
+        self.app = app
+
+    def subscribe(self, project_id, chat_id):
+        subscription = Subscription((project_id, chat_id))
+        with self._lock:
+            self._subscribers[subscription.key].add(subscription)
+            if self.app is not None and self._poller is None:
+                self._start_poller()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.key)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.key]
+
+    def publish(self, project_id, chat_id, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get((project_id, chat_id), ()))
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(message)
+            except queue.Full:
+                # Slow consumer: cut it loose, the client reconnects with Last-Event-ID
+                self.unsubscribe(subscription)
+                _force_put(subscription.queue, None)
+
+    def stop(self, timeout=5):
+        self._stopping.set()
+        if self._poller is not None:
+            self._poller.join(timeout)
+
+    def _start_poller(self):
+        # Called under _lock on the first subscribe, so each process gets one
+        with self.app.app_context():
+            last_id = _latest_id()
+        self._poller = threading.Thread(target=self._poll, args=(last_id,), name='chat-hub-poller', daemon=True)
+        self._poller.start()
+
+    def _poll(self, last_id):
+        while not self._stopping.wait(POLL_SECONDS):
+            with self._lock:
+                keys = list(self._subscribers)
+            if not keys:
+                continue
+            try:
+                with self.app.app_context():
+                    last_id = self._publish_newer(keys, last_id)
+            except Exception as e:
+                print(f'Chat hub poll failed: {e}')
+
+    def _publish_newer(self, keys, last_id):
+        """Publish the subscribed topics' messages after last_id; returns the new last id.
+        Messages this process posted were published already and subscribers skip ids they have."""
+        from routes.chat import serialize_message
+        while True:
+            rows = _messages_after(keys, last_id)
+            for row in rows:
+                self.publish(row.project_id, row.chat_id, serialize_message(row))
+                last_id = row.id
+            if len(rows) < POLL_BATCH_SIZE:
+                return last_id
+
+def _latest_id():
+    from models import db, Message
+    return db.session.scalar(db.select(db.func.max(Message.id))) or 0
+
+def _messages_after(keys, last_id):
+    from sqlalchemy import tuple_
+    from models import db, Message
+    return db.session.scalars(
+        db.select(Message)
+        .where(Message.id > last_id, tuple_(Message.project_id, Message.chat_id).in_(keys))
+        .order_by(Message.id).limit(POLL_BATCH_SIZE)
+    ).all()
+
+def _force_put(q, item):
+    while True:
+        try:
+            q.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+
+hub = ChatHub()
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+Check that every milestone's task counters and progress match its tasks.
+
+    python check_milestones.py          # report drift
+    python check_milestones.py --fix    # also rewrite the drifted counters
+"""
+import argparse
+
+from app import app, migrate_database, recount_milestones
+
+def check_milestones(fix):
+    with app.app_context():
+        migrate_database()
+        mismatches = recount_milestones(fix=fix)
+        for milestone_id, stored, actual in mismatches:
+            print(f'Milestone {milestone_id}: stored {stored}, actual {actual}')
+        if not mismatches:
+            print('All milestone counters are consistent')
+        elif fix:
+            print(f'Fixed {len(mismatches)} milestones')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fix', action='store_true', help='rewrite counters that do not match')
+    check_milestones(parser.parse_args().fix)
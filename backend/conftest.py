@@ -0,0 +1,72 @@
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+from sqlalchemy import text
+
+# The app creates its databases and upload folders relative to the working
+# directory at import time, so point everything at a throwaway directory
+# before any test module imports it. Set DATABASE_URL to run the suite
+# against another database, e.g. a local PostgreSQL.
+_workdir = tempfile.mkdtemp(prefix='stormhacks-tests-')
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_workdir, 'test.db')}")
+os.makedirs(os.path.join(_workdir, 'instance'), exist_ok=True)
+os.chdir(_workdir)
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture(scope='session')
+def empty_database():
+    """Create the schema once; on SQLite keep a copy of the empty file for every test to start from"""
+    from app import app, db
+    with app.app_context():
+        db.create_all()
+        engine = db.engine
+    template = None
+    if engine.url.get_backend_name() == 'sqlite':
+        # Closing the last connection checkpoints the WAL into the main file
+        engine.dispose()
+        template = engine.url.database + '.empty'
+        shutil.copyfile(engine.url.database, template)
+    return engine, template
+
+@pytest.fixture(autouse=True)
+def database(empty_database):
+    """Each test gets the schema with no rows in it"""
+    from models import db
+    engine, template = empty_database
+    # Pooled connections would keep the previous test's database open
+    engine.dispose()
+    if template:
+        path = engine.url.database
+        for stale in (path + '-wal', path + '-shm'):
+            if os.path.exists(stale):
+                os.remove(stale)
+        shutil.copyfile(template, path + '.tmp')
+        os.replace(path + '.tmp', path)
+    else:
+        tables = ', '.join(engine.dialect.identifier_preparer.quote(table.name)
+                           for table in db.metadata.sorted_tables)
+        with engine.begin() as conn:
+            conn.execute(text(f'TRUNCATE {tables} RESTART IDENTITY CASCADE'))
+    return engine
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Uploads, blobs and other relative paths land in a directory of the test's own"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+@pytest.fixture
+def client():
+    from app import app
+    return app.test_client()
+
+@pytest.fixture
+def app_context():
+    """For tests that use the models directly"""
+    from app import app
+    with app.app_context():
+        yield
@@ -0,0 +1,222 @@
+"""
+Persistent email outbox with a background worker pool.
+Routes call enqueue() and return straight away; the job is stored in the
+email_outbox table and a worker thread delivers it. Each worker keeps one
+authenticated SMTP session open and reuses it across messages instead of
+connecting, running STARTTLS and logging in for every email. Failed sends
+are retried with exponential backoff until MAX_ATTEMPTS.
+
+A claimed job is leased to its worker for SEND_LEASE_SECONDS. If the worker's
+process dies mid-send, any worker in any process claims the job again once
+the lease runs out, so several app processes can share one outbox.
+
+The SMTP host, port, TLS and credentials come from the environment, so the
+workers can be pointed at a local stand-in (e.g. `python -m aiosmtpd -n -l
+localhost:8025` with SMTP_SERVER=localhost SMTP_PORT=8025 SMTP_USE_TLS=0).
+"""
+
+import os
+import threading
+import time
+
+from sqlalchemy import select, update
+
+from models import db, format_timestamp, EmailJob
+
+SMTP_SERVER = os.environ.get('SMTP_SERVER', 'smtp.gmail.com')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', 587))
+SMTP_USE_TLS = os.environ.get('SMTP_USE_TLS', '1') != '0'
+EMAIL_USERNAME = os.environ.get('EMAIL_USERNAME', 'synchronusdevteam@gmail.com')
+EMAIL_PASSWORD = os.environ.get('EMAIL_PASSWORD', 'ehmnofarhueptrwc')
+
+WORKER_COUNT = int(os.environ.get('EMAIL_WORKERS', 2))
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 5
+POLL_SECONDS = 5
+SMTP_IDLE_SECONDS = 60
+SEND_LEASE_SECONDS = 300
+
+class SMTPSession:
+    """One long-lived SMTP connection, reopened when it drops or goes stale"""
+
+    def __init__(self, smtp_factory=None):
+        self.smtp_factory = smtp_factory
+        self.server = None
+        self.last_used = 0
+
+    def send(self, to_email, message):
+        import smtplib
+        if self.server is not None and time.monotonic() - self.last_used > SMTP_IDLE_SECONDS:
+            self.close()
+        if self.server is None:
+            self.server = self._connect()
+        try:
+            self.server.sendmail(EMAIL_USERNAME, to_email, message)
+        except smtplib.SMTPServerDisconnected:
+            # The server hung up between messages; reconnect once and retry
+            self.server = self._connect()
+            self.server.sendmail(EMAIL_USERNAME, to_email, message)
+        self.last_used = time.monotonic()
+
+    def close(self):
+        import smtplib
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.server = None
+
+    def _connect(self):
+        # smtplib and email.mime load on the first send, not when the app imports the outbox
+        import smtplib
+        server = (self.smtp_factory or smtplib.SMTP)(SMTP_SERVER, SMTP_PORT)
+        if SMTP_USE_TLS:
+            server.starttls()
+        if EMAIL_USERNAME and EMAIL_PASSWORD:
+            server.login(EMAIL_USERNAME, EMAIL_PASSWORD)
+        return server
+
+def build_message(to_email, subject, body):
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+    msg = MIMEMultipart()
+    msg['From'] = EMAIL_USERNAME
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain'))
+    return msg.as_string()
+
+class Outbox:
+    def __init__(self, worker_count=WORKER_COUNT, smtp_factory=None, app=None):
+        self.worker_count = worker_count
+        self.smtp_factory = smtp_factory
+        self.app = app
+        self._wakeup = threading.Condition()
+        # Set under _wakeup when a job is queued, so a notify that lands between a
+        # worker's empty claim and its wait() is not lost
+        self._pending = False
+        self._stopping = False
+        self._workers = []
+        self._started = False
+        self._start_lock = threading.Lock()
+
+    def init_app(self, app):
+        """Workers run outside any request, so they use this app's context for the database"""
+        self.app = app
+
+    def enqueue(self, to_email, subject, body):
+        """Store an email for delivery and return its job id"""
+        self.start()
+        with self.app.app_context():
+            job = EmailJob(to_email=to_email, subject=subject, body=body, next_attempt_at=time.time())
+            db.session.add(job)
+            db.session.commit()
+            job_id = job.id
+        with self._wakeup:
+            self._pending = True
+            self._wakeup.notify()
+        return job_id
+
+    def status(self, job_id):
+        self.start()
+        with self.app.app_context():
+            job = db.session.get(EmailJob, job_id)
+            if job is None:
+                return None
+            return {
+                'id': job.id,
+                'to_email': job.to_email,
+                'subject': job.subject,
+                'status': job.status,
+                'attempts': job.attempts,
+                'last_error': job.last_error,
+                'created_at': format_timestamp(job.created_at),
+                'sent_at': format_timestamp(job.sent_at)
+            }
+
+    def start(self):
+        """Start the worker threads once per process"""
+        if self._started:
+            return
+        with self._start_lock:
+            if self._started:
+                return
+            for i in range(self.worker_count):
+                worker = threading.Thread(target=self._run, name=f'email-outbox-{i}', daemon=True)
+                worker.start()
+                self._workers.append(worker)
+            self._started = True
+
+    def stop(self, timeout=5):
+        self._stopping = True
+        with self._wakeup:
+            self._pending = True
+            self._wakeup.notify_all()
+        for worker in self._workers:
+            worker.join(timeout)
+
+    def _claim(self):
+        with self.app.app_context():
+            # Due queued jobs, and jobs whose sending lease ran out
+            now = time.time()
+            # SKIP LOCKED lets PostgreSQL workers pass over each other's rows; the guarded
+            # UPDATE below is what keeps two workers from claiming the same job elsewhere
+            row = db.session.execute(
+                select(EmailJob.id, EmailJob.to_email, EmailJob.subject, EmailJob.body, EmailJob.attempts,
+                       EmailJob.status, EmailJob.next_attempt_at)
+                .where(EmailJob.status.in_(('queued', 'sending')), EmailJob.next_attempt_at <= now)
+                .order_by(EmailJob.next_attempt_at, EmailJob.id)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            ).first()
+            if row is None:
+                db.session.rollback()
+                return None
+            claimed = db.session.execute(
+                update(EmailJob)
+                .where(EmailJob.id == row.id, EmailJob.status == row.status,
+                       EmailJob.next_attempt_at == row.next_attempt_at)
+                .values(status='sending', next_attempt_at=now + SEND_LEASE_SECONDS)
+            ).rowcount
+            db.session.commit()
+            return dict(row._mapping) if claimed else None
+
+    def _finish(self, job, error=None):
+        attempts = job['attempts'] + 1
+        if error is None:
+            values = {'status': 'sent', 'attempts': attempts, 'last_error': None, 'sent_at': db.func.current_timestamp()}
+        elif attempts >= MAX_ATTEMPTS:
+            values = {'status': 'failed', 'attempts': attempts, 'last_error': error}
+        else:
+            values = {'status': 'queued', 'attempts': attempts, 'last_error': error,
+                      'next_attempt_at': time.time() + RETRY_BASE_SECONDS * 2 ** (attempts - 1)}
+        with self.app.app_context():
+            db.session.execute(update(EmailJob).where(EmailJob.id == job['id']).values(**values))
+            db.session.commit()
+
+    def _run(self):
+        session = SMTPSession(self.smtp_factory)
+        try:
+            while not self._stopping:
+                job = self._claim()
+                if job is None:
+                    if session.server is not None and time.monotonic() - session.last_used > SMTP_IDLE_SECONDS:
+                        session.close()
+                    with self._wakeup:
+                        if not self._pending:
+                            self._wakeup.wait(POLL_SECONDS)
+                        self._pending = False
+                    continue
+                try:
+                    session.send(job['to_email'], build_message(job['to_email'], job['subject'], job['body']))
+                    self._finish(job)
+                    print(f"Email {job['id']} sent to {job['to_email']}")
+                except Exception as e:
+                    session.close()
+                    self._finish(job, str(e))
+                    print(f"Email {job['id']} to {job['to_email']} failed: {e}")
+        finally:
+            session.close()
+
+outbox = Outbox()
@@ -0,0 +1,126 @@
+"""
+Indexed folder tree for project uploads.
+The folders and uploaded_files tables are the authoritative listing of a
+project: folders carry a materialized path plus its parent_path, and
+uploaded_files carries folder_path, so both the tree and a folder's contents
+come from indexed queries instead of walking the disk. The upload, folder
+and revert routes keep the index in step with disk; reconcile_project()
+rebuilds it from disk for anything that drifted.
+"""
+
+import os
+import re
+
+from sqlalchemy import delete, func, insert, or_, select, update
+
+import blobstore
+from models import db, insert_for, Folder, UploadedFile
+from snapshots import scan_tree
+
+UPLOAD_FOLDER = 'uploads'
+UUID_PREFIX = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}_')
+
+def parent_of(path):
+    """Parent folder of a materialized path, or None at the project root"""
+    return path.rsplit('/', 1)[0] if '/' in path else None
+
+def ensure_folders(project_id, folder_path):
+    """Record folder_path and all of its ancestors"""
+    if not folder_path:
+        return
+    parts = folder_path.split('/')
+    db.session.execute(
+        insert_for(Folder).on_conflict_do_nothing(index_elements=['path', 'project_id']),
+        [{'name': parts[i], 'path': '/'.join(parts[:i + 1]), 'parent_path': '/'.join(parts[:i]) or None,
+          'project_id': project_id} for i in range(len(parts))]
+    )
+
+def folder_exists(project_id, folder_path):
+    return db.session.scalar(
+        select(Folder.id).where(Folder.project_id == project_id, Folder.path == folder_path)
+    ) is not None
+
+def in_folder(column, folder_path):
+    """column is folder_path or anything below it"""
+    prefix = folder_path + '/'
+    return or_(column == folder_path, func.substr(column, 1, len(prefix)) == prefix)
+
+def remove_folder(project_id, folder_path):
+    """Drop a folder, everything below it and their blob references"""
+    removed = db.session.execute(
+        select(UploadedFile.id, UploadedFile.blob_hash)
+        .where(UploadedFile.project_id == project_id, in_folder(UploadedFile.folder_path, folder_path))
+    ).all()
+    for file_id, blob_hash in removed:
+        db.session.execute(delete(UploadedFile).where(UploadedFile.id == file_id))
+        blobstore.release(blob_hash)
+    db.session.execute(
+        delete(Folder).where(Folder.project_id == project_id, in_folder(Folder.path, folder_path))
+        .execution_options(synchronize_session=False)
+    )
+
+def reconcile_project(project_id):
+    """Make the index match what is on disk for one project and return counters"""
+    project_folder = os.path.join(UPLOAD_FOLDER, project_id)
+    tree = scan_tree(project_folder)
+    stats = {'folders_added': 0, 'folders_removed': 0, 'files_added': 0, 'files_removed': 0, 'files_updated': 0}
+
+    on_disk = {path for path, (kind, _, _) in tree.items() if kind == 'folder'}
+    indexed = set(db.session.scalars(select(Folder.path).where(Folder.project_id == project_id)))
+    for path in indexed - on_disk:
+        db.session.execute(delete(Folder).where(Folder.project_id == project_id, Folder.path == path))
+        stats['folders_removed'] += 1
+    for path in sorted(on_disk - indexed):
+        ensure_folders(project_id, path)
+        stats['folders_added'] += 1
+
+    files = {
+        os.path.join(project_folder, *path.split('/')): (path, size)
+        for path, (kind, size, _) in tree.items() if kind == 'file'
+    }
+    rows = db.session.execute(
+        select(UploadedFile.id, UploadedFile.file_path, UploadedFile.blob_hash, UploadedFile.file_size)
+        .where(UploadedFile.project_id == project_id).order_by(UploadedFile.id)
+    ).all()
+    seen = set()
+    for file_id, file_path, blob_hash, file_size in rows:
+        if file_path not in files or file_path in seen:
+            db.session.execute(delete(UploadedFile).where(UploadedFile.id == file_id))
+            blobstore.release(blob_hash)
+            stats['files_removed'] += 1
+            continue
+        seen.add(file_path)
+        size = files[file_path][1]
+        if size != file_size or not blob_hash:
+            # Content changed under us; re-register it with the blob store
+            digest, size = blobstore.store_file(file_path)
+            blobstore.release(blob_hash)
+            db.session.execute(
+                update(UploadedFile).where(UploadedFile.id == file_id).values(file_size=size, blob_hash=digest)
+            )
+            stats['files_updated'] += 1
+
+    new_files = []
+    for file_path in files.keys() - seen:
+        relative_path = files[file_path][0]
+        filename = os.path.basename(file_path)
+        digest, size = blobstore.store_file(file_path)
+        new_files.append({
+            'filename': filename, 'original_filename': UUID_PREFIX.sub('', filename), 'file_path': file_path,
+            'folder_path': parent_of(relative_path), 'file_size': size, 'project_id': project_id, 'blob_hash': digest
+        })
+    if new_files:
+        db.session.execute(insert(UploadedFile), new_files)
+    stats['files_added'] = len(new_files)
+    return stats
+
+def project_ids():
+    """Every project that has an upload folder or index rows"""
+    ids = {project_id for project_id in db.session.scalars(
+        select(Folder.project_id).union(select(UploadedFile.project_id))
+    ) if project_id}
+    if os.path.isdir(UPLOAD_FOLDER):
+        ids.update(name for name in os.listdir(UPLOAD_FOLDER)
+                   if not name.startswith('.') and name != 'profiles'
+                   and os.path.isdir(os.path.join(UPLOAD_FOLDER, name)))
+    return sorted(ids)
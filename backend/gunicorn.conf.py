@@ -0,0 +1,47 @@
+"""
+Gunicorn settings for wsgi:app. Each value can be overridden from the
+environment or on the command line.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+    gunicorn -c gunicorn.conf.py --workers 4 --threads 8 wsgi:app
+"""
+
+import multiprocessing
+import os
+import glob
+import tempfile
+
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Threaded workers, so an open /api/chat/stream holds a thread rather than a
+# process. It holds it for as long as the tab is open, so each worker serves at
+# most CHAT_MAX_STREAMS streams (default GUNICORN_THREADS - 2) and answers the
+# rest with 503 + Retry-After; raise both together to serve more tabs per worker.
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+keepalive = 5
+# Connection pools are opened lazily, so nothing is shared across the fork
+# either way; loading per worker keeps restarts independent
+preload_app = False
+
+def on_starting(server):
+    """Give the workers a fresh directory for their /metrics numbers (see metrics.py)"""
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        # Numbers left over from an earlier run would be added to this one's
+        os.makedirs(path, exist_ok=True)
+        for stale in glob.glob(os.path.join(path, '*.db')):
+            os.remove(stale)
+    else:
+        os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='prometheus-')
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+def post_worker_init(worker):
+    """Start the email outbox workers as soon as a worker has loaded the app,
+    so emails queued before a restart go out without waiting for a new one"""
+    from email_outbox import outbox
+    outbox.start()
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Create projects in bulk from a CSV or JSON Lines roster.
+
+    python import_projects.py cohort.csv
+    python import_projects.py cohort.jsonl --batch-size 1000
+"""
+import argparse
+import os
+
+from app import app, migrate_database
+from project_import import import_projects, BATCH_SIZE
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('roster', help='CSV or JSON Lines file')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help='defaults to the file extension')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='projects per transaction')
+    args = parser.parse_args()
+    fmt = args.format or os.path.splitext(args.roster)[1].lstrip('.').lower()
+
+    with app.app_context():
+        migrate_database()
+        with open(args.roster, 'rb') as stream:
+            report = import_projects(stream, fmt, batch_size=args.batch_size)
+
+    for error in report['errors']:
+        print(f"Line {error['line']}: {error['error']}")
+    print(f"Created {report['created']} projects, {report['failed']} failed")
+
+if __name__ == '__main__':
+    main()
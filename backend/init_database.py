@@ -5,7 +5,7 @@ This ensures all tables are created and the database is properly set up
 for persistent project storage across multiple app instances.
 """
 
-from app import app, db, User, Project, Collaborator, Responsibility, Milestone, Task
+from app import app, db, migrate_database, User, Project, Collaborator, Responsibility, Milestone, Task
 import os
 
 def init_database():
@@ -22,7 +22,7 @@ def init_database():
             
             # Create all tables
             print("Creating database tables...")
-            db.create_all()
+            migrate_database()
             
             # Verify tables were created
             tables = db.engine.table_names()
@@ -6,11 +6,11 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 try:
-    from app import app, db, User
+    from app import app, db, migrate_database, User
     
     with app.app_context():
         # Create all tables
-        db.create_all()
+        migrate_database()
         print("Database tables created successfully!")
         
         # Test database connection by creating a test user
@@ -0,0 +1,192 @@
+"""
+Full-text search over chat messages.
+On SQLite the messages_fts FTS5 table (models.MESSAGES_FTS_DDL) indexes
+message content and triggers keep it in step with messages; results are
+ranked by bm25. On PostgreSQL the same search runs on to_tsvector(content),
+which idx_messages_search indexes, ranked by ts_rank_cd.
+
+Matches are ranked SEARCH_WINDOW at a time, newest window first. The index
+hands a window over in id order without reading the rest, so a word in half
+of a million messages takes tens of milliseconds instead of seconds. Once a
+window's matches have been paged through, the cursor moves on to the next
+older window, so every match is reachable. Snippets are made for the
+returned page only. A trailing * matches the last word as a prefix. That is
+opt-in: a longer prefix of a common word makes FTS5 read every message
+containing it, and messages_fts only indexes 2 and 3 letter prefixes.
+
+Pages are walked with a keyset cursor over (rank, id) within a window whose
+upper id bound the cursor pins, so later pages cost the same as the first
+and messages posted in between do not shift the window. They do change the
+corpus statistics, so results can still move across a page boundary.
+"""
+
+import html
+import re
+
+from sqlalchemy import bindparam, text
+
+from models import db, Message
+
+SEARCH_WINDOW = 1000
+SNIPPET_TOKENS = 16
+TOKEN = re.compile(r'\w+')
+# Private-use characters mark the hits in a snippet; the snippet is escaped
+# before they become <mark> tags, so message content cannot inject markup
+MARK_START, MARK_END = '\ue000', '\ue001'
+BRACKETS = '\ue002\ue003'
+
+# The window columns are computed before the cursor filters the rows, so
+# every page knows where its window ends and whether an older one follows
+SQLITE_SEARCH = '''SELECT id, rank, window_first, window_last, window_size FROM (
+    SELECT id, rank, MIN(id) OVER () AS window_first, MAX(id) OVER () AS window_last,
+        COUNT(*) OVER () AS window_size
+    FROM (
+        SELECT m.id, bm25(messages_fts) AS rank
+        FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid
+        WHERE messages_fts MATCH :query AND m.project_id = :project_id {filters} {before}
+        ORDER BY messages_fts.rowid DESC
+        LIMIT :window
+    ) AS matches
+) AS recent
+WHERE TRUE {cursor}
+ORDER BY rank, id
+LIMIT :limit'''
+SQLITE_BEFORE = 'AND messages_fts.rowid < :before'
+
+# FTS5 runs the match once per value of a rowid IN constraint, which for a
+# prefix query means expanding the prefix again each time; a rowid range is
+# one pass, and snippets are only made for the page's rows within it
+SQLITE_SNIPPETS = '''SELECT rowid AS id,
+    CASE WHEN rowid IN :ids THEN snippet(messages_fts, 0, :mark_start, :mark_end, '…', :snippet_tokens) END AS snippet
+FROM messages_fts
+WHERE messages_fts MATCH :query AND rowid BETWEEN :first AND :last'''
+
+# The WHERE clause repeats the indexed expression so idx_messages_search is
+# used. ts_rank_cd returns a real; as a double the rank a cursor carries back
+# compares equal to the one it was read from.
+POSTGRES_SEARCH = '''SELECT id, rank, window_first, window_last, window_size FROM (
+    SELECT id, rank, MIN(id) OVER () AS window_first, MAX(id) OVER () AS window_last,
+        COUNT(*) OVER () AS window_size
+    FROM (
+        SELECT m.id,
+            -ts_rank_cd(to_tsvector('english', coalesce(m.content, '')), to_tsquery('english', :query))::float8 AS rank
+        FROM messages m
+        WHERE to_tsvector('english', coalesce(m.content, '')) @@ to_tsquery('english', :query)
+            AND m.project_id = :project_id {filters} {before}
+        ORDER BY m.id DESC
+        LIMIT :window
+    ) AS matches
+) AS recent
+WHERE TRUE {cursor}
+ORDER BY rank, id
+LIMIT :limit'''
+POSTGRES_BEFORE = 'AND m.id < :before'
+
+# ts_headline drops anything shaped like an HTML tag, so angle brackets go in
+# as private-use stand-ins and highlight() turns them back
+POSTGRES_SNIPPETS = '''SELECT id, ts_headline('english', translate(coalesce(content, ''), '<>', :brackets),
+    to_tsquery('english', :query),
+    'StartSel=' || :mark_start || ', StopSel=' || :mark_end || ', MaxWords=' || :snippet_tokens
+    || ', MinWords=' || (:snippet_tokens / 2)) AS snippet
+FROM messages
+WHERE id IN :ids'''
+
+def query_terms(q):
+    """Words of a search box query, and whether the last one ends in * to match
+    as a prefix. Punctuation is dropped so it can never be query syntax."""
+    q = (q or '').rstrip()
+    return TOKEN.findall(q), q.endswith('*')
+
+def fts5_query(terms, prefix):
+    # Every term must match
+    quoted = [f'"{term}"' for term in terms]
+    if prefix:
+        quoted[-1] += '*'
+    return ' '.join(quoted)
+
+def tsquery(terms, prefix):
+    quoted = [f"'{term}'" for term in terms]
+    if prefix:
+        quoted[-1] += ':*'
+    return ' & '.join(quoted)
+
+def encode_cursor(before, rank=None, message_id=None):
+    """Cursor into the window of matches below id before; without a rank and
+    id it points at the start of that window"""
+    if rank is None:
+        return str(before)
+    return f'{before}:{rank!r}:{message_id}'
+
+def decode_cursor(cursor):
+    """(before, (rank, id) or None); ValueError if malformed"""
+    parts = cursor.split(':')
+    if len(parts) == 1:
+        return int(parts[0]), None
+    if len(parts) != 3:
+        raise ValueError(f'Invalid cursor: {cursor}')
+    return int(parts[0]), (float(parts[1]), int(parts[2]))
+
+def highlight(snippet):
+    snippet = (snippet or '').replace(BRACKETS[0], '<').replace(BRACKETS[1], '>')
+    return html.escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+def search_messages(project_id, q, chat_id=None, limit=20, cursor=None):
+    """One page of a project's messages containing every word of q, best first
+    within each window. Returns (results, next_cursor); each result is a
+    Message with its highlighted snippet, and next_cursor is None on the last page."""
+    terms, prefix = query_terms(q)
+    if not terms:
+        return [], None
+    before, after = decode_cursor(cursor) if cursor else (None, None)
+
+    postgres = db.engine.dialect.name == 'postgresql'
+    search, snippets, before_filter = ((POSTGRES_SEARCH, POSTGRES_SNIPPETS, POSTGRES_BEFORE) if postgres
+                                       else (SQLITE_SEARCH, SQLITE_SNIPPETS, SQLITE_BEFORE))
+    params = {'project_id': project_id, 'window': SEARCH_WINDOW,
+              'query': tsquery(terms, prefix) if postgres else fts5_query(terms, prefix)}
+    filters = ''
+    if chat_id:
+        filters = 'AND m.chat_id = :chat_id'
+        params['chat_id'] = chat_id
+
+    page, next_cursor = [], None
+    while True:
+        keyset = ''
+        if after is not None:
+            params['after_rank'], params['after_id'] = after
+            keyset = 'AND (rank > :after_rank OR (rank = :after_rank AND id > :after_id))'
+        params['before'] = before
+        params['limit'] = limit - len(page) + 1
+        rows = db.session.execute(text(search.format(
+            filters=filters, before=before_filter if before is not None else '', cursor=keyset
+        )), params).all()
+        if not rows:
+            break
+        if before is None:
+            # Pin the first window so messages posted while paging do not shift it
+            before = rows[0].window_last + 1
+        remaining = limit - len(page)
+        page += rows[:remaining]
+        if len(rows) > remaining:
+            next_cursor = encode_cursor(before, page[-1].rank, page[-1].id)
+            break
+        if rows[0].window_size < SEARCH_WINDOW:
+            break
+        # This window is used up; older matches follow in the next one
+        before, after = rows[0].window_first, None
+        if len(page) == limit:
+            next_cursor = encode_cursor(before)
+            break
+
+    if not page:
+        return [], None
+    ids = [row.id for row in page]
+    highlighted = dict(db.session.execute(
+        text(snippets).bindparams(bindparam('ids', expanding=True)),
+        {'query': params['query'], 'ids': ids, 'first': min(ids), 'last': max(ids), 'brackets': BRACKETS,
+         'mark_start': MARK_START, 'mark_end': MARK_END, 'snippet_tokens': SNIPPET_TOKENS}
+    ).all())
+    messages = {message.id: message for message in Message.query.filter(Message.id.in_(ids)).all()}
+    results = [(messages[message_id], highlight(highlighted.get(message_id)))
+               for message_id in ids if message_id in messages]
+    return results, next_cursor
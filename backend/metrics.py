@@ -0,0 +1,119 @@
+"""
+Request metrics in the Prometheus text format, served at GET /metrics.
+
+Per endpoint (the view function, e.g. api.get_milestones) and method:
+
+  http_request_duration_seconds      latency histogram
+  http_response_size_bytes           body size histogram (streamed bodies
+                                     have no size up front and are left out)
+  http_requests_total                requests by status code
+  http_requests_in_flight            requests being handled right now
+  db_queries_per_request             SQL statements a request ran
+  db_query_seconds_per_request       time a request spent in them
+
+SQL is counted from the engine's cursor events, so it covers ORM queries and
+text() statements alike; statements run outside a request (outbox workers,
+CLI commands) are not counted.
+
+Under gunicorn every worker keeps its own numbers. gunicorn.conf.py points
+PROMETHEUS_MULTIPROC_DIR at a scratch directory so the workers write them
+there and /metrics adds them up, whichever worker answers the scrape.
+"""
+
+import os
+import time
+
+from flask import g, has_app_context, request, Response
+from prometheus_client import (CollectorRegistry, Counter, Gauge, Histogram, REGISTRY,
+                               CONTENT_TYPE_LATEST, generate_latest)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+LABELS = ('endpoint', 'method')
+
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'Request latency',
+                            LABELS, buckets=LATENCY_BUCKETS)
+RESPONSE_BYTES = Histogram('http_response_size_bytes', 'Response body size',
+                           LABELS, buckets=SIZE_BUCKETS)
+REQUESTS = Counter('http_requests', 'Requests handled', LABELS + ('status',))
+IN_FLIGHT = Gauge('http_requests_in_flight', 'Requests being handled',
+                  LABELS, multiprocess_mode='livesum')
+DB_QUERIES = Histogram('db_queries_per_request', 'SQL statements run by a request',
+                       LABELS, buckets=QUERY_COUNT_BUCKETS)
+DB_SECONDS = Histogram('db_query_seconds_per_request', 'Time a request spent running SQL',
+                       LABELS, buckets=LATENCY_BUCKETS)
+
+class RequestStats:
+    __slots__ = ('labels', 'started', 'status', 'queries', 'query_seconds')
+
+    def __init__(self, labels):
+        self.labels = labels
+        self.started = time.perf_counter()
+        self.status = 500
+        self.queries = 0
+        self.query_seconds = 0.0
+
+class Metrics:
+    def init_app(self, app):
+        app.before_request(self.start_request)
+        app.after_request(self.record_response)
+        app.teardown_request(self.finish_request)
+        app.add_url_rule('/metrics', 'metrics', self.export)
+
+    def start_request(self):
+        # 404s have no endpoint; one shared label keeps scanners from adding a series per path
+        stats = g.request_stats = RequestStats((request.endpoint or 'unmatched', request.method))
+        IN_FLIGHT.labels(*stats.labels).inc()
+
+    def record_response(self, response):
+        stats = g.get('request_stats')
+        if stats is not None:
+            stats.status = response.status_code
+            # Content-Length is set for send_file responses too; only streams go without
+            if response.content_length is not None:
+                RESPONSE_BYTES.labels(*stats.labels).observe(response.content_length)
+        return response
+
+    def finish_request(self, exc):
+        stats = g.pop('request_stats', None)
+        if stats is None:
+            return
+        REQUEST_SECONDS.labels(*stats.labels).observe(time.perf_counter() - stats.started)
+        REQUESTS.labels(*stats.labels, str(stats.status)).inc()
+        DB_QUERIES.labels(*stats.labels).observe(stats.queries)
+        DB_SECONDS.labels(*stats.labels).observe(stats.query_seconds)
+        IN_FLIGHT.labels(*stats.labels).dec()
+
+    def export(self):
+        registry = REGISTRY
+        if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+            from prometheus_client import multiprocess
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+metrics = Metrics()
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+def _query_done(conn):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    stats = g.get('request_stats') if has_app_context() else None
+    if stats is not None:
+        stats.queries += 1
+        stats.query_seconds += elapsed
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    _query_done(conn)
+
+@event.listens_for(Engine, 'handle_error')
+def _query_failed(context):
+    # Failed statements count too: a lock timeout is exactly the slow query to see
+    if context.connection is not None and context.connection.info.get('query_started'):
+        _query_done(context.connection)
@@ -0,0 +1,263 @@
+"""
+Versioned schema migrations.
+db.create_all() creates any table that does not exist yet from models.py;
+the steps here upgrade tables that older code created, which create_all
+leaves alone. Each component keeps its applied versions in
+schema_migrations, and migrate() applies the missing steps in order, each in
+the same transaction as its version row. Steps use plain SQL that SQLite and
+PostgreSQL both accept.
+
+    uploads - files, folders, history, snapshots and blobs (once uploads.db)
+    chat    - chat and email outbox tables
+    models  - the project and milestone models
+
+Add a step by appending (version, description, function) to the component's
+list.
+"""
+
+import os
+
+from sqlalchemy import create_engine, inspect, select, text, Integer
+
+MIGRATIONS_TABLE = '''CREATE TABLE IF NOT EXISTS schema_migrations (
+    component TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    description TEXT NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (component, version)
+)'''
+
+# Uploads lived in their own SQLite file before everything moved onto one engine
+LEGACY_UPLOADS_DB = 'uploads.db'
+LEGACY_UPLOAD_TABLES = ('blobs', 'folders', 'uploaded_files', 'history', 'snapshots',
+                        'snapshot_entries', 'upload_sessions')
+COPY_BATCH_SIZE = 500
+
+class Target:
+    """Migration target over a SQLAlchemy connection"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=None):
+        result = self.conn.execute(text(sql), params or {})
+        return result.fetchall() if result.returns_rows else []
+
+    def columns(self, table):
+        return {column['name'] for column in inspect(self.conn).get_columns(table)}
+
+def add_column(target, table, column, definition):
+    """ALTER TABLE ADD COLUMN unless the column is already there"""
+    if column not in target.columns(table):
+        # "user" is reserved in PostgreSQL
+        name = target.conn.dialect.identifier_preparer.quote(table)
+        target.execute(f'ALTER TABLE {name} ADD COLUMN {column} {definition}')
+
+def applied_versions(target, component):
+    target.execute(MIGRATIONS_TABLE)
+    return {row[0] for row in target.execute(
+        'SELECT version FROM schema_migrations WHERE component = :component', {'component': component}
+    )}
+
+def apply(target, component, steps):
+    """Run the steps of component that have not been applied yet; returns the versions applied"""
+    done = applied_versions(target, component)
+    applied = []
+    for version, description, step in steps:
+        if version in done:
+            continue
+        step(target)
+        target.execute(
+            'INSERT INTO schema_migrations (component, version, description) VALUES (:component, :version, :description)',
+            {'component': component, 'version': version, 'description': description}
+        )
+        print(f'Applied {component} migration {version}: {description}')
+        applied.append(version)
+    return applied
+
+def created_by_models(target):
+    """Versions that only added tables; db.create_all() makes those"""
+
+def copy_rows(source, target, table, batch_size=COPY_BATCH_SIZE):
+    """Copy every row of a table from the source connection, over the columns both sides have"""
+    source_columns = {column['name'] for column in inspect(source).get_columns(table.name)}
+    columns = [column for column in table.columns if column.name in source_columns]
+    result = source.execute(select(*columns))
+    copied = 0
+    while True:
+        rows = result.fetchmany(batch_size)
+        if not rows:
+            break
+        target.conn.execute(table.insert(), [dict(row._mapping) for row in rows])
+        copied += len(rows)
+    reset_sequence(target, table)
+    return copied
+
+def reset_sequence(target, table):
+    """Move a PostgreSQL serial past ids that were copied in explicitly"""
+    if target.conn.dialect.name != 'postgresql' or 'id' not in table.c:
+        return
+    if not isinstance(table.c.id.type, Integer):
+        return
+    name = target.conn.dialect.identifier_preparer.quote(table.name)
+    target.execute(f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {name}")
+
+# Uploads
+
+def uploads_baseline(target):
+    # Databases from before projects were split out lack project_id
+    for table in ('folders', 'uploaded_files', 'history', 'snapshots'):
+        add_column(target, table, 'project_id', 'TEXT')
+
+def uploads_blob_store(target):
+    add_column(target, 'uploaded_files', 'blob_hash', 'TEXT')
+
+def uploads_manifest_snapshots(target):
+    add_column(target, 'snapshots', 'parent_id', 'INTEGER')
+    add_column(target, 'snapshots', 'format', 'TEXT')
+    add_column(target, 'snapshots', 'chain_length', 'INTEGER DEFAULT 0')
+
+def backfill_parent_paths(target):
+    # Root folders stay NULL
+    for folder_id, path in target.execute(
+        "SELECT id, path FROM folders WHERE parent_path IS NULL AND path LIKE '%/%'"
+    ):
+        target.execute('UPDATE folders SET parent_path = :parent WHERE id = :id',
+                       {'parent': path.rsplit('/', 1)[0], 'id': folder_id})
+
+def uploads_folder_index(target):
+    add_column(target, 'folders', 'parent_path', 'TEXT')
+    backfill_parent_paths(target)
+    target.execute('CREATE INDEX IF NOT EXISTS idx_folders_project_parent ON folders (project_id, parent_path, name)')
+    target.execute('CREATE INDEX IF NOT EXISTS idx_folders_project_path ON folders (project_id, path)')
+    target.execute('CREATE INDEX IF NOT EXISTS idx_uploaded_files_project_folder ON uploaded_files (project_id, folder_path)')
+    target.execute('CREATE INDEX IF NOT EXISTS idx_uploaded_files_project_path ON uploaded_files (project_id, file_path)')
+
+def uploads_history_indexes(target):
+    # get_history: latest entries of a project
+    target.execute('CREATE INDEX IF NOT EXISTS idx_history_project_timestamp ON history (project_id, timestamp)')
+    # revert_to_version: newest snapshot at or before a history entry
+    target.execute('CREATE INDEX IF NOT EXISTS idx_snapshots_project_created ON snapshots (project_id, created_at, id)')
+    # create_snapshot: the project's latest manifest snapshot
+    target.execute('CREATE INDEX IF NOT EXISTS idx_snapshots_project_format ON snapshots (project_id, format, id)')
+    # Expiring abandoned chunked uploads
+    target.execute('CREATE INDEX IF NOT EXISTS idx_upload_sessions_updated ON upload_sessions (updated_at)')
+
+def uploads_merge_legacy_db(target):
+    """Copy the tables of a separate uploads.db into this database"""
+    if not os.path.exists(LEGACY_UPLOADS_DB):
+        return
+    if target.execute('SELECT 1 FROM folders UNION ALL SELECT 1 FROM uploaded_files LIMIT 1'):
+        print(f'Not merging {LEGACY_UPLOADS_DB}: this database already has uploads')
+        return
+
+    from models import db
+    source_engine = create_engine(f'sqlite:///{LEGACY_UPLOADS_DB}')
+    try:
+        with source_engine.connect() as source:
+            existing = set(inspect(source).get_table_names())
+            for name in LEGACY_UPLOAD_TABLES:
+                if name in existing:
+                    copied = copy_rows(source, target, db.metadata.tables[name])
+                    print(f'Merged {copied} rows of {name} from {LEGACY_UPLOADS_DB}')
+    finally:
+        source_engine.dispose()
+    # Folders from an uploads.db older than the folder index have no parent_path yet
+    backfill_parent_paths(target)
+
+UPLOADS_MIGRATIONS = [
+    (1, 'baseline tables', uploads_baseline),
+    (2, 'content-addressed blob store', uploads_blob_store),
+    (3, 'manifest snapshots', uploads_manifest_snapshots),
+    (4, 'chunked upload sessions', created_by_models),
+    (5, 'folder index', uploads_folder_index),
+    (6, 'history and snapshot indexes', uploads_history_indexes),
+    (7, 'merge uploads.db into the main database', uploads_merge_legacy_db),
+]
+
+# Chat
+
+def chat_baseline(target):
+    for table in ('messages', 'chat_groups', 'chat_topics'):
+        add_column(target, table, 'project_id', "TEXT NOT NULL DEFAULT ''")
+
+def chat_message_index(target):
+    # Cursor pagination walks messages by id within a topic
+    target.execute('CREATE INDEX IF NOT EXISTS idx_messages_project_chat_id ON messages (project_id, chat_id, id)')
+
+def chat_email_outbox(target):
+    target.execute('CREATE INDEX IF NOT EXISTS idx_email_outbox_status_next ON email_outbox (status, next_attempt_at)')
+
+def chat_topic_index(target):
+    # get_topics lists a project's topics oldest first
+    target.execute('CREATE INDEX IF NOT EXISTS idx_chat_topics_project_created ON chat_topics (project_id, created_at)')
+
+def chat_message_search(target):
+    from models import MESSAGES_FTS_DDL, MESSAGES_SEARCH_INDEX
+    if target.conn.dialect.name == 'postgresql':
+        target.execute(MESSAGES_SEARCH_INDEX)
+        return
+    for statement in MESSAGES_FTS_DDL:
+        target.execute(statement)
+    # Index the messages that were posted before search existed
+    target.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+
+def chat_text_user_ids(target):
+    # The chat client sends emails as user ids. SQLite stores them in the old
+    # INTEGER columns as text anyway; PostgreSQL needs the type changed.
+    if target.conn.dialect.name != 'postgresql':
+        return
+    for table, column in (('messages', 'user_id'), ('chat_groups', 'created_by'), ('group_members', 'user_id')):
+        target.execute(f'ALTER TABLE {table} ALTER COLUMN {column} TYPE TEXT USING {column}::text')
+
+CHAT_MIGRATIONS = [
+    (1, 'baseline tables', chat_baseline),
+    (2, 'message cursor index', chat_message_index),
+    (3, 'email outbox', chat_email_outbox),
+    (4, 'topic listing index', chat_topic_index),
+    (5, 'message search index', chat_message_search),
+    (6, 'text user ids', chat_text_user_ids),
+]
+
+# Projects and milestones
+
+def models_milestone_counters(target):
+    add_column(target, 'milestone', 'todo_count', 'INTEGER NOT NULL DEFAULT 0')
+    add_column(target, 'milestone', 'in_progress_count', 'INTEGER NOT NULL DEFAULT 0')
+    add_column(target, 'milestone', 'done_count', 'INTEGER NOT NULL DEFAULT 0')
+
+def models_lookup_indexes(target):
+    # Same names create_all() gives the model indexes, so fresh databases skip these
+    for statement in (
+        'CREATE INDEX IF NOT EXISTS ix_project_creator ON project (creator)',
+        'CREATE INDEX IF NOT EXISTS ix_collaborator_project_id ON collaborator (project_id)',
+        'CREATE INDEX IF NOT EXISTS ix_collaborator_email_project ON collaborator (email, project_id)',
+        'CREATE INDEX IF NOT EXISTS ix_responsibility_collaborator_id ON responsibility (collaborator_id)',
+        'CREATE INDEX IF NOT EXISTS ix_milestone_project_id ON milestone (project_id)',
+        'CREATE INDEX IF NOT EXISTS ix_task_milestone_id ON task (milestone_id)',
+        'CREATE INDEX IF NOT EXISTS ix_milestone_member_milestone_id ON milestone_member (milestone_id)',
+    ):
+        target.execute(statement)
+
+def models_token_version(target):
+    add_column(target, 'user', 'token_version', 'INTEGER NOT NULL DEFAULT 0')
+
+MODELS_MIGRATIONS = [
+    (1, 'milestone progress counters', models_milestone_counters),
+    (2, 'lookup indexes', models_lookup_indexes),
+    (3, 'user token version', models_token_version),
+]
+
+COMPONENTS = [
+    ('uploads', UPLOADS_MIGRATIONS),
+    ('chat', CHAT_MIGRATIONS),
+    ('models', MODELS_MIGRATIONS),
+]
+
+def migrate(db):
+    """Create missing tables and apply pending steps; returns {component: versions applied}.
+    Call inside an app context."""
+    db.create_all()
+    with db.engine.begin() as conn:
+        target = Target(conn)
+        return {component: apply(target, component, steps) for component, steps in COMPONENTS}
@@ -0,0 +1,103 @@
+"""
+Password hashing on a process pool.
+PBKDF2 is meant to be slow: a hash takes a quarter of a second of CPU. Run
+inline, a burst of logins has every request thread of a worker computing
+hashes, and the other endpoints queue behind them for CPU and for a free
+thread. Here hashes run in a few pool processes with a lower scheduling
+priority, so other requests keep getting the CPU, and at most
+PASSWORD_HASH_QUEUE request threads may be waiting on a hash at once; past
+that HashingBusy is raised and the endpoint asks the client to retry. Keep
+the limit below the threads per worker (GUNICORN_THREADS) so some threads
+are always free for everything else.
+
+The hash method and cost come from PASSWORD_HASH_METHOD, in any form werkzeug
+accepts (pbkdf2:sha256:600000, scrypt, ...). werkzeug fills in the defaults
+left out, so stored hashes are compared with the prefix it writes for the
+method (see stored_method), and a password whose stored hash used anything else
+is rehashed with the current method on its next successful login.
+
+Each app process starts its own pool on the first hash. Set
+PASSWORD_HASH_WORKERS=0 to hash in the request thread instead.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 1) // 2)))
+MAX_PENDING = int(os.environ.get('PASSWORD_HASH_QUEUE', 4))
+HASH_NICENESS = int(os.environ.get('PASSWORD_HASH_NICE', 10))
+
+class HashingBusy(Exception):
+    """More password hashes are waiting than the queue allows"""
+
+def stored_method(method):
+    """The method as werkzeug writes it in front of a hash, with the defaults it
+    fills in: pbkdf2:sha256 is stored as pbkdf2:sha256:600000, scrypt as
+    scrypt:32768:8:1. Unknown methods come back unchanged."""
+    name, *args = method.split(':')
+    if name == 'scrypt' and not args:
+        return 'scrypt:32768:8:1'
+    if name == 'pbkdf2' and len(args) < 2:
+        hash_name = args[0] if args else 'sha256'
+        return f'pbkdf2:{hash_name}:{DEFAULT_PBKDF2_ITERATIONS}'
+    return method
+
+def lower_priority(niceness):
+    os.nice(niceness)
+
+class PasswordHasher:
+    def __init__(self, workers=HASH_WORKERS, max_pending=MAX_PENDING, method=PASSWORD_HASH_METHOD):
+        self.workers = workers
+        self.method = method
+        self.stored_method = stored_method(method)
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, stored, password):
+        return self._run(check_password_hash, stored, password)
+
+    def needs_rehash(self, stored):
+        """Whether stored was hashed with another method or cost than the current one"""
+        return stored.split('$', 1)[0] != self.stored_method
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+    def _run(self, function, *args):
+        if not self.workers:
+            return function(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy('Too many password checks in progress')
+        try:
+            return self._executor().submit(function, *args).result()
+        except BrokenProcessPool:
+            # A pool process died (e.g. OOM-killed); start a fresh pool for the next call
+            with self._lock:
+                self._pool = None
+            raise
+        finally:
+            self._slots.release()
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn rather than fork: the app process already runs threads (outbox
+                # workers, gthread), and a forked child would inherit their locks mid-use
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                                 initializer=lower_priority, initargs=(HASH_NICENESS,))
+            return self._pool
+
+hasher = PasswordHasher()
@@ -0,0 +1,83 @@
+"""
+In-process cache of public user profiles (name, email, photo) for chat
+avatars and names. load_profiles() answers from the cache and fetches the
+rest with one IN query; emails with no user are cached as misses too, since
+chat shows plenty of authors who never signed up.
+
+Entries expire after PROFILE_CACHE_SECONDS and the least recently used go
+once there are PROFILE_CACHE_SIZE. Signup and the profile endpoints
+invalidate the entries they change, but only in their own process: another
+app process can show the old name or photo until the entry expires.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from models import User
+
+PROFILE_CACHE_SIZE = int(os.environ.get('PROFILE_CACHE_SIZE', 4096))
+PROFILE_CACHE_SECONDS = float(os.environ.get('PROFILE_CACHE_SECONDS', 60))
+
+class ProfileCache:
+    """Bounded LRU of email -> profile (or None for no such user) with a TTL"""
+
+    def __init__(self, maxsize=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_SECONDS, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, emails):
+        """({email: profile or None} for the fresh entries, [emails to look up])"""
+        now = self.clock()
+        found, missing = {}, []
+        with self._lock:
+            for email in emails:
+                entry = self._entries.get(email)
+                if entry is None or entry[0] <= now:
+                    missing.append(email)
+                    continue
+                self._entries.move_to_end(email)
+                found[email] = entry[1]
+        return found, missing
+
+    def put_many(self, profiles):
+        expires = self.clock() + self.ttl
+        with self._lock:
+            for email, profile in profiles.items():
+                self._entries[email] = (expires, profile)
+                self._entries.move_to_end(email)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, email):
+        with self._lock:
+            self._entries.pop(email, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+profiles = ProfileCache()
+
+def serialize_profile(user):
+    return {
+        'name': user.name or user.email.split('@')[0],
+        'email': user.email,
+        'profilePhoto': user.profile_photo
+    }
+
+def load_profiles(emails):
+    """{email: profile} for the emails that belong to a user"""
+    emails = list(dict.fromkeys(emails))
+    found, missing = profiles.get_many(emails)
+    if missing:
+        fetched = dict.fromkeys(missing)
+        for user in User.query.filter(User.email.in_(missing)).all():
+            fetched[user.email] = serialize_profile(user)
+        profiles.put_many(fetched)
+        found.update(fetched)
+    return {email: found[email] for email in emails if found[email] is not None}
@@ -0,0 +1,196 @@
+"""
+Bulk project import from a CSV or JSON Lines roster.
+The input is read as a stream, grouped into projects and written in batches:
+each batch is one transaction with one multi-row INSERT per table (projects,
+collaborators, responsibilities) instead of a flush per collaborator. Rows
+that fail validation are reported with their line number and skipped; the
+rest of the file still imports.
+
+CSV rosters have a header with project, creator, email and responsibilities
+columns, one collaborator per row. Consecutive rows with the same project
+and creator make up one project; responsibilities are separated by ';'.
+JSON Lines rosters have one project per line, shaped like the
+/api/create-project payload: {"name", "creator", "collaborators": [...]}.
+"""
+
+import csv
+import io
+import json
+import uuid
+
+from sqlalchemy import insert
+
+from models import db, Project, Collaborator, Responsibility
+
+BATCH_SIZE = 500
+MAX_ERRORS = 1000
+
+class RosterError(ValueError):
+    pass
+
+def read_csv(stream):
+    """Yield (line number, project dict) from a CSV roster"""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    missing = {'project', 'creator'} - set(reader.fieldnames or [])
+    if missing:
+        raise RosterError(f'CSV is missing columns: {", ".join(sorted(missing))}')
+
+    current, current_key, current_line = None, None, None
+    for row in reader:
+        line = reader.line_num
+        key = ((row.get('project') or '').strip(), (row.get('creator') or '').strip())
+        if key != current_key:
+            if current is not None:
+                yield current_line, current
+            current = {'name': key[0], 'creator': key[1], 'collaborators': []}
+            current_key, current_line = key, line
+        email = (row.get('email') or '').strip()
+        if email:
+            current['collaborators'].append({
+                'email': email,
+                'responsibilities': (row.get('responsibilities') or '').split(';')
+            })
+    if current is not None:
+        yield current_line, current
+
+def read_jsonl(stream):
+    """Yield (line number, project dict) from a JSON Lines roster"""
+    for line, raw in enumerate(io.TextIOWrapper(stream, encoding='utf-8-sig'), start=1):
+        if not raw.strip():
+            continue
+        try:
+            yield line, json.loads(raw)
+        except ValueError as e:
+            yield line, RosterError(f'Invalid JSON: {e}')
+
+def read_roster(stream, fmt):
+    if fmt == 'csv':
+        return read_csv(stream)
+    if fmt in ('jsonl', 'ndjson'):
+        return read_jsonl(stream)
+    raise RosterError(f'Unsupported roster format: {fmt}')
+
+def _text(value, field):
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        raise RosterError(f'{field} must be a string')
+    return value.strip()
+
+def validate(project):
+    """Normalized copy of a roster project, or RosterError"""
+    if isinstance(project, RosterError):
+        raise project
+    if not isinstance(project, dict):
+        raise RosterError('Expected a project object')
+    name = _text(project.get('name'), 'Project name')
+    creator = _text(project.get('creator'), 'Creator email')
+    if not name:
+        raise RosterError('Project name is required')
+    if '@' not in creator:
+        raise RosterError('Creator email is required')
+
+    collaborator_list = project.get('collaborators') or []
+    if not isinstance(collaborator_list, list):
+        raise RosterError('Collaborators must be a list')
+
+    # Repeated emails are merged, so (project, email) identifies a collaborator
+    collaborators = {}
+    for collab in collaborator_list:
+        if not isinstance(collab, dict):
+            raise RosterError('Expected a collaborator object')
+        email = _text(collab.get('email'), 'Collaborator email')
+        if not email:
+            continue
+        if '@' not in email:
+            raise RosterError(f'Invalid collaborator email: {email}')
+        descriptions = collab.get('responsibilities') or []
+        if not isinstance(descriptions, list):
+            raise RosterError(f'Responsibilities of {email} must be a list')
+        responsibilities = collaborators.setdefault(email, [])
+        for description in descriptions:
+            description = _text(description, 'Responsibility')
+            if description:
+                responsibilities.append(description)
+    return name, creator, list(collaborators.items())
+
+def import_projects(stream, fmt, batch_size=BATCH_SIZE):
+    """Import a roster and return {'created', 'failed', 'errors', 'projects'}"""
+    report = {'created': 0, 'failed': 0, 'errors': [], 'projects': []}
+    batch = []
+    for line, project in read_roster(stream, fmt):
+        try:
+            batch.append(validate(project))
+        except RosterError as e:
+            report['failed'] += 1
+            if len(report['errors']) < MAX_ERRORS:
+                report['errors'].append({'line': line, 'error': str(e)})
+            continue
+        if len(batch) >= batch_size:
+            _write_batch(batch, report)
+            batch = []
+    if batch:
+        _write_batch(batch, report)
+    return report
+
+def _new_keys(count):
+    """count unused (id, code) pairs, matching the formats create_project uses"""
+    keys = []
+    while len(keys) < count:
+        wanted = count - len(keys)
+        candidates = {(str(uuid.uuid4())[:8], str(uuid.uuid4())[:6].upper()) for _ in range(wanted)}
+        ids = [key[0] for key in candidates]
+        codes = [key[1] for key in candidates]
+        taken_ids = set(db.session.scalars(db.select(Project.id).where(Project.id.in_(ids))))
+        taken_codes = set(db.session.scalars(db.select(Project.code).where(Project.code.in_(codes))))
+        used_ids = {key[0] for key in keys}
+        used_codes = {key[1] for key in keys}
+        for project_id, code in candidates:
+            if project_id in taken_ids or code in taken_codes or project_id in used_ids or code in used_codes:
+                continue
+            keys.append((project_id, code))
+            used_ids.add(project_id)
+            used_codes.add(code)
+    return keys[:count]
+
+def _write_batch(batch, report):
+    try:
+        keys = _new_keys(len(batch))
+        db.session.execute(insert(Project), [
+            {'id': project_id, 'name': name, 'creator': creator, 'code': code}
+            for (project_id, code), (name, creator, _) in zip(keys, batch)
+        ])
+
+        collaborator_rows = []
+        responsibilities_by_key = {}
+        for (project_id, _), (_, _, collaborators) in zip(keys, batch):
+            for email, responsibilities in collaborators:
+                collaborator_rows.append({'project_id': project_id, 'email': email})
+                responsibilities_by_key[(project_id, email)] = responsibilities
+        if collaborator_rows:
+            # RETURNING the natural key matches new ids to their responsibilities without
+            # relying on row order, so the insert stays one multi-row statement
+            returned = db.session.execute(
+                insert(Collaborator).returning(Collaborator.id, Collaborator.project_id, Collaborator.email),
+                collaborator_rows
+            ).all()
+            responsibility_rows = [
+                {'collaborator_id': collaborator_id, 'description': description}
+                for collaborator_id, project_id, email in returned
+                for description in responsibilities_by_key[(project_id, email)]
+            ]
+            if responsibility_rows:
+                db.session.execute(insert(Responsibility), responsibility_rows)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f'Project import batch failed: {e}')
+        report['failed'] += len(batch)
+        report['errors'].append({'line': None, 'error': f'Batch of {len(batch)} projects failed: {e}'})
+        return
+
+    report['created'] += len(batch)
+    report['projects'].extend(
+        {'id': project_id, 'name': name, 'code': code}
+        for (project_id, code), (name, _, _) in zip(keys, batch)
+    )
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+Rebuild the upload folder index from what is on disk.
+
+    python reconcile_uploads.py            # every project
+    python reconcile_uploads.py PROJECT_ID [PROJECT_ID ...]
+"""
+import argparse
+
+from app import app
+from models import db
+from folder_index import reconcile_project, project_ids
+
+def reconcile(projects):
+    with app.app_context():
+        for project_id in projects or project_ids():
+            stats = reconcile_project(project_id)
+            db.session.commit()
+            print(f'{project_id}: ' + ', '.join(f'{key}={value}' for key, value in stats.items()))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('projects', nargs='*', help='project ids to reconcile (default: all)')
+    reconcile(parser.parse_args().projects)
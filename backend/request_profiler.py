@@ -0,0 +1,235 @@
+"""
+On-demand request profiler.
+Profiles a sample of requests and writes one file per request to
+PROFILE_DIR, keeping the newest PROFILE_KEEP. Off by default; it is switched
+on with PROFILE_SAMPLE_RATE or from the admin endpoints (routes/admin.py),
+which write PROFILE_DIR/settings.json, so every worker started from the
+same directory picks the change up within a second.
+
+Settings:
+  sample_rate  fraction of requests to profile, 0 (off) to 1
+  endpoints    endpoint patterns (fnmatch, e.g. uploads.revert_to_version
+               or api.*milestone*); empty means every endpoint
+  format       pstats      - cProfile stats (.prof) for pstats, snakeviz, ...
+               collapsed   - stacks sampled every PROFILE_INTERVAL seconds,
+                             one 'frame;frame;frame count' line per stack,
+                             for flamegraph.pl or speedscope
+
+File names carry the time, method, endpoint and duration, so the index is a
+directory listing and needs no shared state between workers. Writing the
+file adds to the profiled request's own latency.
+"""
+
+import cProfile
+import fnmatch
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from flask import g, request
+
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_ENDPOINTS = [name.strip() for name in os.environ.get('PROFILE_ENDPOINTS', '').split(',') if name.strip()]
+PROFILE_FORMAT = os.environ.get('PROFILE_FORMAT', 'pstats')
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 100))
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', 0.005))
+SETTINGS_FILE = 'settings.json'
+SETTINGS_CHECK_SECONDS = 1.0
+
+FORMATS = {'pstats': 'prof', 'collapsed': 'collapsed'}
+PROFILE_NAME = re.compile(r'^(\d{8}T\d{6})\.\d{3}-[0-9a-f]{8}_([A-Z]+)_(.+)_(\d+)ms\.(prof|collapsed)$')
+
+class CProfileCapture:
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def save(self, path):
+        self.profile.dump_stats(path)
+
+class StackSampler:
+    """Samples the calling thread's stack from a helper thread"""
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def _sample(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._done.set()
+        self._thread.join()
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+CAPTURES = {'pstats': CProfileCapture, 'collapsed': StackSampler}
+
+def check_settings(settings):
+    """The settings with their types checked; raises ValueError"""
+    rate = settings.get('sample_rate')
+    if isinstance(rate, bool) or not isinstance(rate, (int, float)) or not 0 <= rate <= 1:
+        raise ValueError('sample_rate must be a number from 0 to 1')
+    endpoints = settings.get('endpoints')
+    if not isinstance(endpoints, list) or not all(isinstance(name, str) and name for name in endpoints):
+        raise ValueError('endpoints must be a list of endpoint names or patterns')
+    if settings.get('format') not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    return {'sample_rate': float(rate), 'endpoints': endpoints, 'format': settings['format']}
+
+class RequestProfiler:
+    def __init__(self, directory=PROFILE_DIR, keep=PROFILE_KEEP):
+        self.directory = directory
+        self.keep = keep
+        self.defaults = {'sample_rate': PROFILE_SAMPLE_RATE, 'endpoints': PROFILE_ENDPOINTS, 'format': PROFILE_FORMAT}
+        self._settings = self.defaults
+        self._settings_mtime = None
+        self._next_check = 0.0
+
+    def init_app(self, app):
+        app.before_request(self.start_request)
+        app.teardown_request(self.finish_request)
+
+    @property
+    def settings_path(self):
+        return os.path.join(self.directory, SETTINGS_FILE)
+
+    def settings(self):
+        """Current settings, re-read from the settings file at most once a second"""
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + SETTINGS_CHECK_SECONDS
+            try:
+                mtime = os.stat(self.settings_path).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if mtime != self._settings_mtime:
+                self._settings_mtime = mtime
+                self._settings = self._read_settings() if mtime else self.defaults
+        return self._settings
+
+    def _read_settings(self):
+        try:
+            with open(self.settings_path) as f:
+                return check_settings({**self.defaults, **json.load(f)})
+        except (OSError, ValueError) as e:
+            print(f'Ignoring profiler settings in {self.settings_path}: {e}')
+            return self.defaults
+
+    def configure(self, changes):
+        """Apply changes to the settings for every worker; raises ValueError"""
+        settings = check_settings({**self.settings(), **changes})
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = f'{self.settings_path}.{uuid.uuid4().hex}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(settings, f)
+        os.replace(temp_path, self.settings_path)
+        self._next_check = 0.0
+        return self.settings()
+
+    def reset(self):
+        """Back to the settings from the environment"""
+        try:
+            os.remove(self.settings_path)
+        except FileNotFoundError:
+            pass
+        self._next_check = 0.0
+        return self.settings()
+
+    def wants(self, endpoint, settings):
+        if not settings['sample_rate'] or (endpoint or '').startswith('admin.'):
+            return False
+        if settings['endpoints'] and not any(fnmatch.fnmatchcase(endpoint or 'unmatched', pattern)
+                                             for pattern in settings['endpoints']):
+            return False
+        return random.random() < settings['sample_rate']
+
+    def start_request(self):
+        settings = self.settings()
+        if not self.wants(request.endpoint, settings):
+            return
+        try:
+            capture = CAPTURES[settings['format']]()
+        except ValueError:
+            # Another profiler already owns this thread
+            return
+        g.request_profile = (capture, settings['format'], time.perf_counter())
+
+    def finish_request(self, exc):
+        profile = g.pop('request_profile', None)
+        if profile is None:
+            return
+        capture, format, started = profile
+        capture.stop()
+        elapsed_ms = round((time.perf_counter() - started) * 1000)
+        now = time.time()
+        name = (f"{time.strftime('%Y%m%dT%H%M%S', time.localtime(now))}.{int(now % 1 * 1000):03d}-"
+                f"{uuid.uuid4().hex[:8]}_{request.method}_"
+                f"{request.endpoint or 'unmatched'}_{elapsed_ms}ms.{FORMATS[format]}")
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Written under a temporary name so the index never lists a partial file
+            temp_path = os.path.join(self.directory, f'.{name}.tmp')
+            capture.save(temp_path)
+            os.replace(temp_path, os.path.join(self.directory, name))
+            self.rotate()
+        except OSError as e:
+            print(f'Could not save profile {name}: {e}')
+
+    def rotate(self):
+        names = sorted(name for name in os.listdir(self.directory) if PROFILE_NAME.match(name))
+        for name in names[:max(0, len(names) - self.keep)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                # Another worker rotated it first
+                pass
+
+    def profiles(self):
+        """Metadata of the saved profiles, newest first"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        profiles = []
+        for name in names:
+            match = PROFILE_NAME.match(name)
+            if not match:
+                continue
+            captured, method, endpoint, duration, extension = match.groups()
+            profiles.append({
+                'name': name,
+                'captured_at': time.strftime('%Y-%m-%d %H:%M:%S', time.strptime(captured, '%Y%m%dT%H%M%S')),
+                'method': method,
+                'endpoint': endpoint,
+                'duration_ms': int(duration),
+                'format': 'pstats' if extension == 'prof' else 'collapsed',
+            })
+        profiles.sort(key=lambda profile: profile['name'], reverse=True)
+        return profiles
+
+profiler = RequestProfiler()
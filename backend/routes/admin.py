@@ -0,0 +1,60 @@
+from flask import Blueprint, g, request, jsonify, send_from_directory, abort
+import os
+
+from auth_tokens import admin_required
+from request_profiler import profiler, PROFILE_NAME
+
+admin_bp = Blueprint('admin', __name__)
+
+@admin_bp.route('/profiler', methods=['GET'])
+@admin_required
+def get_profiler_settings():
+    return jsonify({'success': True, 'settings': profiler.settings()})
+
+@admin_bp.route('/profiler', methods=['PUT'])
+@admin_required
+def update_profiler_settings():
+    """Switch profiling on, off or to other endpoints for every worker"""
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'success': False, 'message': 'Expected a JSON object of settings'}), 400
+        changes = {key: data[key] for key in ('sample_rate', 'endpoints', 'format') if key in data}
+        settings = profiler.configure(changes)
+        print(f'Profiler settings changed by {g.current_user.email}: {settings}')
+        return jsonify({'success': True, 'settings': settings})
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@admin_bp.route('/profiler', methods=['DELETE'])
+@admin_required
+def reset_profiler_settings():
+    """Back to the settings from the environment"""
+    try:
+        return jsonify({'success': True, 'settings': profiler.reset()})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@admin_bp.route('/profiles', methods=['GET'])
+@admin_required
+def list_profiles():
+    """Saved profiles, slowest first (or newest first with ?sort=recent), optionally for one ?endpoint="""
+    try:
+        profiles = profiler.profiles()
+        endpoint = request.args.get('endpoint')
+        if endpoint:
+            profiles = [profile for profile in profiles if profile['endpoint'] == endpoint]
+        if request.args.get('sort', 'duration') == 'duration':
+            profiles.sort(key=lambda profile: profile['duration_ms'], reverse=True)
+        return jsonify({'success': True, 'profiles': profiles})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@admin_bp.route('/profiles/<name>', methods=['GET'])
+@admin_required
+def download_profile(name):
+    if not PROFILE_NAME.match(name):
+        abort(404)
+    return send_from_directory(os.path.abspath(profiler.directory), name, as_attachment=True)
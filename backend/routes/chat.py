@@ -1,71 +1,65 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, current_app
 from datetime import datetime
-import sqlite3
+import json
+import queue
 import os
+import threading
+
+from sqlalchemy import delete, func
+
+from chat_hub import hub
+from message_search import search_messages
+from models import db, format_timestamp, insert_for, Message, ChatTopic, ChatGroup, GroupMember
 
 chat_bp = Blueprint('chat', __name__)
 
-def get_db():
-    conn = sqlite3.connect('instance/stormhacks.db')
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def init_chat_db():
-    conn = get_db()
-    conn.execute('''CREATE TABLE IF NOT EXISTS messages (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        username TEXT NOT NULL,
-        content TEXT,
-        file_path TEXT,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-        reply_to INTEGER,
-        chat_type TEXT DEFAULT 'public',
-        chat_id TEXT DEFAULT 'general',
-        project_id TEXT NOT NULL
-    )''')
-    
-    conn.execute('''CREATE TABLE IF NOT EXISTS chat_topics (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        topic_id TEXT NOT NULL,
-        name TEXT NOT NULL,
-        color TEXT NOT NULL,
-        project_id TEXT NOT NULL,
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        UNIQUE(topic_id, project_id)
-    )''')
-    
-    conn.execute('''CREATE TABLE IF NOT EXISTS chat_groups (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        created_by INTEGER NOT NULL,
-        project_id TEXT NOT NULL,
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-    )''')
-    
-    conn.execute('''CREATE TABLE IF NOT EXISTS group_members (
-        group_id INTEGER,
-        user_id INTEGER,
-        PRIMARY KEY (group_id, user_id)
-    )''')
-    
-    conn.commit()
-    conn.close()
+MESSAGE_COLUMNS = ('id', 'user_id', 'username', 'content', 'file_path', 'timestamp', 'reply_to',
+                   'chat_type', 'chat_id', 'project_id')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+DEFAULT_SEARCH_RESULTS = 20
+MAX_SEARCH_RESULTS = 100
+STREAM_HEARTBEAT_SECONDS = 15
+STREAM_RETRY_MS = 3000
+# Every open stream holds a worker thread for as long as the tab stays open, so
+# each process serves at most this many and keeps its other threads for
+# ordinary requests (see gunicorn.conf.py)
+MAX_STREAMS = int(os.environ.get('CHAT_MAX_STREAMS', max(int(os.environ.get('GUNICORN_THREADS', 8)) - 2, 1)))
+_stream_slots = threading.BoundedSemaphore(MAX_STREAMS)
+
+def serialize_message(message):
+    result = {column: getattr(message, column) for column in MESSAGE_COLUMNS}
+    result['timestamp'] = format_timestamp(message.timestamp)
+    return result
+
+def topic_messages(project_id, chat_id):
+    return Message.query.filter(Message.project_id == project_id, Message.chat_id == chat_id)
+
+def format_event(message):
+    return f"id: {message['id']}\nevent: message\ndata: {json.dumps(message)}\n\n"
 
 @chat_bp.route('/messages', methods=['GET'])
 def get_messages():
+    # Newest first. since_id polls for newer messages, before_id pages back through history.
     chat_id = request.args.get('chat_id', 'general')
     project_id = request.args.get('project_id')
     if not project_id:
         return jsonify([])
     
-    conn = get_db()
-    messages = conn.execute(
-        'SELECT * FROM messages WHERE chat_id = ? AND project_id = ? ORDER BY timestamp DESC LIMIT 50',
-        (chat_id, project_id)
-    ).fetchall()
-    conn.close()
-    return jsonify([dict(msg) for msg in messages])
+    since_id = request.args.get('since_id', type=int)
+    before_id = request.args.get('before_id', type=int)
+    limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    
+    query = topic_messages(project_id, chat_id)
+    if since_id is not None:
+        # Oldest-first so a capped page never skips messages; flipped below
+        messages = query.filter(Message.id > since_id).order_by(Message.id.asc()).limit(limit).all()
+        messages.reverse()
+    elif before_id is not None:
+        messages = query.filter(Message.id < before_id).order_by(Message.id.desc()).limit(limit).all()
+    else:
+        messages = query.order_by(Message.id.desc()).limit(limit).all()
+    return jsonify([serialize_message(msg) for msg in messages])
 
 @chat_bp.route('/messages', methods=['POST'])
 def send_message():
@@ -74,15 +68,34 @@ def send_message():
     if not project_id:
         return jsonify({'status': 'error', 'message': 'Project ID required'})
     
-    conn = get_db()
-    conn.execute(
-        'INSERT INTO messages (user_id, username, content, reply_to, chat_type, chat_id, project_id) VALUES (?, ?, ?, ?, ?, ?, ?)',
-        (data['user_id'], data['username'], data['content'], 
-         data.get('reply_to'), data.get('chat_type', 'public'), data.get('chat_id', 'general'), project_id)
-    )
-    conn.commit()
-    conn.close()
-    return jsonify({'status': 'sent'})
+    chat_id = data.get('chat_id', 'general')
+    row = Message(user_id=data['user_id'], username=data['username'], content=data['content'],
+                  reply_to=data.get('reply_to'), chat_type=data.get('chat_type', 'public'),
+                  chat_id=chat_id, project_id=project_id)
+    db.session.add(row)
+    db.session.commit()
+    message = serialize_message(row)
+    hub.publish(project_id, chat_id, message)
+    return jsonify({'status': 'sent', 'id': message['id']})
+
+@chat_bp.route('/search', methods=['GET'])
+def search():
+    # Best matches first; pass next_cursor back as cursor for the next page
+    project_id = request.args.get('project_id')
+    if not project_id:
+        return jsonify({'status': 'error', 'message': 'Project ID required'}), 400
+    
+    limit = min(max(request.args.get('limit', DEFAULT_SEARCH_RESULTS, type=int), 1), MAX_SEARCH_RESULTS)
+    try:
+        results, next_cursor = search_messages(project_id, request.args.get('q', ''),
+                                               chat_id=request.args.get('chat_id'), limit=limit,
+                                               cursor=request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid cursor'}), 400
+    return jsonify({
+        'results': [dict(serialize_message(message), snippet=snippet) for message, snippet in results],
+        'next_cursor': next_cursor
+    })
 
 @chat_bp.route('/upload', methods=['POST'])
 def upload_file():
@@ -90,6 +103,9 @@ def upload_file():
     user_id = request.form['user_id']
     username = request.form['username']
     chat_id = request.form.get('chat_id', 'general')
+    project_id = request.form.get('project_id')
+    if not project_id:
+        return jsonify({'status': 'error', 'message': 'Project ID required'})
     
     if file:
         filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}"
@@ -97,28 +113,100 @@ def upload_file():
         os.makedirs('uploads', exist_ok=True)
         file.save(file_path)
         
-        conn = get_db()
-        conn.execute(
-            'INSERT INTO messages (user_id, username, file_path, chat_id) VALUES (?, ?, ?, ?)',
-            (user_id, username, file_path, chat_id)
-        )
-        conn.commit()
-        conn.close()
-        return jsonify({'status': 'uploaded', 'file_path': file_path})
+        row = Message(user_id=user_id, username=username, content=request.form.get('content'),
+                      file_path=file_path, reply_to=request.form.get('reply_to'),
+                      chat_id=chat_id, project_id=project_id)
+        db.session.add(row)
+        db.session.commit()
+        message = serialize_message(row)
+        hub.publish(project_id, chat_id, message)
+        return jsonify({'status': 'uploaded', 'file_path': file_path, 'id': message['id']})
+
+@chat_bp.route('/stream', methods=['GET'])
+def stream_messages():
+    """Server-Sent Events feed of new messages for one topic"""
+    chat_id = request.args.get('chat_id', 'general')
+    project_id = request.args.get('project_id')
+    if not project_id:
+        return jsonify({'status': 'error', 'message': 'Project ID required'}), 400
+    
+    # Browsers send Last-Event-ID on reconnect; the query param covers the first connect
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_id = None
+    
+    slots = _stream_slots
+    if not slots.acquire(blocking=False):
+        return jsonify({'status': 'error', 'message': 'Too many open streams, try again shortly'}), 503, {
+            'Retry-After': str(STREAM_RETRY_MS // 1000)
+        }
+    
+    # The generator outlives the request, so its queries need their own app context
+    app = current_app._get_current_object()
+    
+    def newer_than(last_id):
+        # Pages of messages after last_id, oldest first
+        while True:
+            with app.app_context():
+                rows = [serialize_message(row) for row in topic_messages(project_id, chat_id)
+                        .filter(Message.id > last_id).order_by(Message.id.asc()).limit(MAX_PAGE_SIZE)]
+            yield from rows
+            if len(rows) < MAX_PAGE_SIZE:
+                break
+    
+    def generate(last_id):
+        # Subscribe before the backfill so nothing inserted in between is missed
+        subscription = hub.subscribe(project_id, chat_id)
+        try:
+            yield f'retry: {STREAM_RETRY_MS}\n\n'
+            
+            if last_id is None:
+                # A fresh stream starts after the newest message
+                with app.app_context():
+                    last_id = db.session.scalar(
+                        db.select(func.max(Message.id))
+                        .where(Message.project_id == project_id, Message.chat_id == chat_id)
+                    ) or 0
+            for message in newer_than(last_id):
+                yield format_event(message)
+                last_id = message['id']
+            
+            # Messages from other processes arrive through the hub's poller too
+            while True:
+                try:
+                    message = subscription.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ': heartbeat\n\n'
+                    continue
+                if message is None:
+                    # Dropped for falling behind; ending the stream makes the client resume
+                    break
+                if message['id'] <= last_id:
+                    continue
+                yield format_event(message)
+                last_id = message['id']
+        finally:
+            hub.unsubscribe(subscription)
+    
+    response = Response(generate(last_id), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Runs when the server closes the response, even if the stream never started
+    response.call_on_close(slots.release)
+    return response
 
 @chat_bp.route('/groups', methods=['POST'])
 def create_group():
     data = request.get_json()
-    conn = get_db()
-    cursor = conn.execute(
-        'INSERT INTO chat_groups (name, created_by) VALUES (?, ?)',
-        (data['name'], data['created_by'])
-    )
-    group_id = cursor.lastrowid
-    conn.execute('INSERT INTO group_members (group_id, user_id) VALUES (?, ?)', (group_id, data['created_by']))
-    conn.commit()
-    conn.close()
-    return jsonify({'group_id': group_id})
+    group = ChatGroup(name=data['name'], created_by=data['created_by'])
+    db.session.add(group)
+    db.session.flush()
+    db.session.add(GroupMember(group_id=group.id, user_id=data['created_by']))
+    db.session.commit()
+    return jsonify({'group_id': group.id})
 
 @chat_bp.route('/topics', methods=['GET'])
 def get_topics():
@@ -126,27 +214,27 @@ def get_topics():
     if not project_id:
         return jsonify([])
     
-    conn = get_db()
-    topics = conn.execute('SELECT * FROM chat_topics WHERE project_id = ? ORDER BY created_at', (project_id,)).fetchall()
+    topics = ChatTopic.query.filter_by(project_id=project_id).order_by(ChatTopic.created_at).all()
     
     # If no topics exist for this project, create default ones
     if not topics:
-        conn.execute('''INSERT INTO chat_topics (topic_id, name, color, project_id) VALUES 
-            ('general', 'General', 'linear-gradient(135deg, #1e3c72, #c9a9dd)', ?)''', (project_id,))
-        conn.commit()
-        topics = conn.execute('SELECT * FROM chat_topics WHERE project_id = ? ORDER BY created_at', (project_id,)).fetchall()
+        db.session.execute(insert_for(ChatTopic).values(
+            topic_id='general', name='General', color='linear-gradient(135deg, #1e3c72, #c9a9dd)',
+            project_id=project_id
+        ).on_conflict_do_nothing())
+        db.session.commit()
+        topics = ChatTopic.query.filter_by(project_id=project_id).order_by(ChatTopic.created_at).all()
     
     # Convert to expected format
     result = []
     for topic in topics:
         result.append({
-            'id': topic[1],  # topic_id
-            'name': topic[2],
-            'color': topic[3],
-            'project_id': topic[4]
+            'id': topic.topic_id,
+            'name': topic.name,
+            'color': topic.color,
+            'project_id': topic.project_id
         })
     
-    conn.close()
     return jsonify(result)
 
 @chat_bp.route('/topics', methods=['POST'])
@@ -156,13 +244,8 @@ def create_topic():
     if not project_id:
         return jsonify({'status': 'error', 'message': 'Project ID required'})
     
-    conn = get_db()
-    conn.execute(
-        'INSERT INTO chat_topics (topic_id, name, color, project_id) VALUES (?, ?, ?, ?)',
-        (data['id'], data['name'], data['color'], project_id)
-    )
-    conn.commit()
-    conn.close()
+    db.session.add(ChatTopic(topic_id=data['id'], name=data['name'], color=data['color'], project_id=project_id))
+    db.session.commit()
     return jsonify({'status': 'created'})
 
 @chat_bp.route('/topics/<topic_id>', methods=['DELETE'])
@@ -171,21 +254,16 @@ def delete_topic(topic_id):
     if not project_id:
         return jsonify({'status': 'error', 'message': 'Project ID required'})
     
-    conn = get_db()
     # Delete all messages for this topic in this project
-    conn.execute('DELETE FROM messages WHERE chat_id = ? AND project_id = ?', (topic_id, project_id))
+    db.session.execute(delete(Message).where(Message.chat_id == topic_id, Message.project_id == project_id))
     # Delete the topic itself
-    conn.execute('DELETE FROM chat_topics WHERE topic_id = ? AND project_id = ?', (topic_id, project_id))
-    conn.commit()
-    conn.close()
+    db.session.execute(delete(ChatTopic).where(ChatTopic.topic_id == topic_id, ChatTopic.project_id == project_id))
+    db.session.commit()
     return jsonify({'status': 'deleted'})
 
 @chat_bp.route('/groups/<int:group_id>/members', methods=['POST'])
-def add_member():
+def add_member(group_id):
     data = request.get_json()
-    conn = get_db()
-    conn.execute('INSERT OR IGNORE INTO group_members (group_id, user_id) VALUES (?, ?)', 
-                (group_id, data['user_id']))
-    conn.commit()
-    conn.close()
+    db.session.execute(insert_for(GroupMember).values(group_id=group_id, user_id=data['user_id']).on_conflict_do_nothing())
+    db.session.commit()
     return jsonify({'status': 'added'})
\ No newline at end of file
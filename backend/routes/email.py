@@ -1,62 +1,19 @@
 from flask import Blueprint, request, jsonify
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from email_outbox import outbox
 
 email_bp = Blueprint('email', __name__)
 
-# Email configuration
-SMTP_SERVER = 'smtp.gmail.com'
-SMTP_PORT = 587
-EMAIL_USERNAME = 'synchronusdevteam@gmail.com'  # Replace with your Gmail
-EMAIL_PASSWORD = 'ehmnofarhueptrwc'     # App Password without spaces
-
 def send_email(to_email, subject, body):
-    """Send email using Gmail SMTP"""
-    try:
-        print(f'Attempting to send email to: {to_email}')
-        
-        msg = MIMEMultipart()
-        msg['From'] = EMAIL_USERNAME
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        
-        msg.attach(MIMEText(body, 'plain'))
-        
-        print(f'Connecting to Gmail SMTP...')
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        
-        print(f'Logging in with: {EMAIL_USERNAME}')
-        server.login(EMAIL_USERNAME, EMAIL_PASSWORD)
-        
-        print(f'Sending email...')
-        server.sendmail(EMAIL_USERNAME, to_email, msg.as_string())
-        server.quit()
-        
-        print(f'Email sent successfully to {to_email}')
-        return True
-        
-    except Exception as e:
-        print(f'Email error: {e}')
-        return False
+    """Queue an email for the outbox workers and return its job id"""
+    job_id = outbox.enqueue(to_email, subject, body)
+    print(f'Queued email {job_id} to: {to_email}')
+    return job_id
 
-@email_bp.route('/send-invitation', methods=['POST'])
-def send_invitation():
-    """Send project invitation email"""
-    try:
-        data = request.json
-        to_email = data.get('to_email')
-        project_name = data.get('project_name')
-        responsibilities = data.get('responsibilities', [])
-        project_code = data.get('project_code')
-        creator_email = data.get('creator_email')
-        
-        # Create email body
-        responsibilities_text = '\n'.join([f'• {resp}' for resp in responsibilities])
-        
-        subject = f'Project Invitation: {project_name}'
-        body = f"""
+def invitation_email(project_name, responsibilities, project_code, creator_email):
+    """Subject and body of a project invitation"""
+    responsibilities_text = '\n'.join([f'• {resp}' for resp in responsibilities])
+    subject = f'Project Invitation: {project_name}'
+    body = f"""
 Hello!
 
 You have been invited to join the project "{project_name}".
@@ -72,13 +29,23 @@ To join the project, use the code above in the Synchronus application.
 Best regards,
 Synchronus Team
         """
+    return subject, body
+
+@email_bp.route('/send-invitation', methods=['POST'])
+def send_invitation():
+    """Send project invitation email"""
+    try:
+        data = request.json
+        to_email = data.get('to_email')
+        project_name = data.get('project_name')
+        responsibilities = data.get('responsibilities', [])
+        project_code = data.get('project_code')
+        creator_email = data.get('creator_email')
         
-        success = send_email(to_email, subject, body)
+        subject, body = invitation_email(project_name, responsibilities, project_code, creator_email)
+        job_id = send_email(to_email, subject, body)
         
-        if success:
-            return jsonify({'success': True, 'message': 'Invitation sent successfully'})
-        else:
-            return jsonify({'success': False, 'message': 'Failed to send invitation'})
+        return jsonify({'success': True, 'job_id': job_id, 'message': 'Invitation queued'})
             
     except Exception as e:
         print(f'Send invitation error: {e}')
@@ -93,13 +60,22 @@ def send_notification():
         subject = data.get('subject')
         message = data.get('message')
         
-        success = send_email(to_email, subject, message)
+        job_id = send_email(to_email, subject, message)
         
-        if success:
-            return jsonify({'success': True, 'message': 'Notification sent successfully'})
-        else:
-            return jsonify({'success': False, 'message': 'Failed to send notification'})
+        return jsonify({'success': True, 'job_id': job_id, 'message': 'Notification queued'})
             
     except Exception as e:
         print(f'Send notification error: {e}')
-        return jsonify({'success': False, 'message': 'Server error'})
\ No newline at end of file
+        return jsonify({'success': False, 'message': 'Server error'})
+
+@email_bp.route('/status/<int:job_id>', methods=['GET'])
+def email_status(job_id):
+    """Delivery status of a queued email"""
+    try:
+        job = outbox.status(job_id)
+        if job is None:
+            return jsonify({'success': False, 'message': 'Email job not found'}), 404
+        return jsonify({'success': True, 'job': job})
+    except Exception as e:
+        print(f'Email status error: {e}')
+        return jsonify({'success': False, 'message': 'Server error'})
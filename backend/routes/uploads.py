@@ -1,95 +1,39 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, send_file, url_for
 from flask_cors import cross_origin
 import os
 import uuid
-import sqlite3
+import time
+import hashlib
+import mimetypes
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
 from datetime import datetime
 
+from sqlalchemy import delete, select, update
+
+import blobstore
+import thumbnails
+import folder_index
+from models import db, format_timestamp, Folder, History, Snapshot, UploadedFile, UploadSession
+from snapshots import create_snapshot, restore_snapshot, STAGING_FOLDER
+
 uploads_bp = Blueprint('uploads', __name__)
 
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'doc', 'docx', 'jpg', 'jpeg', 'png', 'gif'}
 
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-# Initialize simple database for uploads
-def init_upload_db():
-    conn = sqlite3.connect('uploads.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS folders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            path TEXT NOT NULL,
-            project_id TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(path, project_id)
-        )
-    ''')
-     
-    # Add project_id column if it doesn't exist (migration)
-    try:
-        cursor.execute('ALTER TABLE folders ADD COLUMN project_id TEXT')
-    except sqlite3.OperationalError:
-        pass  # Column already exists
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS uploaded_files (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            filename TEXT NOT NULL,
-            original_filename TEXT NOT NULL,
-            file_path TEXT NOT NULL,
-            folder_path TEXT,
-            file_size INTEGER,
-            project_id TEXT NOT NULL,
-            uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Add project_id column if it doesn't exist (migration)
-    try:
-        cursor.execute('ALTER TABLE uploaded_files ADD COLUMN project_id TEXT')
-    except sqlite3.OperationalError:
-        pass  # Column already exists
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            action TEXT NOT NULL,
-            item TEXT NOT NULL,
-            type TEXT NOT NULL,
-            project_id TEXT NOT NULL,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Add project_id column if it doesn't exist (migration)
-    try:
-        cursor.execute('ALTER TABLE history ADD COLUMN project_id TEXT')
-    except sqlite3.OperationalError:
-        pass  # Column already exists
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS snapshots (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            snapshot_data TEXT NOT NULL,
-            project_id TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Add project_id column if it doesn't exist (migration)
-    try:
-        cursor.execute('ALTER TABLE snapshots ADD COLUMN project_id TEXT')
-    except sqlite3.OperationalError:
-        pass  # Column already exists
-    
-    conn.commit()
-    conn.close()
+# Chunked uploads are appended to a .part file here until they are finalized
+PARTIAL_FOLDER = os.path.join(UPLOAD_FOLDER, '.partial')
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+MAX_UPLOAD_CHUNK_SIZE = 64 * 1024 * 1024
+UPLOAD_SESSION_TTL_SECONDS = 24 * 60 * 60
+
+# Text previews send at most this many bytes; override with app.config['PREVIEW_TEXT_BYTES']
+PREVIEW_TEXT_BYTES = 64 * 1024
 
-init_upload_db()
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif'}
+# Thumbnails are addressed by content hash and never change
+THUMBNAIL_MAX_AGE = 365 * 24 * 60 * 60
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -112,52 +56,240 @@ def upload_file():
     
     if file and allowed_file(file.filename):
         original_filename = file.filename
-        filename = str(uuid.uuid4()) + '_' + secure_filename(original_filename)
-        
-        # Create project-specific folder structure
-        project_folder = os.path.join(UPLOAD_FOLDER, project_id)
-        if folder_name:
-            folder_path = os.path.join(project_folder, *folder_name.split('/'))
-            os.makedirs(folder_path, exist_ok=True)
-            file_path = os.path.join(folder_path, filename)
-        else:
-            os.makedirs(project_folder, exist_ok=True)
-            file_path = os.path.join(project_folder, filename)
+        filename, file_path = upload_destination(project_id, folder_name, original_filename)
         
         try:
-            file.save(file_path)
-            
-            # Save to database
-            conn = sqlite3.connect('uploads.db')
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO uploaded_files (filename, original_filename, file_path, folder_path, file_size, project_id)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (filename, original_filename, file_path, folder_name or None, os.path.getsize(file_path), project_id))
+            # Hash while spooling into the blob store, outside the write transaction
+            blob_hash, file_size = blobstore.spool_stream(file.stream)
             
-            # Only log to history if requested
+            blobstore.add_ref(blob_hash, file_size)
             log_history = request.form.get('log_history', 'false').lower() == 'true'
-            if log_history:
-                cursor.execute('''
-                    INSERT INTO history (action, item, type, project_id)
-                    VALUES (?, ?, ?, ?)
-                ''', ('Added', original_filename, 'File', project_id))
-                
-                snapshot_data = create_snapshot(project_id)
-                cursor.execute('''
-                    INSERT INTO snapshots (snapshot_data, project_id)
-                    VALUES (?, ?)
-                ''', (snapshot_data, project_id))
-            
-            conn.commit()
-            conn.close()
+            record_upload(blob_hash, file_size, filename, original_filename, file_path,
+                          folder_name, project_id, log_history)
+            db.session.commit()
             
             return jsonify({'success': True, 'message': 'File uploaded successfully'})
         except Exception as e:
+            db.session.rollback()
             return jsonify({'success': False, 'message': 'Upload failed'})
     
     return jsonify({'success': False, 'message': 'Invalid file type'})
 
+def upload_destination(project_id, folder_name, original_filename):
+    """Stored filename and physical path for a new upload, creating its folder"""
+    filename = str(uuid.uuid4()) + '_' + secure_filename(original_filename)
+    
+    # Create project-specific folder structure
+    project_folder = os.path.join(UPLOAD_FOLDER, project_id)
+    if folder_name:
+        folder_path = os.path.join(project_folder, *folder_name.split('/'))
+    else:
+        folder_path = project_folder
+    os.makedirs(folder_path, exist_ok=True)
+    return filename, os.path.join(folder_path, filename)
+
+def record_upload(blob_hash, file_size, filename, original_filename, file_path,
+                  folder_name, project_id, log_history):
+    """Link a referenced blob into the project tree and save its uploaded_files row"""
+    blobstore.link_into(blob_hash, file_path)
+    blobstore.remove_on_rollback(file_path)
+    folder_index.ensure_folders(project_id, folder_name)
+    
+    # Save to database
+    db.session.add(UploadedFile(
+        filename=filename, original_filename=original_filename, file_path=file_path,
+        folder_path=folder_name or None, file_size=file_size, project_id=project_id, blob_hash=blob_hash
+    ))
+    
+    # Only log to history if requested
+    if log_history:
+        log_action('Added', original_filename, 'File', project_id)
+        create_snapshot(project_id)
+
+def log_action(action, item, item_type, project_id):
+    db.session.add(History(action=action, item=item, type=item_type, project_id=project_id))
+    db.session.flush()
+
+def partial_path(upload_id):
+    return os.path.join(PARTIAL_FOLDER, upload_id + '.part')
+
+def upload_session_state(session):
+    received = session.received_bytes
+    return {
+        'upload_id': session.id,
+        'chunk_size': session.chunk_size,
+        'total_size': session.total_size,
+        'offset': received,
+        'next_chunk': received // session.chunk_size,
+        'complete': received == session.total_size
+    }
+
+def load_upload_session(upload_id):
+    return db.session.get(UploadSession, upload_id, populate_existing=True)
+
+def expire_upload_sessions():
+    """Drop upload sessions nobody has touched for a day, with their staged files"""
+    cutoff = time.time() - UPLOAD_SESSION_TTL_SECONDS
+    stale = db.session.scalars(select(UploadSession.id).where(UploadSession.updated_at < cutoff)).all()
+    for upload_id in stale:
+        db.session.execute(delete(UploadSession).where(UploadSession.id == upload_id))
+        if os.path.exists(partial_path(upload_id)):
+            os.remove(partial_path(upload_id))
+
+@uploads_bp.route('/api/uploads', methods=['POST'])
+@cross_origin()
+def init_chunked_upload():
+    """Start a chunked upload; chunks are then PUT in order and the upload finalized"""
+    data = request.json or {}
+    project_id = data.get('project_id')
+    filename = data.get('filename', '')
+    total_size = data.get('size')
+    chunk_size = data.get('chunk_size') or UPLOAD_CHUNK_SIZE
+    
+    if not project_id:
+        return jsonify({'success': False, 'message': 'Project ID required'})
+    if not filename or not allowed_file(filename):
+        return jsonify({'success': False, 'message': 'Invalid file type'})
+    if not isinstance(total_size, int) or total_size < 0:
+        return jsonify({'success': False, 'message': 'File size required'})
+    if not isinstance(chunk_size, int) or not 0 < chunk_size <= MAX_UPLOAD_CHUNK_SIZE:
+        return jsonify({'success': False, 'message': 'Invalid chunk size'})
+    
+    try:
+        upload_id = uuid.uuid4().hex
+        os.makedirs(PARTIAL_FOLDER, exist_ok=True)
+        open(partial_path(upload_id), 'wb').close()
+        
+        expire_upload_sessions()
+        session = UploadSession(
+            id=upload_id, project_id=project_id, folder_path=data.get('folder') or None,
+            original_filename=filename, total_size=total_size, chunk_size=chunk_size, received_bytes=0,
+            sha256=(data.get('sha256') or '').lower() or None, log_history=bool(data.get('log_history')),
+            updated_at=time.time()
+        )
+        db.session.add(session)
+        db.session.commit()
+        
+        return jsonify({'success': True, **upload_session_state(session)})
+    except Exception as e:
+        db.session.rollback()
+        print(f'Error starting chunked upload: {e}')
+        return jsonify({'success': False, 'message': 'Upload failed'})
+
+@uploads_bp.route('/api/uploads/<upload_id>', methods=['GET'])
+@cross_origin()
+def get_chunked_upload(upload_id):
+    """Acknowledged offset of an upload, so an interrupted client knows where to resume"""
+    session = load_upload_session(upload_id)
+    if session is None:
+        return jsonify({'success': False, 'message': 'Upload not found'}), 404
+    return jsonify({'success': True, **upload_session_state(session)})
+
+@uploads_bp.route('/api/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+@cross_origin()
+def put_upload_chunk(upload_id, index):
+    """Append chunk number index, sent as the raw request body"""
+    session = load_upload_session(upload_id)
+    if session is None:
+        return jsonify({'success': False, 'message': 'Upload not found'}), 404
+    
+    offset = index * session.chunk_size
+    expected = min(session.chunk_size, session.total_size - offset)
+    
+    if offset < session.received_bytes:
+        # A retry of a chunk that already landed; acknowledge it again
+        return jsonify({'success': True, **upload_session_state(session)})
+    if offset > session.received_bytes or expected <= 0:
+        return jsonify({'success': False, 'message': 'Chunk out of order', **upload_session_state(session)}), 409
+    if request.content_length is not None and request.content_length != expected:
+        return jsonify({'success': False, 'message': f'Chunk must be {expected} bytes', **upload_session_state(session)}), 400
+    
+    try:
+        # Stream the body straight to disk. Anything past the acknowledged offset
+        # is left over from an interrupted attempt and gets overwritten.
+        sha = hashlib.sha256()
+        written = 0
+        with open(partial_path(upload_id), 'r+b') as f:
+            f.seek(offset)
+            f.truncate()
+            for block in iter(lambda: request.stream.read(blobstore.CHUNK_SIZE), b''):
+                written += len(block)
+                if written > expected:
+                    break
+                sha.update(block)
+                f.write(block)
+        
+        if written != expected:
+            return jsonify({'success': False, 'message': f'Chunk must be {expected} bytes', **upload_session_state(session)}), 400
+        checksum = request.headers.get('X-Chunk-SHA256')
+        if checksum and checksum.lower() != sha.hexdigest():
+            return jsonify({'success': False, 'message': 'Chunk checksum mismatch', **upload_session_state(session)}), 400
+        
+        # Guarded on the offset, so of two racing retries only one advances the session
+        db.session.execute(
+            update(UploadSession)
+            .where(UploadSession.id == upload_id, UploadSession.received_bytes == offset)
+            .values(received_bytes=offset + written, updated_at=time.time())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        
+        return jsonify({'success': True, **upload_session_state(load_upload_session(upload_id))})
+    except Exception as e:
+        db.session.rollback()
+        print(f'Error writing upload chunk: {e}')
+        return jsonify({'success': False, 'message': 'Upload failed'})
+
+@uploads_bp.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+@cross_origin()
+def finalize_chunked_upload(upload_id):
+    """Verify the assembled file and add it to the project"""
+    data = request.get_json(silent=True) or {}
+    session = load_upload_session(upload_id)
+    if session is None:
+        return jsonify({'success': False, 'message': 'Upload not found'}), 404
+    if session.received_bytes != session.total_size:
+        return jsonify({'success': False, 'message': 'Upload incomplete', **upload_session_state(session)}), 409
+    
+    try:
+        staged = partial_path(upload_id)
+        blob_hash, file_size = blobstore.hash_file(staged)
+        expected_hash = (data.get('sha256') or session.sha256 or '').lower()
+        if file_size != session.total_size or (expected_hash and expected_hash != blob_hash):
+            # The staged bytes are not what the client sent, so it has to start over
+            open(staged, 'wb').close()
+            session.received_bytes = 0
+            session.updated_at = time.time()
+            db.session.commit()
+            return jsonify({'success': False, 'message': 'Checksum mismatch, upload restarted', 'offset': 0}), 422
+        
+        project_id = session.project_id
+        folder_name = session.folder_path or ''
+        original_filename = session.original_filename
+        filename, file_path = upload_destination(project_id, folder_name, original_filename)
+        
+        # The staged file itself becomes the blob when its content is new
+        blobstore.store_file(staged, blob_hash, move=True)
+        record_upload(blob_hash, file_size, filename, original_filename, file_path,
+                      folder_name, project_id, session.log_history)
+        db.session.delete(session)
+        db.session.commit()
+        
+        return jsonify({'success': True, 'message': 'File uploaded successfully', 'sha256': blob_hash, 'size': file_size})
+    except Exception as e:
+        db.session.rollback()
+        print(f'Error finalizing upload: {e}')
+        return jsonify({'success': False, 'message': 'Upload failed'})
+
+@uploads_bp.route('/api/uploads/<upload_id>', methods=['DELETE'])
+@cross_origin()
+def abort_chunked_upload(upload_id):
+    db.session.execute(delete(UploadSession).where(UploadSession.id == upload_id))
+    db.session.commit()
+    if os.path.exists(partial_path(upload_id)):
+        os.remove(partial_path(upload_id))
+    return jsonify({'success': True, 'message': 'Upload cancelled'})
+
 @uploads_bp.route('/api/create-folder', methods=['POST'])
 @cross_origin()
 def create_folder():
@@ -191,32 +323,18 @@ def create_folder():
         print(f'Folder created successfully at: {physical_path}')
         
         # Save to database
-        conn = sqlite3.connect('uploads.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT OR IGNORE INTO folders (name, path, project_id)
-            VALUES (?, ?, ?)
-        ''', (folder_name, full_path, project_id))
+        folder_index.ensure_folders(project_id, full_path)
         
         # Only log to history if requested
         log_history = data.get('log_history', False)
         if log_history:
-            cursor.execute('''
-                INSERT INTO history (action, item, type, project_id)
-                VALUES (?, ?, ?, ?)
-            ''', ('Added', full_path, 'Folder', project_id))
-            
-            snapshot_data = create_snapshot(project_id)
-            cursor.execute('''
-                INSERT INTO snapshots (snapshot_data, project_id)
-                VALUES (?, ?)
-            ''', (snapshot_data, project_id))
-        
-        conn.commit()
-        conn.close()
+            log_action('Added', full_path, 'Folder', project_id)
+            create_snapshot(project_id)
+        db.session.commit()
         
         return jsonify({'success': True, 'message': 'Folder created successfully', 'path': full_path})
     except Exception as e:
+        db.session.rollback()
         print(f'Error creating folder: {str(e)}')
         return jsonify({'success': False, 'message': f'Failed to create folder: {str(e)}'})
 
@@ -228,30 +346,17 @@ def get_folder_tree():
         return jsonify({'success': False, 'folders': []})
     
     try:
-        folders = []
-        project_folder = os.path.join(UPLOAD_FOLDER, project_id)
-        
-        if not os.path.exists(project_folder):
-            return jsonify({'success': True, 'folders': []})
-        
-        # Walk through project directories only
-        for root, dirs, files in os.walk(project_folder):
-            for dir_name in dirs:
-                full_dir_path = os.path.join(root, dir_name)
-                relative_path = os.path.relpath(full_dir_path, project_folder)
-                
-                # Calculate level based on path depth
-                level = len(relative_path.split(os.sep)) - 1 if relative_path != '.' else 0
-                
-                folders.append({
-                    'name': dir_name,
-                    'path': relative_path.replace(os.sep, '/'),
-                    'type': 'folder',
-                    'level': level
-                })
-        
-        # Sort folders by path to maintain hierarchy
-        folders.sort(key=lambda x: x['path'])
+        # Ordered by materialized path, so parents come right before their children
+        rows = db.session.execute(
+            select(Folder.name, Folder.path).where(Folder.project_id == project_id).order_by(Folder.path)
+        ).all()
+        
+        folders = [{
+            'name': row.name,
+            'path': row.path,
+            'type': 'folder',
+            'level': row.path.count('/')
+        } for row in rows]
         
         return jsonify({'success': True, 'folders': folders})
     except Exception as e:
@@ -265,36 +370,37 @@ def get_folder_contents(folder_path):
         return jsonify({'success': False, 'items': []})
     
     try:
-        project_folder = os.path.join(UPLOAD_FOLDER, project_id)
-        
-        if folder_path == 'root':
-            target_path = project_folder
-        else:
-            target_path = os.path.join(project_folder, folder_path)
+        parent = None if folder_path == 'root' else folder_path
         
-        if not os.path.exists(target_path):
+        if parent is not None and not folder_index.folder_exists(project_id, parent):
             return jsonify({'success': False, 'items': []})
         
-        items = []
-        
-        for item in os.listdir(target_path):
-            item_path = os.path.join(target_path, item)
-            
-            if os.path.isdir(item_path):
-                relative_path = os.path.join(folder_path, item) if folder_path != 'root' else item
-                items.append({
-                    'name': item,
-                    'path': relative_path.replace(os.sep, '/'),
-                    'type': 'folder'
-                })
-            else:
-                stat = os.stat(item_path)
-                items.append({
-                    'name': item,
-                    'size': stat.st_size,
-                    'uploaded': 'Unknown',
-                    'type': 'file'
-                })
+        # Equality on a value, IS NULL at the root: both stay index lookups on every backend
+        folders = db.session.execute(
+            select(Folder.name, Folder.path)
+            .where(Folder.project_id == project_id, same_folder(Folder.parent_path, parent))
+            .order_by(Folder.name)
+        ).all()
+        files = db.session.execute(
+            select(UploadedFile.filename, UploadedFile.original_filename, UploadedFile.file_size,
+                   UploadedFile.uploaded_at, UploadedFile.blob_hash)
+            .where(UploadedFile.project_id == project_id, same_folder(UploadedFile.folder_path, parent))
+            .order_by(UploadedFile.id)
+        ).all()
+        
+        items = [{
+            'name': row.name,
+            'path': row.path,
+            'type': 'folder'
+        } for row in folders]
+        items.extend({
+            'name': row.filename,
+            'original_filename': row.original_filename,
+            'size': row.file_size,
+            'uploaded': format_timestamp(row.uploaded_at),
+            'type': 'file',
+            'thumbnail_url': thumbnail_url(row.blob_hash, row.filename, 'thumb')
+        } for row in files)
         
         return jsonify({'success': True, 'items': items})
     except Exception as e:
@@ -321,31 +427,102 @@ def delete_folder():
         if not os.path.isdir(physical_path):
             return jsonify({'success': False, 'message': 'Path is not a folder'})
         
-        # Delete the folder and all its contents
-        shutil.rmtree(physical_path)
+        # Move the folder out of the tree; it is only deleted once the commit has gone through
+        os.makedirs(STAGING_FOLDER, exist_ok=True)
+        trash_path = os.path.join(STAGING_FOLDER, f'deleted-{uuid.uuid4().hex}')
+        os.rename(physical_path, trash_path)
+    except Exception as e:
+        return jsonify({'success': False, 'message': 'Failed to delete folder'})
+    
+    try:
+        # Drop the folder's index entries and their blob references
+        folder_index.remove_folder(project_id, folder_path)
         
         # Only log to history if requested
         log_history = data.get('log_history', False)
         if log_history:
-            conn = sqlite3.connect('uploads.db')
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO history (action, item, type, project_id)
-                VALUES (?, ?, ?, ?)
-            ''', ('Deleted', folder_path, 'Folder', project_id))
-            
-            snapshot_data = create_snapshot(project_id)
-            cursor.execute('''
-                INSERT INTO snapshots (snapshot_data, project_id)
-                VALUES (?, ?)
-            ''', (snapshot_data, project_id))
-            
-            conn.commit()
-            conn.close()
-        
-        return jsonify({'success': True, 'message': 'Folder deleted successfully'})
+            log_action('Deleted', folder_path, 'Folder', project_id)
+            create_snapshot(project_id)
+        db.session.commit()
     except Exception as e:
+        db.session.rollback()
+        os.rename(trash_path, physical_path)
         return jsonify({'success': False, 'message': 'Failed to delete folder'})
+    
+    shutil.rmtree(trash_path, ignore_errors=True)
+    return jsonify({'success': True, 'message': 'Folder deleted successfully'})
+
+def same_folder(column, folder_path):
+    return column.is_(None) if folder_path is None else column == folder_path
+
+def file_record(project_id, physical_path):
+    return db.session.execute(
+        select(UploadedFile.original_filename, UploadedFile.blob_hash)
+        .where(UploadedFile.project_id == project_id, UploadedFile.file_path == physical_path)
+    ).first()
+
+def resolve_project_file(project_id, file_path):
+    """Physical path of a file inside a project folder, or None if it escapes the folder"""
+    return safe_join(os.path.join(UPLOAD_FOLDER, project_id), file_path)
+
+@uploads_bp.route('/api/files/<path:file_path>', methods=['GET'])
+@cross_origin(expose_headers=['Content-Range', 'Accept-Ranges', 'ETag', 'Content-Length'])
+def download_file(file_path):
+    """Stream a project file with Range, ETag and If-None-Match support"""
+    project_id = request.args.get('project_id')
+    if not project_id:
+        return jsonify({'success': False, 'message': 'Project ID required'}), 400
+    
+    physical_path = resolve_project_file(project_id, file_path)
+    if physical_path is None or not os.path.isfile(physical_path):
+        return jsonify({'success': False, 'message': 'File not found'}), 404
+    
+    # Uploaded files are content-addressed, so the blob hash is a strong ETag
+    row = file_record(project_id, physical_path)
+    download_name = row.original_filename if row else os.path.basename(physical_path)
+    
+    # send_file streams from disk (via the server's sendfile-backed file wrapper
+    # when it has one) and answers Range and conditional requests itself
+    response = send_file(
+        os.path.abspath(physical_path),
+        mimetype=mimetypes.guess_type(download_name)[0] or 'application/octet-stream',
+        as_attachment=request.args.get('download') == '1',
+        download_name=download_name,
+        conditional=True,
+        etag=row.blob_hash if row and row.blob_hash else True,
+        max_age=0
+    )
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
+
+def thumbnail_url(blob_hash, filename, size_name):
+    """Link to a cached derivative of an uploaded image, or None when there can't be one"""
+    if not blob_hash or not thumbnails.available():
+        return None
+    if os.path.splitext(filename)[1].lower() not in IMAGE_EXTENSIONS:
+        return None
+    return url_for('uploads.get_thumbnail', blob_hash=blob_hash, size_name=size_name, _external=True)
+
+@uploads_bp.route('/api/thumbnails/<blob_hash>/<size_name>', methods=['GET'])
+@cross_origin()
+def get_thumbnail(blob_hash, size_name):
+    """Downscaled image, addressed by content hash so it can be cached for good"""
+    if size_name not in thumbnails.SIZES or not thumbnails.available():
+        return jsonify({'success': False, 'message': 'Thumbnail not available'}), 404
+    if len(blob_hash) != 64 or not os.path.exists(blobstore.blob_path(blob_hash)):
+        return jsonify({'success': False, 'message': 'File not found'}), 404
+    
+    try:
+        path, mimetype = thumbnails.derivative_path(blob_hash, size_name)
+    except Exception as e:
+        print(f'Thumbnail error for {blob_hash}: {e}')
+        return jsonify({'success': False, 'message': 'Thumbnail not available'}), 404
+    
+    response = send_file(os.path.abspath(path), mimetype=mimetype, conditional=True,
+                         etag=f'{blob_hash}-{size_name}', max_age=THUMBNAIL_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 @uploads_bp.route('/api/file-preview/<path:file_path>', methods=['GET'])
 @cross_origin()
@@ -355,9 +532,9 @@ def preview_file(file_path):
         return jsonify({'success': False, 'message': 'Project ID required'})
     
     try:
-        physical_path = os.path.join(UPLOAD_FOLDER, project_id, file_path)
+        physical_path = resolve_project_file(project_id, file_path)
         
-        if not os.path.exists(physical_path):
+        if physical_path is None or not os.path.exists(physical_path):
             return jsonify({'success': False, 'message': 'File not found'})
         
         if not os.path.isfile(physical_path):
@@ -365,29 +542,34 @@ def preview_file(file_path):
         
         # Get file extension
         file_ext = os.path.splitext(file_path)[1].lower()
+        file_size = os.path.getsize(physical_path)
         
         # Read file content based on type
         if file_ext in ['.txt', '.md', '.py', '.js', '.html', '.css', '.json']:
-            # Text files
-            with open(physical_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            # Text files - only the first PREVIEW_TEXT_BYTES are sent
+            budget = current_app.config.get('PREVIEW_TEXT_BYTES', PREVIEW_TEXT_BYTES)
+            with open(physical_path, 'rb') as f:
+                content = f.read(budget)
             return jsonify({
                 'success': True, 
                 'type': 'text', 
-                'content': content,
+                # A multi-byte character cut at the budget is dropped rather than mangled
+                'content': content.decode('utf-8', errors='ignore' if file_size > budget else 'replace'),
+                'truncated': file_size > budget,
+                'size': file_size,
                 'filename': os.path.basename(file_path)
             })
-        elif file_ext in ['.jpg', '.jpeg', '.png', '.gif']:
-            # Images - return base64
-            import base64
-            with open(physical_path, 'rb') as f:
-                content = base64.b64encode(f.read()).decode('utf-8')
+        elif file_ext in IMAGE_EXTENSIONS:
+            # Images - the browser fetches the bytes from the download endpoint
+            row = file_record(project_id, physical_path)
             return jsonify({
                 'success': True, 
                 'type': 'image', 
-                'content': content,
+                'url': url_for('uploads.download_file', file_path=file_path, project_id=project_id, _external=True),
+                'preview_url': thumbnail_url(row.blob_hash if row else None, physical_path, 'preview'),
+                'size': file_size,
                 'filename': os.path.basename(file_path),
-                'mime_type': f'image/{file_ext[1:]}'
+                'mime_type': mimetypes.guess_type(physical_path)[0]
             })
         else:
             # Unsupported file type
@@ -395,46 +577,13 @@ def preview_file(file_path):
                 'success': True, 
                 'type': 'unsupported', 
                 'message': 'Preview not available for this file type',
+                'url': url_for('uploads.download_file', file_path=file_path, project_id=project_id, _external=True),
                 'filename': os.path.basename(file_path)
             })
             
     except Exception as e:
         return jsonify({'success': False, 'message': 'Failed to preview file'})
 
-def create_snapshot(project_id):
-    import json
-    import base64
-    try:
-        snapshot = {'folders': [], 'files': []}
-        project_folder = os.path.join(UPLOAD_FOLDER, project_id)
-        
-        if not os.path.exists(project_folder):
-            return json.dumps(snapshot)
-        
-        # Capture current folder structure and file contents for this project
-        for root, dirs, files in os.walk(project_folder):
-            for dir_name in dirs:
-                full_dir_path = os.path.join(root, dir_name)
-                relative_path = os.path.relpath(full_dir_path, project_folder)
-                snapshot['folders'].append(relative_path.replace(os.sep, '/'))
-            
-            for file_name in files:
-                full_file_path = os.path.join(root, file_name)
-                relative_path = os.path.relpath(full_file_path, project_folder)
-                try:
-                    with open(full_file_path, 'rb') as f:
-                        content = base64.b64encode(f.read()).decode('utf-8')
-                    snapshot['files'].append({
-                        'path': relative_path.replace(os.sep, '/'),
-                        'content': content
-                    })
-                except:
-                    pass
-        
-        return json.dumps(snapshot)
-    except:
-        return '{}'
-
 @uploads_bp.route('/api/history', methods=['GET'])
 @cross_origin()
 def get_history():
@@ -443,27 +592,18 @@ def get_history():
         return jsonify({'success': False, 'history': []})
     
     try:
-        conn = sqlite3.connect('uploads.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT h.id, h.action, h.item, h.type, h.timestamp
-            FROM history h
-            WHERE h.project_id = ?
-            ORDER BY h.timestamp DESC
-            LIMIT 20
-        ''', (project_id,))
+        entries = History.query.filter_by(project_id=project_id).order_by(History.timestamp.desc()).limit(20).all()
         
         history = []
-        for row in cursor.fetchall():
+        for entry in entries:
             history.append({
-                'id': row[0],
-                'action': row[1],
-                'item': row[2],
-                'type': row[3],
-                'timestamp': row[4]
+                'id': entry.id,
+                'action': entry.action,
+                'item': entry.item,
+                'type': entry.type,
+                'timestamp': format_timestamp(entry.timestamp)
             })
         
-        conn.close()
         return jsonify({'success': True, 'history': history})
     except Exception as e:
         return jsonify({'success': False, 'history': []})
@@ -479,34 +619,18 @@ def create_named_snapshot():
         return jsonify({'success': False, 'message': 'Project ID required'})
     
     try:
-        conn = sqlite3.connect('uploads.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO history (action, item, type, project_id)
-            VALUES (?, ?, ?, ?)
-        ''', ('Snapshot', snapshot_name, 'System', project_id))
-        
-        snapshot_data = create_snapshot(project_id)
-        cursor.execute('''
-            INSERT INTO snapshots (snapshot_data, project_id)
-            VALUES (?, ?)
-        ''', (snapshot_data, project_id))
-        
-        conn.commit()
-        conn.close()
+        log_action('Snapshot', snapshot_name, 'System', project_id)
+        create_snapshot(project_id)
+        db.session.commit()
         
         return jsonify({'success': True, 'message': 'Snapshot created successfully'})
     except Exception as e:
+        db.session.rollback()
         return jsonify({'success': False, 'message': 'Failed to create snapshot'})
 
 @uploads_bp.route('/api/revert/<int:history_id>', methods=['POST'])
 @cross_origin()
 def revert_to_version(history_id):
-    import json
-    import shutil
-    import base64
-    
     data = request.json
     project_id = data.get('project_id')
     
@@ -514,56 +638,28 @@ def revert_to_version(history_id):
         return jsonify({'success': False, 'message': 'Project ID required'})
     
     try:
-        conn = sqlite3.connect('uploads.db')
-        cursor = conn.cursor()
-        
         # Get snapshot from this history entry for this project
-        cursor.execute('''
-            SELECT s.snapshot_data FROM snapshots s
-            JOIN history h ON s.created_at <= h.timestamp AND s.project_id = h.project_id
-            WHERE h.id = ? AND h.project_id = ?
-            ORDER BY s.created_at DESC
-            LIMIT 1
-        ''', (history_id, project_id))
-        
-        result = cursor.fetchone()
-        if not result:
+        snapshot_id = db.session.scalar(
+            select(Snapshot.id)
+            .join(History, (Snapshot.created_at <= History.timestamp) & (Snapshot.project_id == History.project_id))
+            .where(History.id == history_id, History.project_id == project_id)
+            .order_by(Snapshot.created_at.desc(), Snapshot.id.desc())
+            .limit(1)
+        )
+        if snapshot_id is None:
             return jsonify({'success': False, 'message': 'No snapshot found'})
         
-        snapshot = json.loads(result[0])
-        project_folder = os.path.join(UPLOAD_FOLDER, project_id)
-        
-        # Clear current project folder
-        if os.path.exists(project_folder):
-            shutil.rmtree(project_folder)
-        os.makedirs(project_folder, exist_ok=True)
-        
-        # Recreate folder structure
-        for folder_path in snapshot.get('folders', []):
-            physical_path = os.path.join(project_folder, *folder_path.split('/'))
-            os.makedirs(physical_path, exist_ok=True)
-        
-        # Restore files with content
-        for file_info in snapshot.get('files', []):
-            if isinstance(file_info, dict):
-                file_path = file_info['path']
-                content = file_info['content']
-                physical_path = os.path.join(project_folder, *file_path.split('/'))
-                os.makedirs(os.path.dirname(physical_path), exist_ok=True)
-                with open(physical_path, 'wb') as f:
-                    f.write(base64.b64decode(content))
+        stats = restore_snapshot(project_id, snapshot_id)
+        # The tree was swapped wholesale, so bring the folder index back in line with it
+        folder_index.reconcile_project(project_id)
         
         # Add revert action to history
-        cursor.execute('''
-            INSERT INTO history (action, item, type, project_id)
-            VALUES (?, ?, ?, ?)
-        ''', ('Reverted', f'to version {history_id}', 'System', project_id))
-        
-        conn.commit()
-        conn.close()
+        log_action('Reverted', f'to version {history_id}', 'System', project_id)
+        db.session.commit()
         
-        return jsonify({'success': True, 'message': 'File structure restored successfully'})
+        return jsonify({'success': True, 'message': 'File structure restored successfully', **stats})
     except Exception as e:
+        db.session.rollback()
         return jsonify({'success': False, 'message': 'Failed to revert'})
 
 # Function to register routes with main app
@@ -0,0 +1,260 @@
+"""
+Manifest-based project snapshots.
+A snapshot is a list of (path, kind, blob hash, size, mtime) entries in
+snapshot_entries instead of a base64 copy of the whole tree. Each snapshot
+only stores what changed since its parent (changed entries plus tombstones
+for deleted paths), with a full manifest every MAX_CHAIN_LENGTH snapshots so
+rebuilding one never has to walk a long chain. File contents live in the
+blob store, so unchanged files cost nothing and changed files cost one hash.
+Reverting stages the target tree next to the live one and swaps it in.
+"""
+
+import base64
+import errno
+import json
+import os
+import shutil
+import uuid
+
+from sqlalchemy import insert, select
+
+import blobstore
+from models import db, Snapshot, SnapshotEntry, UploadedFile
+
+UPLOAD_FOLDER = 'uploads'
+STAGING_FOLDER = os.path.join(UPLOAD_FOLDER, '.staging')
+MAX_CHAIN_LENGTH = 32
+# Base64 is decoded in 4-character groups, so legacy content is decoded in slices of this size
+LEGACY_DECODE_CHUNK = 4 * 256 * 1024
+ENTRY_FIELDS = ('snapshot_id', 'path', 'kind', 'blob_hash', 'size', 'mtime', 'deleted')
+# renameat2() arguments for swapping two paths in one step (Linux)
+AT_FDCWD = -100
+RENAME_EXCHANGE = 2
+
+def scan_tree(project_folder):
+    """Map of relative path -> (kind, size, mtime_ns) for everything under project_folder"""
+    tree = {}
+    if not os.path.isdir(project_folder):
+        return tree
+    pending = ['']
+    while pending:
+        relative_dir = pending.pop()
+        with os.scandir(os.path.join(project_folder, *relative_dir.split('/'))) as entries:
+            for entry in entries:
+                relative_path = f'{relative_dir}/{entry.name}' if relative_dir else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    tree[relative_path] = ('folder', None, None)
+                    pending.append(relative_path)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    tree[relative_path] = ('file', stat.st_size, stat.st_mtime_ns)
+    return tree
+
+def latest_snapshot(project_id):
+    return db.session.execute(
+        select(Snapshot.id, Snapshot.chain_length)
+        .where(Snapshot.project_id == project_id, Snapshot.format == 'manifest')
+        .order_by(Snapshot.id.desc()).limit(1)
+    ).first()
+
+def load_manifest(snapshot_id):
+    """Full manifest of a snapshot: path -> {'kind', 'blob_hash', 'size', 'mtime'}"""
+    chain = []
+    current = snapshot_id
+    while current is not None:
+        row = db.session.execute(
+            select(Snapshot.parent_id, Snapshot.chain_length).where(Snapshot.id == current)
+        ).first()
+        if row is None:
+            break
+        chain.append(current)
+        current = row[0] if row[1] else None
+
+    rows = db.session.execute(
+        select(SnapshotEntry.path, SnapshotEntry.kind, SnapshotEntry.blob_hash, SnapshotEntry.size,
+               SnapshotEntry.mtime, SnapshotEntry.deleted)
+        .where(SnapshotEntry.snapshot_id.in_(chain))
+        .order_by(SnapshotEntry.snapshot_id)
+    ).all()
+
+    manifest = {}
+    for path, kind, blob_hash, size, mtime, deleted in rows:
+        if deleted:
+            manifest.pop(path, None)
+        else:
+            manifest[path] = {'kind': kind, 'blob_hash': blob_hash, 'size': size, 'mtime': mtime}
+    return manifest
+
+def create_snapshot(project_id):
+    """Record the current project tree as a snapshot and return its id"""
+    project_folder = os.path.join(UPLOAD_FOLDER, project_id)
+    tree = scan_tree(project_folder)
+
+    parent = latest_snapshot(project_id)
+    reference = load_manifest(parent[0]) if parent else {}
+    if parent and parent[1] + 1 < MAX_CHAIN_LENGTH:
+        parent_id, chain_length = parent[0], parent[1] + 1
+        previous = reference
+    else:
+        # Start a new full manifest, still reusing the parent's hashes below
+        parent_id, chain_length = (parent[0] if parent else None), 0
+        previous = {}
+
+    # Hashes the uploads route already computed, so those files are never re-read
+    known_hashes = dict(db.session.execute(
+        select(UploadedFile.file_path, UploadedFile.blob_hash)
+        .where(UploadedFile.project_id == project_id, UploadedFile.blob_hash.is_not(None))
+    ).all())
+
+    entries = []
+    for path, (kind, size, mtime) in tree.items():
+        if kind == 'folder':
+            if previous.get(path, {}).get('kind') != 'folder':
+                entries.append((path, 'folder', None, None, None, 0))
+            continue
+
+        old = reference.get(path)
+        unchanged = old and old['kind'] == 'file' and old['size'] == size and old['mtime'] == mtime
+        if unchanged and path in previous:
+            continue
+
+        physical_path = os.path.join(project_folder, *path.split('/'))
+        digest = old['blob_hash'] if unchanged else known_hashes.get(physical_path)
+        if digest and os.path.exists(blobstore.blob_path(digest)):
+            blobstore.add_ref(digest, size)
+        else:
+            digest, size = blobstore.store_file(physical_path)
+        entries.append((path, 'file', digest, size, mtime, 0))
+
+    for path in previous.keys() - tree.keys():
+        entries.append((path, previous[path]['kind'], None, None, None, 1))
+
+    snapshot = Snapshot(snapshot_data='', project_id=project_id, parent_id=parent_id,
+                        format='manifest', chain_length=chain_length)
+    db.session.add(snapshot)
+    db.session.flush()
+    if entries:
+        db.session.execute(insert(SnapshotEntry), [
+            dict(zip(ENTRY_FIELDS, (snapshot.id,) + entry)) for entry in entries
+        ])
+    return snapshot.id
+
+def restore_snapshot(project_id, snapshot_id):
+    """Make the project tree match a snapshot, touching only the files that differ.
+
+    The target tree is built in a staging directory: unchanged files are
+    hard-linked from the live tree and changed ones are linked or streamed
+    from the blob store. It then exchanges the staged and live trees in one
+    rename, so readers see either the old project or the restored one and
+    never a missing or half-restored one. bytes_written counts bytes actually
+    copied; hard-linked files cost none. Returns counters for the response.
+    """
+    snapshot_format, snapshot_data = db.session.execute(
+        select(Snapshot.format, Snapshot.snapshot_data).where(Snapshot.id == snapshot_id)
+    ).one()
+    project_folder = os.path.join(UPLOAD_FOLDER, project_id)
+    current = scan_tree(project_folder)
+    stats = {'files_touched': 0, 'files_deleted': 0, 'bytes_written': 0}
+
+    os.makedirs(STAGING_FOLDER, exist_ok=True)
+    staging = os.path.join(STAGING_FOLDER, f'{project_id}-{uuid.uuid4().hex}')
+    os.makedirs(staging)
+    try:
+        if snapshot_format == 'manifest':
+            target = _stage_manifest(load_manifest(snapshot_id), current, project_folder, staging, stats)
+        else:
+            target = _stage_legacy(snapshot_data, staging, stats)
+
+        stats['files_deleted'] = sum(
+            1 for path, (kind, _, _) in current.items() if kind == 'file' and target.get(path) != 'file'
+        )
+        current_folders = {path for path, (kind, _, _) in current.items() if kind == 'folder'}
+        target_folders = {path for path, kind in target.items() if kind == 'folder'}
+        if stats['files_touched'] or stats['files_deleted'] or current_folders != target_folders:
+            _swap_in(staging, project_folder)
+    finally:
+        if os.path.exists(staging):
+            shutil.rmtree(staging)
+    return stats
+
+def _stage_manifest(manifest, current, project_folder, staging, stats):
+    target = {}
+    for path, entry in sorted(manifest.items()):
+        target[path] = entry['kind']
+        staged_path = os.path.join(staging, *path.split('/'))
+        if entry['kind'] == 'folder':
+            os.makedirs(staged_path, exist_ok=True)
+            continue
+
+        os.makedirs(os.path.dirname(staged_path), exist_ok=True)
+        live_path = os.path.join(project_folder, *path.split('/'))
+        if _matches(current.get(path), live_path, entry):
+            stats['bytes_written'] += blobstore.link_or_copy(live_path, staged_path)
+        else:
+            stats['bytes_written'] += blobstore.link_into(entry['blob_hash'], staged_path)
+            stats['files_touched'] += 1
+    return target
+
+def _matches(live, live_path, entry):
+    if not live or live[0] != 'file' or live[1] != entry['size']:
+        return False
+    if live[2] == entry['mtime']:
+        return True
+    # Same size but touched since: only now is the content worth reading
+    return blobstore.hash_file(live_path)[0] == entry['blob_hash']
+
+def _stage_legacy(snapshot_data, staging, stats):
+    # Snapshots from before manifests are a single base64 JSON document
+    snapshot = json.loads(snapshot_data)
+    target = {}
+    for folder_path in snapshot.get('folders', []):
+        target[folder_path] = 'folder'
+        os.makedirs(os.path.join(staging, *folder_path.split('/')), exist_ok=True)
+
+    files = snapshot.get('files', [])
+    while files:
+        # Pop as we go so each decoded file's source text can be freed
+        file_info = files.pop()
+        if not isinstance(file_info, dict):
+            continue
+        target[file_info['path']] = 'file'
+        staged_path = os.path.join(staging, *file_info['path'].split('/'))
+        os.makedirs(os.path.dirname(staged_path), exist_ok=True)
+        content = file_info['content']
+        with open(staged_path, 'wb') as f:
+            for start in range(0, len(content), LEGACY_DECODE_CHUNK):
+                stats['bytes_written'] += f.write(base64.b64decode(content[start:start + LEGACY_DECODE_CHUNK]))
+        stats['files_touched'] += 1
+    return target
+
+def _swap_in(staging, project_folder):
+    """Put the staged tree at project_folder; the old tree ends up at staging"""
+    if not os.path.exists(project_folder):
+        os.rename(staging, project_folder)
+        return
+    if _exchange(staging, project_folder):
+        return
+    # No RENAME_EXCHANGE here (not Linux, or a filesystem without it): fall back
+    # to two renames, which leave a moment where the project folder is missing
+    previous = staging + '-previous'
+    os.rename(project_folder, previous)
+    try:
+        os.rename(staging, project_folder)
+    except OSError:
+        os.rename(previous, project_folder)
+        raise
+    os.rename(previous, staging)
+
+def _exchange(first, second):
+    """Atomically swap two paths; False when the platform cannot"""
+    import ctypes
+    try:
+        renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+    except (OSError, AttributeError):
+        return False
+    if renameat2(AT_FDCWD, os.fsencode(first), AT_FDCWD, os.fsencode(second), RENAME_EXCHANGE) == 0:
+        return True
+    error = ctypes.get_errno()
+    if error in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+        return False
+    raise OSError(error, os.strerror(error), second)
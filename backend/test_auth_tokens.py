@@ -0,0 +1,97 @@
+"""
+Session token tests: login issues signed tokens, the caller is resolved from
+the token without touching the database, and tampered, expired, revoked or
+superseded tokens are refused.
+"""
+
+import io
+import time
+
+import pytest
+from flask import g
+from sqlalchemy import event
+
+from app import app, db
+from auth_tokens import tokens, Identity
+
+EMAIL = 'tokens@test.com'
+PASSWORD = 'correct horse'
+
+@pytest.fixture(autouse=True)
+def account(client):
+    client.post('/api/signup', json={'email': EMAIL, 'password': PASSWORD, 'name': 'Tok'})
+
+@pytest.fixture
+def session(client):
+    return client.post('/api/login', json={'email': EMAIL, 'password': PASSWORD}).get_json()
+
+def bearer(token):
+    return {'Authorization': f'Bearer {token}'}
+
+def test_login_issues_tokens(client, session):
+    assert session['success'] and session['expires_in'] > 0
+    with app.app_context():
+        claims = tokens.verify(session['access_token'])
+        assert claims['email'] == EMAIL
+        assert tokens.verify(session['refresh_token'], kind='refresh')['sub'] == claims['sub']
+
+    failed = client.post('/api/login', json={'email': EMAIL, 'password': 'wrong'}).get_json()
+    assert not failed['success'] and 'access_token' not in failed
+
+def test_caller_comes_from_the_token_without_queries(client, session):
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        with app.test_request_context(headers=bearer(session['access_token'])):
+            app.preprocess_request()
+            assert isinstance(g.current_user, Identity) and g.current_user.email == EMAIL
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    assert statements == []
+
+def test_profile_updates_need_a_token_and_ignore_the_body_email(client, session):
+    assert client.post('/api/update-profile', json={'email': EMAIL, 'name': 'Spoof'}).status_code == 401
+
+    response = client.post('/api/update-profile', json={'email': 'someone@else.com', 'name': 'Renamed'},
+                           headers=bearer(session['access_token']))
+    assert response.get_json()['success']
+    assert client.get(f'/api/user-profile/{EMAIL}').get_json()['profile']['name'] == 'Renamed'
+
+    photo = client.post('/api/upload-profile-photo', data={'photo': (io.BytesIO(b'png'), 'me.png')},
+                        headers=bearer(session['access_token']), content_type='multipart/form-data')
+    assert photo.get_json()['photoUrl'] == '/uploads/profiles/tokens_test.com_me.png'
+
+def test_tampered_expired_and_wrong_kind_tokens_are_refused(client, session):
+    body, signature = session['access_token'].split('.')
+    with app.app_context():
+        user_id = tokens.verify(session['access_token'])['sub']
+        expired = tokens.sign({'typ': 'access', 'sub': user_id, 'email': EMAIL, 'exp': int(time.time()) - 1})
+    forged = body[:-2] + ('AA' if body[-2:] != 'AA' else 'BB') + '.' + signature
+
+    for token in (forged, expired, session['refresh_token'], 'garbage', 'a.b.c', 'é.é'):
+        response = client.post('/api/update-profile', json={'name': 'x'}, headers=bearer(token))
+        assert response.status_code == 401, token
+
+def test_refresh_rotates_and_logout_revokes(client, session):
+    refreshed = client.post('/api/token/refresh', json={'refresh_token': session['refresh_token']}).get_json()
+    assert refreshed['success'] and refreshed['access_token'] != session['access_token']
+    # A refresh token works once
+    assert client.post('/api/token/refresh', json={'refresh_token': session['refresh_token']}).status_code == 401
+
+    headers = bearer(refreshed['access_token'])
+    assert client.post('/api/logout', json={'refresh_token': refreshed['refresh_token']},
+                       headers=headers).get_json()['success']
+    assert client.post('/api/update-profile', json={'name': 'x'}, headers=headers).status_code == 401
+    assert client.post('/api/token/refresh', json={'refresh_token': refreshed['refresh_token']}).status_code == 401
+
+def test_password_change_ends_other_sessions(client, session):
+    other = client.post('/api/login', json={'email': EMAIL, 'password': PASSWORD}).get_json()
+
+    changed = client.post('/api/update-profile', json={'newPassword': 'battery staple'},
+                          headers=bearer(session['access_token'])).get_json()
+    assert client.post('/api/token/refresh', json={'refresh_token': other['refresh_token']}).status_code == 401
+    # The session that changed the password carries on with the tokens it got back
+    assert client.post('/api/token/refresh', json={'refresh_token': changed['refresh_token']}).status_code == 200
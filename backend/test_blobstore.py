@@ -0,0 +1,70 @@
+"""
+Blob store tests: identical uploads share one blob, references are counted
+and the blob goes with the last one, and files on disk follow the database
+transaction when it rolls back.
+"""
+
+import hashlib
+import io
+import os
+
+import folder_index
+import routes.uploads
+from app import db
+from blobstore import blob_path
+from models import Blob
+
+CONTENT = b'the same notes in two places'
+DIGEST = hashlib.sha256(CONTENT).hexdigest()
+
+def upload(client, project_id, folder, log_history=False):
+    return client.post('/api/upload', data={
+        'file': (io.BytesIO(CONTENT), 'notes.txt'), 'folder': folder,
+        'project_id': project_id, 'log_history': str(log_history).lower(),
+    }, content_type='multipart/form-data').get_json()
+
+def delete_folder(client, project_id, folder, log_history=False):
+    return client.delete('/api/delete-folder', json={
+        'folder_path': folder, 'project_id': project_id, 'log_history': log_history
+    }).get_json()
+
+def refcount():
+    db.session.expire_all()
+    blob = db.session.get(Blob, DIGEST)
+    return blob.refcount if blob else None
+
+def project_files(project_id):
+    return [os.path.join(root, name) for root, _, names in os.walk(os.path.join('uploads', project_id))
+            for name in names]
+
+def test_identical_uploads_share_one_blob(client, app_context):
+    assert upload(client, 'first', 'a')['success']
+    assert upload(client, 'second', 'b')['success']
+    assert refcount() == 2
+    [first], [second] = project_files('first'), project_files('second')
+    assert os.path.samefile(first, blob_path(DIGEST)) and os.path.samefile(second, blob_path(DIGEST))
+
+    assert delete_folder(client, 'first', 'a')['success']
+    assert refcount() == 1 and os.path.exists(blob_path(DIGEST))
+    assert delete_folder(client, 'second', 'b')['success']
+    assert refcount() is None and not os.path.exists(blob_path(DIGEST))
+
+def test_failed_delete_keeps_files_and_blobs(client, app_context, monkeypatch):
+    upload(client, 'kept', 'docs')
+    def broken_snapshot(project_id):
+        raise RuntimeError('disk full')
+    monkeypatch.setattr(routes.uploads, 'create_snapshot', broken_snapshot)
+
+    assert not delete_folder(client, 'kept', 'docs', log_history=True)['success']
+    # The refcount rolled back, so the blob and the folder have to still be there too
+    assert refcount() == 1 and os.path.exists(blob_path(DIGEST))
+    assert len(project_files('kept')) == 1
+
+def test_failed_upload_leaves_no_files(client, app_context, monkeypatch):
+    def broken_index(project_id, folder_path):
+        raise RuntimeError('index unavailable')
+    monkeypatch.setattr(folder_index, 'ensure_folders', broken_index)
+
+    assert not upload(client, 'orphans', 'docs')['success']
+    assert refcount() is None and not os.path.exists(blob_path(DIGEST))
+    assert project_files('orphans') == []
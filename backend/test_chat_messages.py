@@ -0,0 +1,50 @@
+"""
+Chat history tests: pages come newest first, since_id and before_id walk
+forwards and backwards without gaps or repeats, and page sizes are capped.
+"""
+
+PROJECT = 'paged'
+
+def post(client, content, chat_id='general'):
+    return client.post('/api/chat/messages', json={
+        'user_id': 'pager@test.com', 'username': 'pager', 'content': content,
+        'chat_id': chat_id, 'project_id': PROJECT
+    }).get_json()['id']
+
+def page(client, **params):
+    response = client.get('/api/chat/messages', query_string=dict(params, project_id=PROJECT))
+    return [message['id'] for message in response.get_json()]
+
+def test_latest_page_is_newest_first(client):
+    ids = [post(client, f'message {i}') for i in range(5)]
+    other = post(client, 'elsewhere', chat_id='random')
+    assert page(client, limit=3) == ids[:1:-1]
+    assert page(client, chat_id='random') == [other]
+
+def test_before_id_pages_back_through_history(client):
+    ids = [post(client, f'message {i}') for i in range(7)]
+    seen, cursor = [], None
+    while True:
+        params = {'limit': 3, 'before_id': cursor} if cursor else {'limit': 3}
+        older = page(client, **params)
+        if not older:
+            break
+        seen += older
+        cursor = older[-1]
+    assert seen == ids[::-1]
+
+def test_since_id_catches_up_without_skipping(client):
+    first = post(client, 'already seen')
+    missed = [post(client, f'missed {i}') for i in range(5)]
+    # A capped catch-up page starts right after since_id, so the next poll continues from it
+    assert page(client, since_id=first, limit=2) == missed[1::-1]
+    assert page(client, since_id=missed[1], limit=10) == missed[:1:-1]
+    assert page(client, since_id=missed[-1]) == []
+
+def test_limit_is_clamped(client):
+    ids = [post(client, f'message {i}') for i in range(3)]
+    assert page(client, limit=-1) == ids[-1:]
+    assert page(client, limit=0) == ids[-1:]
+    for i in range(205):
+        post(client, f'bulk {i}')
+    assert len(page(client, limit=10_000)) == 200
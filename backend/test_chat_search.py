@@ -0,0 +1,113 @@
+"""
+Chat search tests: ranked, highlighted and scoped results, cursor pages
+that neither repeat nor skip, and an index that follows message changes.
+"""
+
+from sqlalchemy import update
+
+import message_search
+
+from app import app, db
+from models import Message
+
+PROJECT = 'searchable'
+
+def post(client, content, chat_id='general', project_id=PROJECT):
+    return client.post('/api/chat/messages', json={
+        'user_id': 1, 'username': 'u', 'content': content, 'chat_id': chat_id, 'project_id': project_id
+    }).get_json()['id']
+
+def search(client, q, **params):
+    params.setdefault('project_id', PROJECT)
+    return client.get('/api/chat/search', query_string=dict(params, q=q))
+
+def ids(response):
+    return [result['id'] for result in response.get_json()['results']]
+
+def test_results_are_ranked_and_highlighted(client):
+    passing = post(client, 'the deploy script is in the repo')
+    focused = post(client, 'deploy deploy deploy: the deploy failed')
+    post(client, 'nothing to see here')
+
+    response = search(client, 'deploy')
+    assert response.status_code == 200
+    assert ids(response) == [focused, passing]
+    assert response.get_json()['results'][1]['snippet'] == 'the <mark>deploy</mark> script is in the repo'
+    assert response.get_json()['results'][1]['content'] == 'the deploy script is in the repo'
+
+def test_snippets_escape_message_markup(client):
+    post(client, '<script>alert(1)</script> payload')
+
+    snippet = search(client, 'payload').get_json()['results'][0]['snippet']
+    assert snippet == '&lt;script&gt;alert(1)&lt;/script&gt; <mark>payload</mark>'
+
+def test_search_is_scoped_to_project_and_topic(client):
+    general = post(client, 'release notes')
+    design = post(client, 'release mockups', chat_id='design')
+    post(client, 'release elsewhere', project_id='other')
+
+    assert sorted(ids(search(client, 'release'))) == [general, design]
+    assert ids(search(client, 'release', chat_id='design')) == [design]
+    assert search(client, 'release', project_id='').status_code == 400
+
+def test_cursor_walks_every_match_once(client):
+    posted = {post(client, f'standup {"update " * (i % 4)}{i}') for i in range(25)}
+
+    seen, cursor = [], None
+    while True:
+        params = {'limit': 10, 'cursor': cursor} if cursor else {'limit': 10}
+        page = search(client, 'update', **params).get_json()
+        seen += [result['id'] for result in page['results']]
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+    # Messages with i % 4 == 0 do not mention "update"
+    assert len(seen) == len(set(seen)) == 18
+    assert set(seen) <= posted
+    assert search(client, 'update', cursor='garbage').status_code == 400
+
+def test_cursor_walks_past_the_ranking_window(client, monkeypatch):
+    monkeypatch.setattr(message_search, 'SEARCH_WINDOW', 4)
+    matches = [post(client, f'standup {"update " * (i % 4)}{i}') for i in range(25) if i % 4]
+
+    pages, cursor = [], None
+    while True:
+        params = {'limit': 3, 'cursor': cursor} if cursor else {'limit': 3}
+        page = search(client, 'update', **params).get_json()
+        pages.append([result['id'] for result in page['results']])
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+        if len(pages) == 1:
+            # Pinned to the first window, so it does not push the others along
+            post(client, 'update posted while paging')
+    seen = [message_id for page in pages for message_id in page]
+    assert sorted(seen) == sorted(matches)
+    # Ranked a window at a time, newest window first
+    assert set(seen[:4]) == set(matches[-4:])
+    assert set(seen[4:8]) == set(matches[-8:-4])
+
+def test_prefix_and_query_syntax(client):
+    message = post(client, 'Deployment finished')
+
+    assert ids(search(client, 'deplo')) == []
+    assert ids(search(client, 'deplo*')) == [message]
+    assert ids(search(client, 'fin*')) == [message]
+    assert ids(search(client, 'DEPLOYMENT "finished')) == [message]
+    # FTS5 operators and stray punctuation are just text
+    for q in ('NEAR(', 'deploy*) OR', '"', 'content:x', '-', '*'):
+        assert search(client, q).status_code == 200
+    assert search(client, '').get_json() == {'results': [], 'next_cursor': None}
+
+def test_index_follows_edits_and_deletes(client):
+    kept = post(client, 'quarterly roadmap')
+    edited = post(client, 'draft roadmap', chat_id='planning')
+    with app.app_context():
+        db.session.execute(update(Message).where(Message.id == edited).values(content='final plan'))
+        db.session.commit()
+
+    assert ids(search(client, 'roadmap')) == [kept]
+    assert ids(search(client, 'final')) == [edited]
+
+    client.delete(f'/api/chat/topics/planning?project_id={PROJECT}')
+    assert ids(search(client, 'final')) == []
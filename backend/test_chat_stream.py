@@ -0,0 +1,103 @@
+"""
+Chat stream tests: the hub fans messages out per topic, cuts loose
+subscribers that fall behind and picks up messages other processes posted,
+and /api/chat/stream backfills from Last-Event-ID before pushing live messages.
+"""
+
+import json
+import threading
+
+import chat_hub
+import routes.chat
+from app import app, db
+from chat_hub import hub, ChatHub
+from models import Message
+
+PROJECT = 'streamed'
+
+def post(client, content, chat_id='general'):
+    return client.post('/api/chat/messages', json={
+        'user_id': 'streamer@test.com', 'username': 'streamer', 'content': content,
+        'chat_id': chat_id, 'project_id': PROJECT
+    }).get_json()['id']
+
+def events(chunks):
+    """(id, content) of each message event in the next stream chunks"""
+    for chunk in chunks:
+        if chunk.startswith(b'id: '):
+            data = json.loads(chunk.decode().split('data: ', 1)[1])
+            yield data['id'], data['content']
+
+def test_hub_delivers_per_topic():
+    local = ChatHub()
+    general = local.subscribe(PROJECT, 'general')
+    random = local.subscribe(PROJECT, 'random')
+    local.publish(PROJECT, 'general', {'id': 1})
+    assert general.get(timeout=1) == {'id': 1}
+    assert random.queue.empty()
+
+    local.unsubscribe(general)
+    local.publish(PROJECT, 'general', {'id': 2})
+    assert general.queue.empty()
+
+def test_hub_drops_subscribers_that_fall_behind(monkeypatch):
+    monkeypatch.setattr(chat_hub, 'SUBSCRIBER_QUEUE_SIZE', 2)
+    local = ChatHub()
+    slow = local.subscribe(PROJECT, 'general')
+    for i in range(3):
+        local.publish(PROJECT, 'general', {'id': i})
+    # Whatever was queued, the subscriber ends on None and gets nothing more
+    queued = [slow.get(timeout=1) for _ in range(slow.queue.qsize())]
+    assert queued[-1] is None
+    local.publish(PROJECT, 'general', {'id': 3})
+    assert slow.queue.empty()
+
+def test_hub_polls_for_messages_from_other_processes(monkeypatch):
+    monkeypatch.setattr(chat_hub, 'POLL_SECONDS', 0.05)
+    local = ChatHub(app)
+    general = local.subscribe(PROJECT, 'general')
+    local.subscribe(PROJECT, 'random')
+    try:
+        # Written straight to the database, the way another worker's post would land
+        with app.app_context():
+            for chat_id in ('elsewhere', 'general'):
+                db.session.add(Message(user_id='other@test.com', username='other', content=f'from {chat_id}',
+                                       chat_id=chat_id, project_id=PROJECT))
+            db.session.commit()
+        assert general.get(timeout=5)['content'] == 'from general'
+    finally:
+        local.stop()
+    assert general.queue.empty()
+
+def test_stream_backfills_then_pushes_live_messages(client):
+    seen = post(client, 'seen before the reconnect')
+    missed = [post(client, f'missed {i}') for i in range(3)]
+
+    response = client.get('/api/chat/stream', query_string={'project_id': PROJECT},
+                          headers={'Last-Event-ID': str(seen)}, buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    chunks = iter(response.response)
+    assert next(chunks).startswith(b'retry: ')
+    stream = events(chunks)
+    assert [next(stream) for _ in missed] == [(message_id, f'missed {i}') for i, message_id in enumerate(missed)]
+
+    live = post(client, 'live')
+    assert next(stream) == (live, 'live')
+    response.close()
+    assert not hub._subscribers
+
+def test_streams_per_process_are_capped(client, monkeypatch):
+    monkeypatch.setattr(routes.chat, '_stream_slots', threading.BoundedSemaphore(1))
+    query = {'project_id': PROJECT}
+    first = client.get('/api/chat/stream', query_string=query, buffered=False)
+    assert first.status_code == 200
+
+    refused = client.get('/api/chat/stream', query_string=query, buffered=False)
+    assert refused.status_code == 503
+    assert refused.headers['Retry-After'] == '3'
+
+    # Closing a stream frees its slot, even one that never sent anything
+    first.close()
+    second = client.get('/api/chat/stream', query_string=query, buffered=False)
+    assert second.status_code == 200
+    second.close()
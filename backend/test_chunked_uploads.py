@@ -0,0 +1,73 @@
+"""
+Chunked upload protocol tests: chunks land in order, an interrupted upload
+resumes from the acknowledged offset, and only finalize records the file.
+"""
+
+import hashlib
+import os
+
+from app import app, db
+from models import UploadedFile
+
+CONTENT = os.urandom(2500)
+CHUNK = 1000
+
+def start(client, **extra):
+    body = {'project_id': 'chunked', 'filename': 'big.pdf', 'size': len(CONTENT), 'chunk_size': CHUNK}
+    body.update(extra)
+    return client.post('/api/uploads', json=body).get_json()
+
+def put_chunk(client, upload_id, index, data=None):
+    if data is None:
+        data = CONTENT[index * CHUNK:(index + 1) * CHUNK]
+    return client.put(f'/api/uploads/{upload_id}/chunks/{index}', data=data,
+                      headers={'X-Chunk-SHA256': hashlib.sha256(data).hexdigest()})
+
+def file_rows(upload_name):
+    with app.app_context():
+        return db.session.execute(
+            db.select(UploadedFile.file_path, UploadedFile.blob_hash)
+            .where(UploadedFile.original_filename == upload_name)
+        ).all()
+
+def test_resume_after_interruption(client):
+    upload_id = start(client, sha256=hashlib.sha256(CONTENT).hexdigest())['upload_id']
+
+    assert put_chunk(client, upload_id, 0).get_json()['offset'] == CHUNK
+    # Skipping ahead is refused and reports where to continue
+    response = put_chunk(client, upload_id, 2)
+    assert response.status_code == 409
+    assert response.get_json()['next_chunk'] == 1
+
+    # A resuming client asks for the offset and carries on from there
+    state = client.get(f'/api/uploads/{upload_id}').get_json()
+    assert state['offset'] == CHUNK
+    for index in range(state['next_chunk'], 3):
+        assert put_chunk(client, upload_id, index).get_json()['success']
+    assert file_rows('big.pdf') == []
+
+    result = client.post(f'/api/uploads/{upload_id}/finalize').get_json()
+    assert result['success']
+    [(file_path, blob_hash)] = file_rows('big.pdf')
+    assert blob_hash == hashlib.sha256(CONTENT).hexdigest()
+    with open(file_path, 'rb') as f:
+        assert f.read() == CONTENT
+    assert client.get(f'/api/uploads/{upload_id}').status_code == 404
+
+def test_corrupt_chunk_is_not_acknowledged(client):
+    upload_id = start(client, filename='corrupt.pdf')['upload_id']
+
+    response = client.put(f'/api/uploads/{upload_id}/chunks/0', data=CONTENT[:CHUNK],
+                          headers={'X-Chunk-SHA256': '0' * 64})
+    assert response.status_code == 400
+    assert client.get(f'/api/uploads/{upload_id}').get_json()['offset'] == 0
+
+def test_finalize_rejects_hash_mismatch(client):
+    upload_id = start(client, filename='mismatch.pdf', sha256='0' * 64)['upload_id']
+    for index in range(3):
+        put_chunk(client, upload_id, index)
+
+    response = client.post(f'/api/uploads/{upload_id}/finalize')
+    assert response.status_code == 422
+    assert client.get(f'/api/uploads/{upload_id}').get_json()['offset'] == 0
+    assert file_rows('mismatch.pdf') == []
@@ -0,0 +1,126 @@
+"""
+Email outbox tests against an in-memory SMTP stand-in.
+Requests must only enqueue, workers must reuse one SMTP session across
+messages, and failed sends must be retried until they give up.
+"""
+
+import smtplib
+import time
+
+import pytest
+
+import email_outbox
+from app import app
+from email_outbox import Outbox
+from models import db, EmailJob
+
+class FakeSMTP:
+    """Records connections and messages; fails the first `failures` sends"""
+    connections = 0
+    sent = []
+    failures = 0
+
+    def __init__(self, host, port):
+        FakeSMTP.connections += 1
+
+    def starttls(self):
+        pass
+
+    def login(self, username, password):
+        pass
+
+    def sendmail(self, sender, to_email, message):
+        if FakeSMTP.failures:
+            FakeSMTP.failures -= 1
+            raise smtplib.SMTPRecipientsRefused({to_email: (550, b'try later')})
+        FakeSMTP.sent.append(to_email)
+
+    def quit(self):
+        pass
+
+@pytest.fixture
+def outbox(monkeypatch):
+    FakeSMTP.connections = 0
+    FakeSMTP.sent = []
+    FakeSMTP.failures = 0
+    monkeypatch.setattr(email_outbox, 'RETRY_BASE_SECONDS', 0)
+    box = Outbox(worker_count=1, smtp_factory=FakeSMTP, app=app)
+    yield box
+    box.stop()
+
+def wait_for(box, job_ids, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        jobs = [box.status(job_id) for job_id in job_ids]
+        if all(job['status'] in ('sent', 'failed') for job in jobs):
+            return jobs
+        time.sleep(0.02)
+    raise AssertionError('outbox did not drain')
+
+def test_worker_reuses_one_smtp_session(outbox):
+    job_ids = [outbox.enqueue(f'user{i}@test.com', 'Hello', 'Body') for i in range(5)]
+    jobs = wait_for(outbox, job_ids)
+
+    assert [job['status'] for job in jobs] == ['sent'] * 5
+    assert sorted(FakeSMTP.sent) == sorted(f'user{i}@test.com' for i in range(5))
+    assert FakeSMTP.connections == 1
+
+def test_failed_send_is_retried(outbox):
+    FakeSMTP.failures = 2
+    job = wait_for(outbox, [outbox.enqueue('retry@test.com', 'Hello', 'Body')])[0]
+
+    assert job['status'] == 'sent'
+    assert job['attempts'] == 3
+    assert FakeSMTP.sent == ['retry@test.com']
+
+def test_gives_up_after_max_attempts(outbox):
+    FakeSMTP.failures = email_outbox.MAX_ATTEMPTS
+    job = wait_for(outbox, [outbox.enqueue('bounce@test.com', 'Hello', 'Body')])[0]
+
+    assert job['status'] == 'failed'
+    assert job['attempts'] == email_outbox.MAX_ATTEMPTS
+    assert '550' in job['last_error']
+
+def test_expired_lease_is_claimed_again(outbox):
+    # A job left in 'sending' by a worker process that died mid-send
+    with app.app_context():
+        job = EmailJob(to_email='orphan@test.com', subject='Hello', body='Body', status='sending',
+                       next_attempt_at=time.time() - 1)
+        db.session.add(job)
+        db.session.commit()
+        job_id = job.id
+
+    outbox.start()
+    [job] = wait_for(outbox, [job_id])
+    assert job['status'] == 'sent'
+    assert FakeSMTP.sent == ['orphan@test.com']
+
+def test_send_invitations_only_enqueues(monkeypatch):
+    from app import app
+    import routes.email
+
+    queued = []
+    monkeypatch.setattr(routes.email.outbox, 'enqueue', lambda *args: queued.append(args) or len(queued))
+
+    response = app.test_client().post('/api/send-invitations', json={
+        'project_name': 'Demo',
+        'project_code': 'ABC123',
+        'creator_email': 'owner@test.com',
+        'collaborators': [
+            {'email': f'user{i}@test.com', 'responsibilities': ['Backend']} for i in range(15)
+        ],
+    })
+
+    data = response.get_json()
+    assert data['success'] is True
+    assert data['queued_count'] == 15
+    assert data['job_ids']['user0@test.com'] == 1
+    assert len(queued) == 15
+
+def test_test_email_returns_the_job_id(client, monkeypatch):
+    import routes.email
+    monkeypatch.setattr(routes.email.outbox, 'enqueue', lambda *args: 42)
+
+    data = client.get('/test-email/someone@test.com').get_json()
+    assert data['success'] is True
+    assert data['job_id'] == 42
@@ -0,0 +1,64 @@
+"""
+Download endpoint tests: files are streamed as raw bytes with Range and
+ETag support, and previews no longer inline file contents.
+"""
+
+import io
+import os
+
+import pytest
+
+from app import app
+
+CONTENT = os.urandom(4096)
+
+@pytest.fixture
+def uploaded(client):
+    client.post('/api/upload', data={
+        'file': (io.BytesIO(CONTENT), 'photo.png'),
+        'project_id': 'downloads',
+    }, content_type='multipart/form-data')
+    items = client.get('/api/folder-contents/root?project_id=downloads').get_json()['items']
+    return next(item for item in items if item['name'].endswith('photo.png'))
+
+def test_download_streams_with_etag_and_ranges(client, uploaded):
+    url = f"/api/files/{uploaded['name']}?project_id=downloads"
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.mimetype == 'image/png'
+    assert response.data == CONTENT
+    etag = response.headers['ETag']
+
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    partial = client.get(url, headers={'Range': 'bytes=100-199'})
+    assert partial.status_code == 206
+    assert partial.data == CONTENT[100:200]
+    assert partial.headers['Content-Range'] == f'bytes 100-199/{len(CONTENT)}'
+
+def test_download_rejects_paths_outside_the_project(client, uploaded):
+    assert client.get('/api/files/../uploads.db?project_id=downloads').status_code == 404
+
+def test_image_preview_links_to_download(client, uploaded):
+    result = client.get(f"/api/file-preview/{uploaded['name']}?project_id=downloads").get_json()
+    assert result['type'] == 'image'
+    assert 'content' not in result
+    assert result['url'].endswith(f"/api/files/{uploaded['name']}?project_id=downloads")
+
+def test_text_preview_is_truncated(client):
+    client.post('/api/upload', data={
+        'file': (io.BytesIO(b'x' * 100), 'notes.txt'),
+        'project_id': 'downloads',
+    }, content_type='multipart/form-data')
+    items = client.get('/api/folder-contents/root?project_id=downloads').get_json()['items']
+    name = next(item['name'] for item in items if item['name'].endswith('notes.txt'))
+
+    app.config['PREVIEW_TEXT_BYTES'] = 10
+    try:
+        result = client.get(f'/api/file-preview/{name}?project_id=downloads').get_json()
+    finally:
+        app.config.pop('PREVIEW_TEXT_BYTES')
+    assert result['content'] == 'x' * 10
+    assert result['truncated'] is True
+    assert result['size'] == 100
@@ -0,0 +1,64 @@
+"""
+Folder index tests: the tree and folder listings come from the folders and
+uploaded_files tables, the routes keep them in sync, and reconcile rebuilds
+them from disk.
+"""
+
+import io
+import os
+import shutil
+
+from app import app, db
+from folder_index import reconcile_project
+
+PROJECT = 'indexed'
+
+def upload(client, name, folder=''):
+    return client.post('/api/upload', data={
+        'file': (io.BytesIO(b'hello ' + name.encode()), name),
+        'folder': folder,
+        'project_id': PROJECT,
+    }, content_type='multipart/form-data').get_json()
+
+def tree(client):
+    return [folder['path'] for folder in client.get(f'/api/folder-tree?project_id={PROJECT}').get_json()['folders']]
+
+def contents(client, folder):
+    return client.get(f'/api/folder-contents/{folder}?project_id={PROJECT}').get_json()
+
+def test_routes_keep_index_in_sync(client):
+    client.post('/api/create-folder', json={'folder_name': 'docs', 'project_id': PROJECT})
+    upload(client, 'a.txt', 'docs/drafts/old')
+    upload(client, 'b.txt')
+
+    assert tree(client) == ['docs', 'docs/drafts', 'docs/drafts/old']
+
+    root = contents(client, 'root')['items']
+    assert [item['name'] for item in root if item['type'] == 'folder'] == ['docs']
+    [file_item] = [item for item in root if item['type'] == 'file']
+    assert file_item['original_filename'] == 'b.txt'
+    assert file_item['size'] == len(b'hello b.txt')
+    assert file_item['uploaded'] != 'Unknown'
+
+    client.delete('/api/delete-folder', json={'folder_path': 'docs/drafts', 'project_id': PROJECT})
+    assert tree(client) == ['docs']
+    assert contents(client, 'docs/drafts')['success'] is False
+
+def test_reconcile_rebuilds_from_disk(client):
+    upload(client, 'kept.txt', 'reports')
+    project_folder = os.path.join('uploads', PROJECT)
+    os.makedirs(os.path.join(project_folder, 'manual', 'nested'))
+    with open(os.path.join(project_folder, 'manual', 'nested', 'copied.txt'), 'wb') as f:
+        f.write(b'dropped in by hand')
+    shutil.rmtree(os.path.join(project_folder, 'reports'))
+
+    with app.app_context():
+        stats = reconcile_project(PROJECT)
+        db.session.commit()
+
+    assert stats['files_added'] == 1
+    assert stats['files_removed'] >= 1
+    assert 'reports' not in tree(client)
+    assert {'manual', 'manual/nested'} <= set(tree(client))
+    [item] = contents(client, 'manual/nested')['items']
+    assert item['original_filename'] == 'copied.txt'
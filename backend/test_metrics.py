@@ -0,0 +1,69 @@
+"""
+Request metrics tests: each request is timed, sized and counted under its
+endpoint along with the SQL it ran, and /metrics serves it all.
+"""
+
+import io
+
+from prometheus_client import REGISTRY
+from sqlalchemy import event
+
+from app import app, db
+
+USER = 'metrics@test.com'
+LABELS = {'endpoint': 'api.get_user_projects', 'method': 'GET'}
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, {**LABELS, **labels}) or 0
+
+def test_request_is_timed_sized_and_counted(client):
+    before = {name: sample(name) for name in ('http_request_duration_seconds_count',
+                                              'http_response_size_bytes_sum',
+                                              'db_queries_per_request_sum')}
+    ok = sample('http_requests_total', status='200')
+    statements = []
+    record = lambda *args: statements.append(args[2])
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(f'/api/user-projects/{USER}')
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+    assert response.status_code == 200
+    assert sample('http_request_duration_seconds_count') == before['http_request_duration_seconds_count'] + 1
+    assert sample('http_response_size_bytes_sum') == before['http_response_size_bytes_sum'] + len(response.data)
+    assert sample('db_queries_per_request_sum') == before['db_queries_per_request_sum'] + len(statements)
+    assert statements
+    assert sample('http_requests_total', status='200') == ok + 1
+    assert sample('http_requests_in_flight') == 0
+
+def test_file_downloads_are_sized(client):
+    content = b'x' * 50_000
+    client.post('/api/upload', data={
+        'file': (io.BytesIO(content), 'large.txt'), 'project_id': 'metered',
+    }, content_type='multipart/form-data')
+    [item] = client.get('/api/folder-contents/root?project_id=metered').get_json()['items']
+    labels = {'endpoint': 'uploads.download_file', 'method': 'GET'}
+    before = sample('http_response_size_bytes_sum', **labels)
+
+    response = client.get(f"/api/files/{item['name']}?project_id=metered")
+    assert response.data == content
+    assert sample('http_response_size_bytes_sum', **labels) == before + len(content)
+
+def test_unknown_paths_share_one_series(client):
+    labels = {'endpoint': 'unmatched', 'method': 'GET', 'status': '404'}
+    before = REGISTRY.get_sample_value('http_requests_total', labels) or 0
+    client.get('/no/such/page')
+    client.get('/nor/this/one')
+    assert REGISTRY.get_sample_value('http_requests_total', labels) == before + 2
+
+def test_metrics_endpoint_serves_prometheus_text(client):
+    client.get(f'/api/user-projects/{USER}')
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    body = response.get_data(as_text=True)
+    assert 'http_request_duration_seconds_bucket{endpoint="api.get_user_projects",le="0.005",method="GET"}' in body
+    assert '# TYPE db_queries_per_request histogram' in body
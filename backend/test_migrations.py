@@ -0,0 +1,50 @@
+"""
+Schema migration tests: a database made by older code is brought up to the
+current schema, and applied versions are not run again.
+"""
+
+from sqlalchemy import create_engine, text
+
+from migrations import apply, Target, UPLOADS_MIGRATIONS, CHAT_MIGRATIONS
+
+def test_legacy_uploads_database_is_upgraded(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'uploads.db'}")
+    with engine.begin() as conn:
+        # uploads.db as it looked before projects, blobs and manifest snapshots
+        conn.execute(text('CREATE TABLE folders (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, path TEXT NOT NULL)'))
+        conn.execute(text('''CREATE TABLE uploaded_files (id INTEGER PRIMARY KEY AUTOINCREMENT, filename TEXT NOT NULL,
+            original_filename TEXT NOT NULL, file_path TEXT NOT NULL, folder_path TEXT, file_size INTEGER)'''))
+        conn.execute(text('CREATE TABLE history (id INTEGER PRIMARY KEY AUTOINCREMENT, action TEXT, item TEXT, type TEXT, timestamp TIMESTAMP)'))
+        conn.execute(text('CREATE TABLE snapshots (id INTEGER PRIMARY KEY AUTOINCREMENT, created_at TIMESTAMP)'))
+        conn.execute(text('CREATE TABLE upload_sessions (id TEXT PRIMARY KEY, updated_at REAL)'))
+        conn.execute(text("INSERT INTO folders (name, path) VALUES ('b', 'a/b')"))
+        target = Target(conn)
+
+        assert apply(target, 'uploads', UPLOADS_MIGRATIONS) == [1, 2, 3, 4, 5, 6, 7]
+        assert {'project_id', 'parent_path'} <= target.columns('folders')
+        assert {'project_id', 'blob_hash'} <= target.columns('uploaded_files')
+        assert {'parent_id', 'format', 'chain_length'} <= target.columns('snapshots')
+        assert target.execute("SELECT parent_path FROM folders WHERE path = 'a/b'") == [('a',)]
+        indexes = {row[0] for row in target.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {'idx_history_project_timestamp', 'idx_folders_project_parent'} <= indexes
+
+        assert apply(target, 'uploads', UPLOADS_MIGRATIONS) == []
+    engine.dispose()
+
+def test_components_share_one_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'shared.db'}")
+    with engine.begin() as conn:
+        # Just the columns the chat steps touch
+        for table in ('messages', 'chat_groups', 'chat_topics', 'email_outbox'):
+            conn.execute(text(f'CREATE TABLE {table} (id INTEGER PRIMARY KEY, chat_id TEXT, content TEXT, '
+                              'created_at TIMESTAMP, status TEXT, next_attempt_at REAL)'))
+        conn.execute(text("INSERT INTO messages (chat_id, content) VALUES ('general', 'posted before search')"))
+        target = Target(conn)
+        assert apply(target, 'chat', CHAT_MIGRATIONS) == [1, 2, 3, 4, 5, 6]
+        # Messages from before the search index are indexed too
+        assert target.execute("SELECT rowid FROM messages_fts WHERE messages_fts MATCH 'search'") == [(1,)]
+        assert apply(target, 'uploads', UPLOADS_MIGRATIONS[3:4]) == [4]
+        versions = target.execute('SELECT component, version FROM schema_migrations ORDER BY component, version')
+        assert versions == [('chat', 1), ('chat', 2), ('chat', 3), ('chat', 4), ('chat', 5), ('chat', 6),
+                            ('uploads', 4)]
+    engine.dispose()
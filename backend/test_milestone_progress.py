@@ -0,0 +1,122 @@
+"""
+Milestone tests: status changes update the progress counters with a
+constant number of statements, the bulk endpoint batches them,
+recount_milestones() finds and repairs drift, and the timeline loader is
+batched and revalidates with ETags.
+"""
+
+import pytest
+from sqlalchemy import event
+
+from app import db, Project, Milestone, Task, recount_milestones, migrate_milestone_members
+
+pytestmark = pytest.mark.usefixtures('app_context')
+
+@pytest.fixture(autouse=True)
+def project(app_context):
+    db.session.add(Project(id='m1', name='Milestones', creator='owner@test.com', code='M00001'))
+    db.session.commit()
+
+def make_milestone(client, tasks, members=()):
+    response = client.post('/api/project/m1/milestones', json={
+        'title': 'Launch', 'startDate': '2025-01-01', 'endDate': '2025-02-01',
+        'assignedMembers': list(members), 'tasks': [{'title': f'Task {i}'} for i in range(tasks)]
+    })
+    milestone_id = response.get_json()['milestone_id']
+    task_ids = [task.id for task in Task.query.filter_by(milestone_id=milestone_id).order_by(Task.id)]
+    return milestone_id, task_ids
+
+def milestone(milestone_id):
+    db.session.expire_all()
+    return db.session.get(Milestone, milestone_id)
+
+def test_status_change_is_constant_time(client):
+    milestone_id, task_ids = make_milestone(client, 40)
+    assert milestone(milestone_id).todo_count == 40
+
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        client.put(f'/api/task/{task_ids[0]}/status', json={'status': 'Done'})
+        client.put(f'/api/task/{task_ids[1]}/status', json={'status': 'In Progress'})
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+    # Per change: read the task, guarded task UPDATE, counter UPDATE
+    assert len(statements) == 6
+    m = milestone(milestone_id)
+    assert (m.todo_count, m.in_progress_count, m.done_count) == (38, 1, 1)
+    assert m.progress == pytest.approx((100 + 50) / 40)
+
+def test_bulk_status_update(client):
+    milestone_id, task_ids = make_milestone(client, 4)
+    other_id, other_tasks = make_milestone(client, 2)
+
+    data = client.put('/api/tasks/status', json={'updates': [
+        {'id': task_ids[0], 'status': 'Done'},
+        {'id': task_ids[1], 'status': 'Done'},
+        {'id': other_tasks[0], 'status': 'In Progress'},
+        {'id': 999999, 'status': 'Done'},
+    ]}).get_json()
+
+    assert data['updated'] == 3
+    assert data['missing'] == [999999]
+    assert data['progress'][str(milestone_id)] == pytest.approx(50)
+    assert data['progress'][str(other_id)] == pytest.approx(25)
+
+def test_recount_repairs_drift(client):
+    milestone_id, task_ids = make_milestone(client, 3)
+    client.put(f'/api/task/{task_ids[0]}/status', json={'status': 'Done'})
+    m = milestone(milestone_id)
+    m.done_count = 0
+    m.progress = 0
+    db.session.commit()
+
+    [(found_id, stored, actual)] = recount_milestones(fix=True)
+    assert found_id == milestone_id
+    assert actual == {'todo': 2, 'in_progress': 0, 'done': 1}
+    m = milestone(milestone_id)
+    assert m.done_count == 1
+    assert m.progress == pytest.approx(100 / 3)
+    assert recount_milestones() == []
+
+def test_milestones_load_in_batched_queries(client):
+    for i in range(10):
+        make_milestone(client, 5, members=[f'user{i}@test.com', 'lead@test.com'])
+    db.session.expunge_all()
+
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.get('/api/project/m1/milestones')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+    milestones = response.get_json()['milestones']
+    assert len(milestones) == 10
+    assert all(len(m['tasks']) == 5 for m in milestones)
+    assert milestones[3]['assignedMembers'] == ['user3@test.com', 'lead@test.com']
+    assert len(statements) == 3
+
+def test_milestones_etag_revalidation(client):
+    milestone_id, task_ids = make_milestone(client, 2)
+    first = client.get('/api/project/m1/milestones')
+    etag = first.headers['ETag']
+
+    assert client.get('/api/project/m1/milestones', headers={'If-None-Match': etag}).status_code == 304
+
+    client.put(f'/api/task/{task_ids[0]}/status', json={'status': 'Done'})
+    changed = client.get('/api/project/m1/milestones', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+
+def test_legacy_members_are_migrated(client):
+    for legacy in ('["a@test.com", "b@test.com"]', 'a@test.com, b@test.com'):
+        db.session.add(Milestone(project_id='m1', title='Old', start_date='', end_date='', assigned_members=legacy))
+    db.session.commit()
+
+    migrate_milestone_members()
+    milestones = client.get('/api/project/m1/milestones').get_json()['milestones']
+    assert [m['assignedMembers'] for m in milestones] == [['a@test.com', 'b@test.com']] * 2
@@ -0,0 +1,92 @@
+"""
+Password hashing tests: hashes run on the pool, the queue refuses work past
+its limit, and logins upgrade hashes made with an older method or cost.
+"""
+
+import threading
+import time
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from app import app, db
+from models import User
+from password_hashing import hasher, stored_method, PasswordHasher, HashingBusy
+
+EMAIL = 'hashing@test.com'
+
+@pytest.fixture
+def cheap_hasher():
+    pool = PasswordHasher(workers=1, max_pending=1, method='pbkdf2:sha256:1000')
+    yield pool
+    pool.shutdown()
+
+def test_pool_hashes_and_verifies(cheap_hasher):
+    stored = cheap_hasher.hash('secret')
+    assert stored.startswith('pbkdf2:sha256:1000$')
+    assert cheap_hasher.verify(stored, 'secret')
+    assert not cheap_hasher.verify(stored, 'guess')
+    assert not cheap_hasher.needs_rehash(stored)
+    assert cheap_hasher.needs_rehash(generate_password_hash('secret', method='pbkdf2:sha256:500'))
+
+def test_method_defaults_do_not_force_a_rehash():
+    # werkzeug writes scrypt:32768:8:1 for scrypt, and that must count as current
+    shorthand = PasswordHasher(workers=0, method='scrypt')
+    assert shorthand.stored_method == 'scrypt:32768:8:1'
+    assert not shorthand.needs_rehash(shorthand.hash('secret'))
+    # Worked out without hashing, so it matches what werkzeug writes for every shorthand
+    for method in ('pbkdf2', 'pbkdf2:sha256', 'pbkdf2:sha512', 'pbkdf2:sha256:1000', 'scrypt', 'scrypt:16384:8:1'):
+        assert stored_method(method) == generate_password_hash('secret', method).split('$', 1)[0]
+    assert shorthand.needs_rehash(generate_password_hash('secret', method='pbkdf2:sha256:1000'))
+
+def test_queue_limit_refuses_instead_of_piling_up():
+    slow = PasswordHasher(workers=1, max_pending=1, method='pbkdf2:sha256:3000000')
+    try:
+        slow.hash('warm the pool up')
+        worker = threading.Thread(target=slow.hash, args=('holds the only slot',))
+        worker.start()
+        while slow._slots._value:
+            time.sleep(0.001)
+        with pytest.raises(HashingBusy):
+            slow.hash('one too many')
+        worker.join()
+    finally:
+        slow.shutdown()
+
+def test_login_upgrades_outdated_hashes(client):
+    with app.app_context():
+        db.session.add(User(email=EMAIL, password=generate_password_hash('pw', method='pbkdf2:sha256:1000')))
+        db.session.commit()
+
+    assert client.post('/api/login', json={'email': EMAIL, 'password': 'pw'}).get_json()['success']
+    with app.app_context():
+        stored = User.query.filter_by(email=EMAIL).one().password
+    assert stored.startswith(hasher.stored_method + '$')
+    # The upgraded hash still takes the same password
+    assert client.post('/api/login', json={'email': EMAIL, 'password': 'pw'}).get_json()['success']
+    assert not client.post('/api/login', json={'email': EMAIL, 'password': 'nope'}).get_json()['success']
+
+def test_busy_hasher_answers_503(client, monkeypatch):
+    def busy(*args):
+        raise HashingBusy()
+    monkeypatch.setattr(hasher, 'verify', busy)
+    monkeypatch.setattr(hasher, 'hash', busy)
+    with app.app_context():
+        db.session.add(User(email=EMAIL, password='pbkdf2:sha256:1000$x$y'))
+        db.session.commit()
+
+    response = client.post('/api/login', json={'email': EMAIL, 'password': 'pw'})
+    assert response.status_code == 503 and response.headers['Retry-After'] == '1'
+    assert client.post('/api/signup', json={'email': 'new@test.com', 'password': 'pw'}).status_code == 503
+
+def test_busy_rehash_does_not_fail_the_login(client, monkeypatch):
+    with app.app_context():
+        db.session.add(User(email=EMAIL, password=generate_password_hash('pw', method='pbkdf2:sha256:1000')))
+        db.session.commit()
+    def busy(password):
+        raise HashingBusy('Too many password checks in progress')
+    monkeypatch.setattr(hasher, 'hash', busy)
+
+    assert client.post('/api/login', json={'email': EMAIL, 'password': 'pw'}).get_json()['success']
+    with app.app_context():
+        assert User.query.filter_by(email=EMAIL).one().password.startswith('pbkdf2:sha256:1000$')
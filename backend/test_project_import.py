@@ -0,0 +1,92 @@
+"""
+Bulk project import tests: rosters stream in, bad rows are reported by
+line and skipped, and each batch costs a fixed number of statements.
+"""
+
+import io
+import json
+
+import pytest
+from sqlalchemy import event
+
+from app import db, Project, Collaborator, Responsibility
+from project_import import import_projects
+
+CSV_ROSTER = b"""project,creator,email,responsibilities
+Alpha,lead@test.com,a1@test.com,Backend;Database
+Alpha,lead@test.com,a2@test.com,Frontend
+Beta,,b1@test.com,Design
+Gamma,lead@test.com,,
+Delta,lead@test.com,not-an-email,Testing
+"""
+
+pytestmark = pytest.mark.usefixtures('app_context')
+
+def test_csv_import_reports_bad_rows(client):
+    response = client.post('/api/projects/import', data={
+        'file': (io.BytesIO(CSV_ROSTER), 'cohort.csv'),
+    }, content_type='multipart/form-data')
+    data = response.get_json()
+
+    assert data['success']
+    assert data['created'] == 2
+    assert data['failed'] == 2
+    assert data['errors'] == [
+        {'line': 4, 'error': 'Creator email is required'},
+        {'line': 6, 'error': 'Invalid collaborator email: not-an-email'},
+    ]
+
+    alpha = Project.query.filter_by(name='Alpha').one()
+    assert [c.email for c in alpha.collaborators] == ['a1@test.com', 'a2@test.com']
+    assert [r.description for r in alpha.collaborators[0].responsibilities] == ['Backend', 'Database']
+    assert Project.query.filter_by(name='Gamma').one().collaborators == []
+
+def test_batch_statement_count_is_constant(client):
+    roster = b'\n'.join(json.dumps({
+        'name': f'Project {i}',
+        'creator': 'lead@test.com',
+        'collaborators': [{'email': f'user{j}@test.com', 'responsibilities': ['Build', 'Test']} for j in range(10)]
+    }).encode() for i in range(200))
+
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        report = import_projects(io.BytesIO(roster), 'jsonl', batch_size=100)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+    assert report['created'] == 200
+    assert Collaborator.query.count() == 2000
+    assert Responsibility.query.count() == 4000
+    # Per batch: two key lookups and one INSERT per table, far fewer than one per row
+    inserts = [s for s in statements if s.startswith('INSERT')]
+    assert len(statements) < 40
+    assert len(inserts) < 30
+
+def test_malformed_rows_fail_alone(client):
+    rows = [
+        {'name': 'Valid', 'creator': 'lead@test.com', 'collaborators': [{'email': 'v@test.com', 'responsibilities': ['Build']}]},
+        {'name': 42, 'creator': 'lead@test.com'},
+        ['not', 'an', 'object'],
+        {'name': 'Strings', 'creator': 'lead@test.com', 'collaborators': 'v@test.com'},
+        {'name': 'Numbers', 'creator': 'lead@test.com', 'collaborators': [7]},
+        {'name': 'Nested', 'creator': 'lead@test.com', 'collaborators': [{'email': 'n@test.com', 'responsibilities': [{'task': 'Build'}]}]},
+        {'name': 'Also valid', 'creator': 'lead@test.com', 'collaborators': [{'email': 'w@test.com', 'responsibilities': None}]},
+    ]
+    roster = b'\n'.join(json.dumps(row).encode() for row in rows)
+    response = client.post('/api/projects/import', data={
+        'file': (io.BytesIO(roster), 'cohort.jsonl'),
+    }, content_type='multipart/form-data')
+    data = response.get_json()
+
+    assert data['success']
+    assert data['created'] == 2
+    assert data['errors'] == [
+        {'line': 2, 'error': 'Project name must be a string'},
+        {'line': 3, 'error': 'Expected a project object'},
+        {'line': 4, 'error': 'Collaborators must be a list'},
+        {'line': 5, 'error': 'Expected a collaborator object'},
+        {'line': 6, 'error': 'Responsibility must be a string'},
+    ]
+    assert sorted(p.name for p in Project.query) == ['Also valid', 'Valid']
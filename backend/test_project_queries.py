@@ -0,0 +1,80 @@
+"""
+Query-count regression tests for the project endpoints.
+Serializing projects must cost a fixed number of SELECTs no matter how many
+projects, collaborators or responsibilities are involved.
+"""
+
+import pytest
+from sqlalchemy import event
+
+from app import db, Project, Collaborator, Responsibility
+
+USER = 'member@test.com'
+
+pytestmark = pytest.mark.usefixtures('app_context')
+
+def make_projects(count, collaborators=5, responsibilities=3):
+    for i in range(count):
+        project = Project(id=f'p{i}', name=f'Project {i}', creator='owner@test.com', code=f'C{i:05d}')
+        project.collaborators.append(Collaborator(email=USER, responsibilities=[
+            Responsibility(description='Team Member')
+        ]))
+        for j in range(collaborators):
+            project.collaborators.append(Collaborator(email=f'user{j}@test.com', responsibilities=[
+                Responsibility(description=f'Task {k}') for k in range(responsibilities)
+            ]))
+        db.session.add(project)
+    db.session.commit()
+    db.session.expunge_all()
+
+def count_queries(client, method, url, **kwargs):
+    statements = []
+    
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = getattr(client, method)(url, **kwargs)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    return response.get_json(), statements
+
+def test_user_projects_query_count_is_constant(client):
+    make_projects(2)
+    data, small = count_queries(client, 'get', f'/api/user-projects/{USER}')
+    assert len(data['projects']) == 2
+    
+    for i in range(2, 30):
+        db.session.add(Project(id=f'p{i}', name=f'Project {i}', creator=USER, code=f'C{i:05d}'))
+    db.session.commit()
+    db.session.expunge_all()
+    
+    data, large = count_queries(client, 'get', f'/api/user-projects/{USER}')
+    assert len(data['projects']) == 30
+    assert len(small) == len(large) <= 3
+
+def test_user_projects_serialization(client):
+    make_projects(1, collaborators=2, responsibilities=2)
+    data, _ = count_queries(client, 'get', f'/api/user-projects/{USER}')
+    collaborators = data['projects'][0]['collaborators']
+    assert collaborators[0] == {'email': 'owner@test.com', 'responsibilities': ['Project Owner']}
+    assert collaborators[1] == {'email': USER, 'responsibilities': ['Team Member']}
+    assert collaborators[2] == {'email': 'user0@test.com', 'responsibilities': ['Task 0', 'Task 1']}
+
+def test_get_project_query_count(client):
+    make_projects(1, collaborators=25)
+    data, statements = count_queries(client, 'get', '/api/project/p0')
+    assert data['success']
+    assert len(data['project']['collaborators']) == 27
+    assert len(statements) <= 3
+
+def test_join_project_query_count(client):
+    make_projects(1, collaborators=25)
+    data, statements = count_queries(client, 'post', '/api/join-project',
+                                     json={'code': 'C00000', 'user_email': 'new@test.com'})
+    assert data['success']
+    assert data['project']['collaborators'][-1] == {'email': 'new@test.com', 'responsibilities': ['Team Member']}
+    selects = [s for s in statements if s.lstrip().upper().startswith('SELECT')]
+    assert len(selects) <= 6
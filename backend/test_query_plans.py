@@ -0,0 +1,116 @@
+"""
+Query plan tests: every SELECT the hot endpoints run is captured and checked
+with EXPLAIN QUERY PLAN, and none of them may fall back to a full table scan.
+"""
+
+import io
+import re
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app import app, db, Project, Collaborator, Milestone, Task
+
+# EXPLAIN QUERY PLAN is SQLite's; other backends are checked by their own tooling
+pytestmark = pytest.mark.skipif(not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'),
+                                reason='query plans are checked on SQLite')
+
+PROJECT = 'plans'
+
+@pytest.fixture(autouse=True)
+def project(app_context):
+    project = Project(id=PROJECT, name='Plans', creator='owner@test.com', code='PLAN01')
+    project.collaborators.append(Collaborator(email='member@test.com'))
+    db.session.add(project)
+    db.session.commit()
+
+@contextmanager
+def captured():
+    # Every blueprint runs on the one engine, so one listener sees all of their queries
+    statements = []
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+
+def query_plans(statements):
+    with app.app_context(), db.engine.connect() as conn:
+        tables = {row[0] for row in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        return tables, [
+            (statement, [row[3] for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)])
+            for statement, parameters in statements
+        ]
+
+def assert_no_scans(tables, plans):
+    assert plans
+    for statement, plan in plans:
+        # Plans name aliased tables by their alias, e.g. "SCAN h" for "FROM history h"
+        names = set()
+        for table, alias in re.findall(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', statement, re.I):
+            if table in tables:
+                names.update({table, alias} - {''})
+        for detail in plan:
+            match = re.match(r'SCAN (\w+)', detail)
+            assert not (match and match.group(1) in names), f'{detail} in:\n{statement}'
+
+def test_project_and_milestone_endpoints_use_indexes(client):
+    with app.app_context():
+        milestone = Milestone(project_id=PROJECT, title='M', start_date='2025-01-01',
+                              end_date='2025-02-01', assigned_members='')
+        db.session.add(milestone)
+        db.session.flush()
+        db.session.add(Task(milestone_id=milestone.id, title='T', due_date='2025-01-10',
+                            assignee='member@test.com', responsibility='Dev'))
+        db.session.commit()
+        task_id = db.session.scalar(db.select(Task.id))
+
+    with captured() as statements:
+        assert client.get('/api/user-projects/member@test.com').get_json()['projects'][0]['id'] == PROJECT
+        assert client.get('/api/user-projects/owner@test.com').get_json()['projects'][0]['id'] == PROJECT
+        assert client.get(f'/api/project/{PROJECT}').status_code == 200
+        joined = client.post('/api/join-project', json={'code': 'PLAN01', 'user_email': 'new@test.com'})
+        assert client.get(f'/api/project/{PROJECT}/milestones').status_code == 200
+        assert client.put(f'/api/task/{task_id}/status', json={'status': 'Done'}).status_code == 200
+        assert client.get('/api/user-profile/member@test.com').status_code == 200
+
+    # The join must reach the collaborator insert for its statements to be planned
+    assert joined.status_code == 200 and joined.get_json()['success']
+    assert 'new@test.com' in [c['email'] for c in joined.get_json()['project']['collaborators']]
+
+    assert_no_scans(*query_plans(statements))
+
+def test_chat_endpoints_use_indexes(client):
+    for i in range(3):
+        client.post('/api/chat/messages', json={
+            'user_id': 1, 'username': 'u', 'content': f'm{i}', 'chat_id': 'general', 'project_id': PROJECT
+        })
+
+    with captured() as statements:
+        latest = client.get(f'/api/chat/messages?project_id={PROJECT}').get_json()
+        client.get(f'/api/chat/messages?project_id={PROJECT}&before_id={latest[0]["id"]}')
+        client.get(f'/api/chat/messages?project_id={PROJECT}&since_id={latest[-1]["id"]}')
+        client.get(f'/api/chat/topics?project_id={PROJECT}')
+
+    assert_no_scans(*query_plans(statements))
+
+def test_upload_endpoints_use_indexes(client):
+    client.post('/api/upload', data={
+        'file': (io.BytesIO(b'plan'), 'plan.txt'), 'folder': 'docs', 'project_id': PROJECT
+    }, content_type='multipart/form-data')
+    client.post('/api/create-snapshot', json={'snapshot_name': 's', 'project_id': PROJECT})
+
+    with captured() as statements:
+        client.get(f'/api/folder-tree?project_id={PROJECT}')
+        items = client.get(f'/api/folder-contents/docs?project_id={PROJECT}').get_json()['items']
+        client.get(f'/api/files/docs/{items[0]["name"]}?project_id={PROJECT}')
+        history = client.get(f'/api/history?project_id={PROJECT}').get_json()['history']
+        client.post(f'/api/revert/{history[0]["id"]}', json={'project_id': PROJECT})
+
+    assert_no_scans(*query_plans(statements))
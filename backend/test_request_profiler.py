@@ -0,0 +1,86 @@
+"""
+Request profiler tests: only admins can drive it, sampled requests leave a
+profile file that the index lists, and settings reach every worker through
+the profile directory.
+"""
+
+import pstats
+import time
+
+import pytest
+
+import auth_tokens
+from request_profiler import profiler, RequestProfiler, StackSampler
+
+ADMIN = 'admin@test.com'
+USER = 'profiled@test.com'
+
+@pytest.fixture(autouse=True)
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiler, 'directory', str(tmp_path))
+    monkeypatch.setattr(profiler, 'keep', 3)
+    monkeypatch.setattr(auth_tokens, 'ADMIN_EMAILS', {ADMIN})
+    yield
+    profiler.reset()
+
+def login(client, email):
+    client.post('/api/signup', json={'email': email, 'password': 'pw'})
+    token = client.post('/api/login', json={'email': email, 'password': 'pw'}).get_json()['access_token']
+    return {'Authorization': f'Bearer {token}'}
+
+def test_only_admins_drive_the_profiler(client):
+    assert client.get('/api/admin/profiles').status_code == 401
+    assert client.put('/api/admin/profiler', json={'sample_rate': 1}, headers=login(client, USER)).status_code == 403
+    admin = login(client, ADMIN)
+    response = client.put('/api/admin/profiler', json={'sample_rate': 2}, headers=admin)
+    assert response.status_code == 400
+    assert client.get('/api/admin/profiler', headers=admin).get_json()['settings']['sample_rate'] == 0
+
+def test_sampled_requests_are_saved_and_listed(client):
+    admin = login(client, ADMIN)
+    settings = client.put('/api/admin/profiler', headers=admin, json={
+        'sample_rate': 1, 'endpoints': ['api.get_user_*']
+    }).get_json()['settings']
+    assert settings == {'sample_rate': 1.0, 'endpoints': ['api.get_user_*'], 'format': 'pstats'}
+
+    client.get(f'/api/user-projects/{USER}')
+    client.get(f'/api/check-user/{USER}')
+    profiles = client.get('/api/admin/profiles', headers=admin).get_json()['profiles']
+    assert [(p['endpoint'], p['method'], p['format']) for p in profiles] == [('api.get_user_projects', 'GET', 'pstats')]
+
+    response = client.get(f"/api/admin/profiles/{profiles[0]['name']}", headers=admin)
+    stats_file = profiler.directory + '/downloaded.prof'
+    with open(stats_file, 'wb') as f:
+        f.write(response.data)
+    assert any(function == 'get_user_projects' for _, _, function in pstats.Stats(stats_file).stats)
+    assert client.get('/api/admin/profiles/..%2Fsecret_key', headers=admin).status_code == 404
+
+    # Only the newest PROFILE_KEEP (3 here) are kept
+    for _ in range(4):
+        client.get(f'/api/user-projects/{USER}')
+    assert len(client.get('/api/admin/profiles', headers=admin).get_json()['profiles']) == 3
+
+def test_settings_reach_other_workers(client):
+    other_worker = RequestProfiler(directory=profiler.directory)
+    assert other_worker.settings()['sample_rate'] == 0
+    profiler.configure({'sample_rate': 0.5, 'format': 'collapsed'})
+    other_worker._next_check = 0
+    assert other_worker.settings() == {'sample_rate': 0.5, 'endpoints': [], 'format': 'collapsed'}
+    profiler.reset()
+    other_worker._next_check = 0
+    assert other_worker.settings()['sample_rate'] == 0
+
+def spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+def test_stack_sampler_writes_collapsed_stacks(tmp_path):
+    sampler = StackSampler(interval=0.001)
+    spin(0.05)
+    sampler.stop()
+    sampler.save(tmp_path / 'stacks.collapsed')
+    lines = (tmp_path / 'stacks.collapsed').read_text().splitlines()
+    stack, count = lines[0].rsplit(' ', 1)
+    assert int(count) > 0
+    assert stack.split(';')[-1].startswith('spin (test_request_profiler.py:')
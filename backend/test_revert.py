@@ -0,0 +1,90 @@
+"""
+Revert tests: restoring a snapshot rebuilds the tree in staging, keeps
+unchanged files as they are, swaps the result in with one atomic exchange
+and only counts bytes it really copied.
+"""
+
+import os
+
+import pytest
+
+import snapshots
+from app import db
+from snapshots import create_snapshot, restore_snapshot, scan_tree
+
+PROJECT = 'reverted'
+PROJECT_FOLDER = os.path.join('uploads', PROJECT)
+
+pytestmark = pytest.mark.usefixtures('app_context')
+
+def write(path, content):
+    path = os.path.join(PROJECT_FOLDER, *path.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Replace rather than rewrite: stored files share their inode with the blob
+    with open(path + '.new', 'w') as f:
+        f.write(content)
+    os.replace(path + '.new', path)
+
+def read_tree():
+    tree = {}
+    for path, (kind, _, _) in scan_tree(PROJECT_FOLDER).items():
+        if kind == 'file':
+            with open(os.path.join(PROJECT_FOLDER, path)) as f:
+                tree[path] = f.read()
+        else:
+            tree[path] = None
+    return tree
+
+@pytest.fixture
+def snapshot_id():
+    write('docs/spec.txt', 'version one')
+    write('docs/old/notes.txt', 'notes')
+    write('logo.txt', 'unchanged')
+    snapshot_id = create_snapshot(PROJECT)
+    db.session.commit()
+    return snapshot_id
+
+def change_tree():
+    write('docs/spec.txt', 'version two, longer')
+    os.remove(os.path.join(PROJECT_FOLDER, 'docs', 'old', 'notes.txt'))
+    os.rmdir(os.path.join(PROJECT_FOLDER, 'docs', 'old'))
+    write('scratch/new.txt', 'added after the snapshot')
+
+def test_restore_rebuilds_the_snapshot_tree(snapshot_id):
+    expected = read_tree()
+    unchanged = os.stat(os.path.join(PROJECT_FOLDER, 'logo.txt')).st_ino
+    change_tree()
+
+    stats = restore_snapshot(PROJECT, snapshot_id)
+    assert read_tree() == expected
+    assert stats == {'files_touched': 2, 'files_deleted': 1, 'bytes_written': 0}
+    # Unchanged files are linked across, not rewritten
+    assert os.stat(os.path.join(PROJECT_FOLDER, 'logo.txt')).st_ino == unchanged
+    assert os.listdir(snapshots.STAGING_FOLDER) == []
+
+def test_swap_is_one_exchange(snapshot_id, monkeypatch):
+    change_tree()
+    def no_renames(*args):
+        raise AssertionError('the live folder must never be renamed away')
+    monkeypatch.setattr(os, 'rename', no_renames)
+    restore_snapshot(PROJECT, snapshot_id)
+    assert read_tree()['docs/spec.txt'] == 'version one'
+
+def test_restore_without_exchange_or_hard_links(snapshot_id, monkeypatch):
+    expected = read_tree()
+    change_tree()
+    monkeypatch.setattr(snapshots, '_exchange', lambda first, second: False)
+    def no_links(src, dest):
+        raise OSError('cross-device link')
+    monkeypatch.setattr(os, 'link', no_links)
+
+    stats = restore_snapshot(PROJECT, snapshot_id)
+    assert read_tree() == expected
+    # Everything had to be copied: the two restored files and the unchanged one
+    assert stats['bytes_written'] == len('version one') + len('notes') + len('unchanged')
+    assert os.listdir(snapshots.STAGING_FOLDER) == []
+
+def test_unchanged_tree_is_left_alone(snapshot_id):
+    before = os.stat(PROJECT_FOLDER).st_ino
+    assert restore_snapshot(PROJECT, snapshot_id) == {'files_touched': 0, 'files_deleted': 0, 'bytes_written': 0}
+    assert os.stat(PROJECT_FOLDER).st_ino == before
@@ -0,0 +1,86 @@
+"""
+Snapshot tests: a snapshot stores only what changed since its parent, with
+tombstones for deleted paths, chains roll over to a full manifest after
+MAX_CHAIN_LENGTH, and every snapshot still rebuilds to the tree it saw.
+"""
+
+import os
+
+import pytest
+from sqlalchemy import select
+
+import snapshots
+from app import db
+from models import Snapshot, SnapshotEntry
+from snapshots import create_snapshot, load_manifest
+
+PROJECT = 'snapped'
+
+pytestmark = pytest.mark.usefixtures('app_context')
+
+def write(path, content):
+    path = os.path.join('uploads', PROJECT, *path.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+def remove(path):
+    os.remove(os.path.join('uploads', PROJECT, *path.split('/')))
+
+def snapshot():
+    snapshot_id = create_snapshot(PROJECT)
+    db.session.commit()
+    return snapshot_id
+
+def stored(snapshot_id):
+    """{path: deleted} of the entries a snapshot itself stores"""
+    return dict(db.session.execute(
+        select(SnapshotEntry.path, SnapshotEntry.deleted).where(SnapshotEntry.snapshot_id == snapshot_id)
+    ).all())
+
+def chain_length(snapshot_id):
+    return db.session.scalar(select(Snapshot.chain_length).where(Snapshot.id == snapshot_id))
+
+def files(manifest):
+    return {path: entry['size'] for path, entry in manifest.items() if entry['kind'] == 'file'}
+
+def test_snapshots_store_deltas_and_tombstones():
+    write('docs/a.txt', 'first')
+    write('docs/b.txt', 'second')
+    write('readme.txt', 'hello')
+    full = snapshot()
+    assert chain_length(full) == 0
+    assert set(stored(full)) == {'docs', 'docs/a.txt', 'docs/b.txt', 'readme.txt'}
+
+    write('docs/a.txt', 'first, edited')
+    remove('docs/b.txt')
+    write('docs/c.txt', 'third')
+    delta = snapshot()
+    assert chain_length(delta) == 1
+    assert stored(delta) == {'docs/a.txt': 0, 'docs/b.txt': 1, 'docs/c.txt': 0}
+
+    assert files(load_manifest(delta)) == {'docs/a.txt': 13, 'docs/c.txt': 5, 'readme.txt': 5}
+    assert files(load_manifest(full)) == {'docs/a.txt': 5, 'docs/b.txt': 6, 'readme.txt': 5}
+
+    # Nothing changed: the snapshot stores nothing at all
+    assert stored(snapshot()) == {}
+
+def test_long_chains_roll_over_to_a_full_manifest(monkeypatch):
+    monkeypatch.setattr(snapshots, 'MAX_CHAIN_LENGTH', 3)
+    write('kept.txt', 'never changes')
+    ids = []
+    for i in range(5):
+        write('counter.txt', 'x' * (i + 1))
+        if i == 2:
+            remove('kept.txt')
+        ids.append(snapshot())
+
+    assert [chain_length(snapshot_id) for snapshot_id in ids] == [0, 1, 2, 0, 1]
+    assert stored(ids[2]) == {'counter.txt': 0, 'kept.txt': 1}
+    # The rollover snapshot stands on its own: every live path and no tombstones
+    assert stored(ids[3]) == {'counter.txt': 0}
+    assert stored(ids[4]) == {'counter.txt': 0}
+    assert [files(load_manifest(snapshot_id)) for snapshot_id in ids] == [
+        {'counter.txt': 1, 'kept.txt': 13}, {'counter.txt': 2, 'kept.txt': 13},
+        {'counter.txt': 3}, {'counter.txt': 4}, {'counter.txt': 5},
+    ]
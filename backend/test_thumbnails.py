@@ -0,0 +1,48 @@
+"""
+Thumbnail cache tests: derivatives are downscaled, served with immutable
+cache headers and evicted least recently used first under the byte cap.
+"""
+
+import io
+import os
+
+import pytest
+
+Image = pytest.importorskip('PIL.Image')
+
+import thumbnails
+
+def upload_photo(client, name, color):
+    data = io.BytesIO()
+    Image.new('RGB', (2000, 1500), color).save(data, 'JPEG')
+    client.post('/api/upload', data={
+        'file': (io.BytesIO(data.getvalue()), name),
+        'project_id': 'photos',
+    }, content_type='multipart/form-data')
+    items = client.get('/api/folder-contents/root?project_id=photos').get_json()['items']
+    return next(item for item in items if item['name'].endswith(name))
+
+def test_thumbnail_is_small_and_cacheable(client):
+    item = upload_photo(client, 'beach.jpg', 'blue')
+
+    response = client.get(item['thumbnail_url'])
+    assert response.status_code == 200
+    assert response.mimetype == 'image/jpeg'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert len(response.data) < item['size']
+    assert max(Image.open(io.BytesIO(response.data)).size) == thumbnails.SIZES['thumb']
+
+    assert client.get(item['thumbnail_url'], headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+def test_cache_evicts_least_recently_used(client, monkeypatch):
+    first = upload_photo(client, 'first.jpg', 'red')
+    second = upload_photo(client, 'second.jpg', 'green')
+    first_path, _ = thumbnails.derivative_path(first['thumbnail_url'].split('/')[-2], 'thumb')
+    os.utime(first_path, (0, 0))
+
+    monkeypatch.setattr(thumbnails, 'CACHE_MAX_BYTES', os.path.getsize(first_path) + 1)
+    monkeypatch.setattr(thumbnails, '_cache_bytes', None)
+    second_path, _ = thumbnails.derivative_path(second['thumbnail_url'].split('/')[-2], 'thumb')
+
+    assert os.path.exists(second_path)
+    assert not os.path.exists(first_path)
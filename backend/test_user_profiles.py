@@ -0,0 +1,82 @@
+"""
+Profile lookup tests: a batch of emails costs one query, repeats come from
+the cache, and profile changes show up straight away.
+"""
+
+import io
+
+import pytest
+from sqlalchemy import event
+
+from app import app, db
+from models import User
+from profile_cache import profiles, ProfileCache
+
+EMAILS = ['ada@test.com', 'grace@test.com', 'linus@test.com']
+
+@pytest.fixture(autouse=True)
+def users():
+    profiles.clear()
+    with app.app_context():
+        db.session.add_all([User(email=email, password='x', name=email.split('@')[0].title())
+                            for email in EMAILS[:2]])
+        db.session.commit()
+    yield
+    profiles.clear()
+
+@pytest.fixture
+def queries():
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, 'before_cursor_execute', listener)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', listener)
+
+def batch(client, emails):
+    return client.get('/api/user-profiles', query_string=[('email', email) for email in emails]).get_json()
+
+def test_batch_is_one_query_then_cached(client, queries):
+    result = batch(client, EMAILS + EMAILS[:1])
+    assert result['success']
+    assert sorted(result['profiles']) == EMAILS[:2]
+    assert result['profiles']['ada@test.com'] == {'name': 'Ada', 'email': 'ada@test.com', 'profilePhoto': None}
+    assert len([s for s in queries if s.lstrip().upper().startswith('SELECT')]) == 1
+
+    queries.clear()
+    # Known users and the unknown one alike come from the cache
+    assert sorted(batch(client, EMAILS)['profiles']) == EMAILS[:2]
+    assert client.get('/api/user-profile/grace@test.com').get_json()['profile']['name'] == 'Grace'
+    assert not client.get('/api/user-profile/linus@test.com').get_json()['success']
+    assert queries == []
+
+def test_batch_size_is_capped(client):
+    response = client.get('/api/user-profiles', query_string=[('email', f'u{i}@test.com') for i in range(201)])
+    assert response.status_code == 400
+
+def test_profile_changes_invalidate_the_cache(client):
+    batch(client, EMAILS)
+    client.post('/api/signup', json={'email': 'linus@test.com', 'password': 'pw', 'name': 'Linus'})
+    assert 'linus@test.com' in batch(client, EMAILS)['profiles']
+
+    token = client.post('/api/login', json={'email': 'linus@test.com', 'password': 'pw'}).get_json()['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post('/api/update-profile', json={'name': 'Torvalds'}, headers=headers)
+    assert batch(client, EMAILS)['profiles']['linus@test.com']['name'] == 'Torvalds'
+
+    client.post('/api/upload-profile-photo', data={'photo': (io.BytesIO(b'png'), 'me.png')},
+                headers=headers, content_type='multipart/form-data')
+    assert batch(client, EMAILS)['profiles']['linus@test.com']['profilePhoto'] == '/uploads/profiles/linus_test.com_me.png'
+
+def test_cache_evicts_least_recently_used_and_expires():
+    now = [0.0]
+    cache = ProfileCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache.put_many({'a': {'name': 'A'}, 'b': None})
+    assert cache.get_many(['a']) == ({'a': {'name': 'A'}}, [])
+    cache.put_many({'c': {'name': 'C'}})
+    # b was used least recently
+    assert cache.get_many(['a', 'b', 'c']) == ({'a': {'name': 'A'}, 'c': {'name': 'C'}}, ['b'])
+
+    now[0] = 10
+    assert cache.get_many(['a', 'c']) == ({}, ['a', 'c'])
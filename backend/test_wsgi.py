@@ -0,0 +1,61 @@
+"""
+Production entry point tests, mostly in a fresh interpreter: importing wsgi
+builds the app without touching the database or loading rarely used modules,
+the init-db command then creates the schema, gunicorn workers start the
+outbox, and a process never builds a second app.
+"""
+
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+from auth_tokens import tokens
+from chat_hub import hub
+from email_outbox import outbox
+
+BACKEND = os.path.dirname(os.path.abspath(__file__))
+
+def run(args, tmp_path, database):
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{database}', PYTHONPATH=BACKEND)
+    return subprocess.run([sys.executable] + args, cwd=tmp_path, env=env, check=True,
+                          capture_output=True, text=True).stdout
+
+def test_import_is_side_effect_free_and_init_db_creates_schema(tmp_path):
+    database = tmp_path / 'wsgi.db'
+
+    output = run(['-c', 'import threading, wsgi; '
+                        'print(sorted(wsgi.app.blueprints), threading.active_count())'], tmp_path, database)
+    assert output.strip() == "['admin', 'api', 'chat', 'email', 'uploads'] 1"
+    # SQLite creates the file on first connect, so it must not exist yet
+    assert not database.exists()
+    assert not (tmp_path / 'uploads').exists()
+
+    assert 'Database is up to date' in run(['-m', 'flask', '--app', 'wsgi', 'init-db'], tmp_path, database)
+    conn = sqlite3.connect(database)
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    conn.close()
+    assert {'project', 'messages', 'uploaded_files', 'email_outbox', 'schema_migrations'} <= tables
+
+def test_rarely_used_modules_load_on_first_use(tmp_path):
+    lazy = ['smtplib', 'email.mime.text', 'PIL.Image', 'migrations', 'project_import']
+    output = run(['-c', f'import sys, wsgi; print([name for name in {lazy!r} if name in sys.modules])'],
+                 tmp_path, tmp_path / 'lazy.db')
+    assert output.strip() == '[]'
+
+def test_gunicorn_workers_start_the_outbox(tmp_path):
+    database = tmp_path / 'outbox.db'
+    run(['-m', 'flask', '--app', 'wsgi', 'init-db'], tmp_path, database)
+    output = run(['-c', 'import runpy, threading, wsgi; '
+                        f'runpy.run_path({os.path.join(BACKEND, "gunicorn.conf.py")!r})["post_worker_init"](None); '
+                        'print(sorted(t.name for t in threading.enumerate() if t.name.startswith("email-outbox")))'],
+                 tmp_path, database)
+    assert output.strip() == "['email-outbox-0', 'email-outbox-1']"
+
+def test_one_app_per_process():
+    from app import app, create_app
+    with pytest.raises(RuntimeError):
+        create_app({'TESTING': True})
+    assert outbox.app is app and hub.app is app and tokens.app is app
@@ -0,0 +1,130 @@
+"""
+Downscaled derivatives of uploaded images.
+Thumbnails and previews are generated on first request from the original
+blob and cached under uploads/.thumbnails/<sha256[:2]>/<sha256>-<size>.<ext>.
+They are keyed by content hash, so a derivative never goes stale and can be
+served with an immutable cache lifetime. The cache is trimmed least recently
+used first once it grows past THUMBNAIL_CACHE_BYTES.
+
+Pillow is optional; without it derivatives are unavailable and callers fall
+back to the original file. It is imported on the first render, not at startup.
+"""
+
+import importlib.util
+import os
+import threading
+import time
+import uuid
+
+import blobstore
+
+THUMBNAIL_FOLDER = os.path.join('uploads', '.thumbnails')
+SIZES = {'thumb': 256, 'preview': 1024}
+CACHE_MAX_BYTES = int(os.environ.get('THUMBNAIL_CACHE_BYTES', 256 * 1024 * 1024))
+# Cache hits refresh a derivative's mtime (its LRU position) at most this often
+TOUCH_INTERVAL_SECONDS = 60 * 60
+JPEG_QUALITY = 80
+
+_lock = threading.Lock()
+_generating = {}
+_cache_bytes = None
+_pillow_installed = None
+
+def available():
+    global _pillow_installed
+    if _pillow_installed is None:
+        _pillow_installed = importlib.util.find_spec('PIL') is not None
+    return _pillow_installed
+
+def derivative_path(digest, size_name):
+    """Cached derivative for a blob, generated on first use. Returns (path, mimetype)."""
+    cached = _cached(digest, size_name)
+    if cached:
+        _touch(cached[0])
+        return cached
+
+    # One thread renders a given derivative; others wait for it instead of repeating the work
+    with _lock:
+        key_lock = _generating.setdefault((digest, size_name), threading.Lock())
+    with key_lock:
+        try:
+            return _cached(digest, size_name) or _render(digest, size_name)
+        finally:
+            with _lock:
+                _generating.pop((digest, size_name), None)
+
+def _cached(digest, size_name):
+    for ext, mimetype in (('jpg', 'image/jpeg'), ('png', 'image/png')):
+        path = _path(digest, size_name, ext)
+        if os.path.exists(path):
+            return path, mimetype
+    return None
+
+def _path(digest, size_name, ext):
+    return os.path.join(THUMBNAIL_FOLDER, digest[:2], f'{digest}-{size_name}.{ext}')
+
+def _render(digest, size_name):
+    from PIL import Image, ImageOps
+    bound = SIZES[size_name]
+    with Image.open(blobstore.blob_path(digest)) as image:
+        # Let the JPEG decoder downscale while decoding instead of inflating the full photo
+        image.draft('RGB', (bound, bound))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((bound, bound))
+        if image.mode in ('RGBA', 'LA', 'P'):
+            ext, mimetype, fmt, options = 'png', 'image/png', 'PNG', {'optimize': True}
+        else:
+            image = image.convert('RGB')
+            ext, mimetype, fmt, options = 'jpg', 'image/jpeg', 'JPEG', {'quality': JPEG_QUALITY, 'optimize': True}
+
+        path = _path(digest, size_name, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        image.save(tmp_path, fmt, **options)
+    os.replace(tmp_path, path)
+    _account(path)
+    return path, mimetype
+
+def _touch(path):
+    try:
+        if time.time() - os.path.getmtime(path) > TOUCH_INTERVAL_SECONDS:
+            os.utime(path)
+    except OSError:
+        pass
+
+def _scan():
+    entries = []
+    for root, _, files in os.walk(THUMBNAIL_FOLDER):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    return entries
+
+def _account(new_path):
+    """Count a new derivative towards the cap and evict older ones if over it"""
+    global _cache_bytes
+    with _lock:
+        if _cache_bytes is None:
+            _cache_bytes = sum(size for _, size, _ in _scan())
+        else:
+            _cache_bytes += os.path.getsize(new_path)
+        if _cache_bytes <= CACHE_MAX_BYTES:
+            return
+        # Trim to 90% of the cap so eviction does not run on every new derivative
+        target = CACHE_MAX_BYTES * 9 // 10
+        entries = sorted(_scan())
+        _cache_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if _cache_bytes <= target:
+                break
+            if path == new_path:
+                continue
+            try:
+                os.remove(path)
+                _cache_bytes -= size
+            except OSError:
+                pass
@@ -1,64 +1,20 @@
 #!/usr/bin/env python3
-import sqlite3
+"""
+Bring the database up to the current schema.
+Creates missing tables and applies the pending versioned migrations (see
+migrations.py) on the database DATABASE_URL points at. Safe to run repeatedly.
+"""
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 def update_databases():
-    # Update uploads.db
-    if os.path.exists('uploads.db'):
-        conn = sqlite3.connect('uploads.db')
-        cursor = conn.cursor()
-        
-        # Add project_id columns if they don't exist
-        try:
-            cursor.execute('ALTER TABLE folders ADD COLUMN project_id TEXT NOT NULL DEFAULT ""')
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-            
-        try:
-            cursor.execute('ALTER TABLE uploaded_files ADD COLUMN project_id TEXT NOT NULL DEFAULT ""')
-        except sqlite3.OperationalError:
-            pass
-            
-        try:
-            cursor.execute('ALTER TABLE history ADD COLUMN project_id TEXT NOT NULL DEFAULT ""')
-        except sqlite3.OperationalError:
-            pass
-            
-        try:
-            cursor.execute('ALTER TABLE snapshots ADD COLUMN project_id TEXT NOT NULL DEFAULT ""')
-        except sqlite3.OperationalError:
-            pass
-        
-        conn.commit()
-        conn.close()
-        print("Updated uploads.db")
-    
-    # Update stormhacks.db
-    if os.path.exists('instance/stormhacks.db'):
-        conn = sqlite3.connect('instance/stormhacks.db')
-        cursor = conn.cursor()
-        
-        # Add project_id columns if they don't exist
-        try:
-            cursor.execute('ALTER TABLE messages ADD COLUMN project_id TEXT NOT NULL DEFAULT ""')
-        except sqlite3.OperationalError:
-            pass
-            
-        try:
-            cursor.execute('ALTER TABLE chat_groups ADD COLUMN project_id TEXT NOT NULL DEFAULT ""')
-        except sqlite3.OperationalError:
-            pass
-        
-        # Update chat_topics to have composite primary key
-        try:
-            cursor.execute('ALTER TABLE chat_topics ADD COLUMN project_id TEXT NOT NULL DEFAULT ""')
-        except sqlite3.OperationalError:
-            pass
-        
-        conn.commit()
-        conn.close()
-        print("Updated stormhacks.db")
+    from app import app, migrate_database
+    with app.app_context():
+        migrate_database()
+        print(f"Updated {app.config['SQLALCHEMY_DATABASE_URI']}")
 
 if __name__ == '__main__':
     update_databases()
-    print("Database update complete!")
\ No newline at end of file
+    print("Database update complete!")
@@ -0,0 +1,15 @@
+"""
+WSGI entry point for production servers.
+
+    flask --app wsgi init-db                   # once per deploy, before the workers start
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Importing this only builds the app from the environment (DATABASE_URL and
+the settings in models.py): no schema work, no database connections and no
+background threads, so each worker process starts quickly. Under gunicorn the
+post_worker_init hook in gunicorn.conf.py then starts the email outbox workers
+in every worker process; elsewhere they start the first time a process queues
+or looks up an email.
+"""
+
+from app import app
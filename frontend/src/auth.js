@@ -0,0 +1,36 @@
+// Session tokens from /api/login. Requests that act as the signed-in user go
+// through authFetch, which sends the access token and renews it once on a 401.
+const API = 'http://127.0.0.1:5000';
+
+export function saveSession(email, result) {
+  sessionStorage.setItem('currentUser', email);
+  sessionStorage.setItem('accessToken', result.access_token);
+  sessionStorage.setItem('refreshToken', result.refresh_token);
+}
+
+async function refreshSession() {
+  const refreshToken = sessionStorage.getItem('refreshToken');
+  if (!refreshToken) return false;
+  const response = await fetch(`${API}/api/token/refresh`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ refresh_token: refreshToken })
+  });
+  const result = await response.json();
+  if (!result.success) return false;
+  sessionStorage.setItem('accessToken', result.access_token);
+  sessionStorage.setItem('refreshToken', result.refresh_token);
+  return true;
+}
+
+export async function authFetch(url, options = {}) {
+  const send = () => fetch(url, {
+    ...options,
+    headers: { ...(options.headers || {}), Authorization: `Bearer ${sessionStorage.getItem('accessToken')}` }
+  });
+  let response = await send();
+  if (response.status === 401 && await refreshSession()) {
+    response = await send();
+  }
+  return response;
+}
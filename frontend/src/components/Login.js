@@ -1,5 +1,6 @@
 import React, { useState } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
+import { saveSession } from '../auth';
 
 function Login() {
   const [email, setEmail] = useState('');
@@ -20,7 +21,7 @@ function Login() {
       const result = await response.json();
       
       if (result.success) {
-        sessionStorage.setItem('currentUser', email);
+        saveSession(email, result);
         setMessage('Login successful! Redirecting...');
         setTimeout(() => {
           navigate('/dashboard');
@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
+import { authFetch } from '../auth';
 
 function Settings() {
   const [userProfile, setUserProfile] = useState({
@@ -57,10 +58,9 @@ function Settings() {
       
       const formData = new FormData();
       formData.append('photo', file);
-      formData.append('email', localStorage.getItem('currentUser'));
 
       try {
-        const response = await fetch('http://127.0.0.1:5000/api/upload-profile-photo', {
+        const response = await authFetch('http://127.0.0.1:5000/api/upload-profile-photo', {
           method: 'POST',
           body: formData
         });
@@ -85,17 +85,21 @@ function Settings() {
   const handleUpdateProfile = async (e) => {
     e.preventDefault();
     try {
-      const response = await fetch('http://127.0.0.1:5000/api/update-profile', {
+      const response = await authFetch('http://127.0.0.1:5000/api/update-profile', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
-          email: localStorage.getItem('currentUser'),
           name: userProfile.name,
           newPassword: newPassword || undefined
         })
       });
       const result = await response.json();
       if (result.success) {
+        // A password change ends other sessions and hands this one new tokens
+        if (result.access_token) {
+          sessionStorage.setItem('accessToken', result.access_token);
+          sessionStorage.setItem('refreshToken', result.refresh_token);
+        }
         setMessage('Profile updated successfully!');
         setNewPassword('');
         setConfirmPassword('');
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 
 const Chatroom = ({ currentUser = {}, chatId = 'general' }) => {
   const [messages, setMessages] = useState([]);
@@ -30,6 +30,10 @@ const Chatroom = ({ currentUser = {}, chatId = 'general' }) => {
   const [sidebarCollapsed, setSidebarCollapsed] = useState(false);
   const [userProfiles, setUserProfiles] = useState({});
   const [currentUserName, setCurrentUserName] = useState('');
+  // Newest message id received from the server, used as the polling cursor
+  const lastMessageIdRef = useRef(null);
+  // Authors whose profiles have been asked for, so each is fetched once
+  const requestedProfilesRef = useRef(new Set());
   
   const getRandomGradient = () => {
     const gradients = [
@@ -46,31 +50,41 @@ const Chatroom = ({ currentUser = {}, chatId = 'general' }) => {
   };
 
   useEffect(() => {
+    lastMessageIdRef.current = null;
     fetchTopics();
-    fetchMessages();
     markAsRead(activeChatId);
     fetchCurrentUserName();
     
-    const interval = setInterval(() => {
+    // Load recent history, then let the server push anything newer
+    let source = null;
+    let retryTimer = null;
+    let closed = false;
+    const connect = () => {
       const currentProject = JSON.parse(localStorage.getItem('currentProject') || '{}');
-      if (currentProject.id) {
-        fetch(`http://localhost:5000/api/chat/messages?chat_id=${activeChatId}&project_id=${currentProject.id}`)
-          .then(response => {
-            if (response.ok) {
-              return response.json();
-            }
-            throw new Error('API not available');
-          })
-          .then(data => {
-            setMessages(data.reverse());
-            checkForUnreadMessages();
-          })
-          .catch(() => {
-            // Don't update messages if API is down - keep local messages
-          });
-      }
-    }, 3000);
-    return () => clearInterval(interval);
+      if (closed || !currentProject.id) return;
+      const cursor = lastMessageIdRef.current;
+      const resumeParam = cursor !== null ? `&last_event_id=${cursor}` : '';
+      source = new EventSource(`http://localhost:5000/api/chat/stream?chat_id=${activeChatId}&project_id=${currentProject.id}${resumeParam}`);
+      source.addEventListener('message', (event) => {
+        const message = JSON.parse(event.data);
+        lastMessageIdRef.current = message.id;
+        setMessages(prev => prev.some(msg => msg.id === message.id) ? prev : [...prev, message]);
+        checkForUnreadMessages();
+      });
+      source.addEventListener('error', () => {
+        // The browser retries dropped streams itself, but gives up on an error
+        // status such as the 503 a server at its stream limit answers with
+        if (source.readyState === EventSource.CLOSED && !closed) {
+          retryTimer = setTimeout(connect, 3000 + Math.random() * 2000);
+        }
+      });
+    };
+    fetchMessages().then(connect);
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      if (source) source.close();
+    };
   }, [activeChatId]);
 
   useEffect(() => {
@@ -126,7 +140,10 @@ const Chatroom = ({ currentUser = {}, chatId = 'general' }) => {
       const response = await fetch(`http://localhost:5000/api/chat/messages?chat_id=${activeChatId}&project_id=${currentProject.id}`);
       if (response.ok) {
         const data = await response.json();
-        setMessages(data.reverse());
+        const history = data.reverse();
+        // 0 for an empty topic, so the stream backfills anything posted since this fetch
+        lastMessageIdRef.current = history.length ? history[history.length - 1].id : 0;
+        setMessages(history);
       } else {
         // Load from localStorage as fallback
         const stored = localStorage.getItem(`messages_${activeChatId}_${currentProject.id}`);
@@ -151,6 +168,7 @@ const Chatroom = ({ currentUser = {}, chatId = 'general' }) => {
         formData.append('user_id', currentUser.id || sessionStorage.getItem('currentUser') || 'user');
         formData.append('username', currentUser.name || currentUserName || 'User');
         formData.append('chat_id', activeChatId);
+        formData.append('project_id', JSON.parse(localStorage.getItem('currentProject') || '{}').id);
         if (newMessage.trim()) formData.append('content', newMessage);
         if (replyTo) formData.append('reply_to', replyTo);
         
@@ -377,24 +395,34 @@ const Chatroom = ({ currentUser = {}, chatId = 'general' }) => {
     }
   };
 
-  const fetchUserProfile = async (username) => {
-    if (userProfiles[username]) return;
-    
-    try {
-      const response = await fetch(`http://127.0.0.1:5000/api/user-profile/${encodeURIComponent(username)}`);
-      const data = await response.json();
-      
-      if (data.success && data.profile.profilePhoto) {
-        setUserProfiles(prev => ({
-          ...prev,
-          [username]: `http://127.0.0.1:5000${data.profile.profilePhoto}`
-        }));
-      }
-    } catch (error) {}
+  // One request for every author on screen whose profile we have not asked for yet
+  useEffect(() => {
+    const authors = [...new Set(messages.map(msg => msg.username))]
+      .filter(name => name && !requestedProfilesRef.current.has(name));
+    if (authors.length) fetchUserProfiles(authors);
+  }, [messages]);
+
+  const fetchUserProfiles = async (authors) => {
+    authors.forEach(name => requestedProfilesRef.current.add(name));
+    // The endpoint takes up to 200 emails per request
+    for (let i = 0; i < authors.length; i += 200) {
+      try {
+        const query = authors.slice(i, i + 200).map(name => `email=${encodeURIComponent(name)}`).join('&');
+        const response = await fetch(`http://127.0.0.1:5000/api/user-profiles?${query}`);
+        const data = await response.json();
+        
+        if (data.success) {
+          const photos = {};
+          Object.entries(data.profiles).forEach(([email, profile]) => {
+            if (profile.profilePhoto) photos[email] = `http://127.0.0.1:5000${profile.profilePhoto}`;
+          });
+          setUserProfiles(prev => ({ ...prev, ...photos }));
+        }
+      } catch (error) {}
+    }
   };
 
   const getUserAvatar = (username) => {
-    fetchUserProfile(username);
     return userProfiles[username] || `https://ui-avatars.com/api/?name=${encodeURIComponent(username)}&size=40&background=8178A1`;
   };
 
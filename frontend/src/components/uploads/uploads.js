@@ -14,6 +14,77 @@
 
 import React, { useState, useEffect } from 'react';
 
+// Files above this size go through the resumable chunked upload API
+const CHUNKED_UPLOAD_THRESHOLD = 8 * 1024 * 1024;
+const CHUNK_RETRIES = 3;
+
+const sha256Hex = async (blob) => {
+  const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+  return Array.from(new Uint8Array(digest)).map((b) => b.toString(16).padStart(2, '0')).join('');
+};
+
+/**
+ * Upload a large file in chunks, resuming an earlier attempt at the same file
+ * from the last offset the server acknowledged
+ */
+const uploadInChunks = async (file, folderName, projectId, logHistory, onProgress) => {
+  const base = 'http://127.0.0.1:5000/api/uploads';
+  const resumeKey = `upload:${projectId}:${folderName}:${file.name}:${file.size}:${file.lastModified}`;
+  let state = null;
+  
+  const savedId = localStorage.getItem(resumeKey);
+  if (savedId) {
+    const response = await fetch(`${base}/${savedId}`);
+    const result = await response.json();
+    if (result.success) state = result;
+  }
+  if (!state) {
+    const response = await fetch(base, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        project_id: projectId,
+        folder: folderName,
+        filename: file.name,
+        size: file.size,
+        log_history: logHistory
+      })
+    });
+    state = await response.json();
+    if (!state.success) return state;
+    localStorage.setItem(resumeKey, state.upload_id);
+  }
+  
+  while (!state.complete) {
+    const chunk = file.slice(state.offset, state.offset + state.chunk_size);
+    const checksum = await sha256Hex(chunk);
+    let attempt = 0;
+    for (;;) {
+      try {
+        const response = await fetch(`${base}/${state.upload_id}/chunks/${state.next_chunk}`, {
+          method: 'PUT',
+          headers: { 'Content-Type': 'application/octet-stream', 'X-Chunk-SHA256': checksum },
+          body: chunk
+        });
+        const result = await response.json();
+        if (!result.success && response.status !== 409) throw new Error(result.message);
+        // On 409 the server tells us which chunk it actually expects next
+        state = { ...state, ...result };
+        break;
+      } catch (error) {
+        attempt += 1;
+        if (attempt >= CHUNK_RETRIES) throw error;
+      }
+    }
+    onProgress(state.offset);
+  }
+  
+  const response = await fetch(`${base}/${state.upload_id}/finalize`, { method: 'POST' });
+  const result = await response.json();
+  if (result.success || response.status === 422) localStorage.removeItem(resumeKey);
+  return result;
+};
+
 function Uploads() {
   // Component state (minimal usage due to global window functions)
   const [showUpload, setShowUpload] = useState(false);
@@ -272,6 +343,7 @@ function Uploads() {
                       const filePath = folderPath === 'root' ? item.name : `${folderPath}/${item.name}`;
                       content += `<div style="margin: 5px 0; padding: 10px 15px; background: white; border-radius: 12px; border-left: 3px solid #470F59; cursor: pointer; box-shadow: 0 1px 3px rgba(0,0,0,0.1); margin-left: ${fileIndent}px; transition: all 0.2s ease;" onclick="window.previewFile('${filePath}', '${item.name}')" onmouseover="this.style.boxShadow='0 2px 6px rgba(0,0,0,0.15)'" onmouseout="this.style.boxShadow='0 1px 3px rgba(0,0,0,0.1)'">
                         <div style="display: flex; align-items: center; gap: 8px;">
+                          ${item.thumbnail_url ? `<img src="${item.thumbnail_url}" loading="lazy" alt="" style="width: 32px; height: 32px; object-fit: cover; border-radius: 6px;" />` : ''}
                           <span style="color: #470F59; font-weight: 500;">${item.name}</span>
                           <span style="color: #7C7171; font-size: 12px; margin-left: auto;">${item.size} bytes</span>
                         </div>
@@ -322,12 +394,27 @@ function Uploads() {
            */
           window.uploadSelectedFile = async (file, folderName) => {
             const statusDiv = document.getElementById('upload-status');
+            const currentProject = JSON.parse(localStorage.getItem('currentProject') || '{}');
+            const logHistory = document.getElementById('log-history-toggle').checked;
+            
+            if (file.size > CHUNKED_UPLOAD_THRESHOLD) {
+              try {
+                const result = await uploadInChunks(file, folderName, currentProject.id, logHistory, (sent) => {
+                  statusDiv.innerHTML = `<p style="color: white;">Uploading... ${Math.floor(sent * 100 / file.size)}%</p>`;
+                });
+                statusDiv.innerHTML = result.success ? 
+                  '<p style="color: green;">Upload successful!</p>' : 
+                  '<p style="color: red;">Upload failed!</p>';
+              } catch (error) {
+                statusDiv.innerHTML = '<p style="color: red;">Upload interrupted, try again to resume.</p>';
+              }
+              return;
+            }
             
             const formData = new FormData();
-            const currentProject = JSON.parse(localStorage.getItem('currentProject') || '{}');
             formData.append('file', file);
             formData.append('folder', folderName);
-            formData.append('log_history', document.getElementById('log-history-toggle').checked);
+            formData.append('log_history', logHistory);
             formData.append('project_id', currentProject.id);
             
             try {
@@ -409,11 +496,12 @@ function Uploads() {
                 content = `
                   <h3>Preview: ${fileName}</h3>
                   <pre style="background: #f8f9fa; padding: 15px; border-radius: 4px; overflow: auto; max-height: 400px; white-space: pre-wrap;">${result.content}</pre>
+                  ${result.truncated ? `<p style="color: #666; font-size: 12px;">Showing the first ${result.content.length} characters of ${result.size} bytes.</p>` : ''}
                 `;
               } else if (result.type === 'image') {
                 content = `
                   <h3>Preview: ${fileName}</h3>
-                  <img src="data:${result.mime_type};base64,${result.content}" style="max-width: 100%; max-height: 400px; border-radius: 4px;" />
+                  <img src="${result.preview_url || result.url}" style="max-width: 100%; max-height: 400px; border-radius: 4px;" />
                 `;
               } else {
                 content = `
@@ -422,8 +510,10 @@ function Uploads() {
                 `;
               }
               
+              const downloadUrl = `http://127.0.0.1:5000/api/files/${filePath}?project_id=${currentProject.id}&download=1`;
               dialog.innerHTML = content + `
                 <div style="margin-top: 15px; text-align: right;">
+                  <a href="${downloadUrl}" style="padding: 8px 16px; margin-right: 8px; background: #470F59; color: white; border-radius: 4px; text-decoration: none;">Download</a>
                   <button onclick="document.body.removeChild(this.closest('.preview-modal'))" style="padding: 8px 16px; background: #6c757d; color: white; border: none; border-radius: 4px; cursor: pointer;">Close</button>
                 </div>
               `;
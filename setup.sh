@@ -25,4 +25,5 @@ npm install
 echo "✅ Setup complete!"
 echo "To start the app:"
 echo "Backend: cd backend && python app.py"
+echo "Production backend: cd backend && flask --app wsgi init-db && gunicorn -c gunicorn.conf.py wsgi:app"
 echo "Frontend: cd frontend && npm start"
\ No newline at end of file